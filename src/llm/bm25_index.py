@@ -0,0 +1,180 @@
+# imports:
+# sqlite3 for the persistent inverted index, numpy to score the postings of a query at once,
+# threading since batches are indexed from the embedding workers
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# ----------------------------------
+#  Index Location and BM25 Settings
+# ----------------------------------
+
+DEFAULT_INDEX_PATH = Path(__file__).parent.parent.parent / 'data' / 'bm25_index.sqlite3'
+
+# term frequency saturation and length normalization, the usual Okapi BM25 values
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+# sqlite's default limit on the number of ? parameters is 999 on older builds
+LOOKUP_BATCH = 500
+
+# ----------------------------------
+#  Tokenizer
+# ----------------------------------
+
+# words and numbers, keeping the dots and dashes inside model names (gpt-4o, llama-3.3, o1-mini)
+TOKEN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+STOP_WORDS = frozenset("""
+a an and are as at be been being but by can could did do does for from had has have how i if in into is it its
+just like so than that the their them there these they this those to was we were what when where which who why
+will with would you your about made more most not of on or our out over some such very
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOP_WORDS]
+
+# ----------------------------------
+#  Persistent BM25 Index
+# ----------------------------------
+
+class BM25Index:
+    """
+    SQLite inverted index over the chunk texts: term -> (chunk id, term frequency) postings, plus each chunk's length.
+
+    Chunks are added as they are embedded, so the index grows with the vector store. search() scores only the
+    postings of the query's terms, and can be restricted to chunks embedded after a time like the vector search.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, k1: float = DEFAULT_K1, b: float = DEFAULT_B):
+        self.path = Path(path)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = None
+
+    # the database is only opened on first use
+    def _connect(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    chunk_id TEXT PRIMARY KEY,
+                    video_id TEXT,
+                    embedded_at REAL,
+                    length INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, chunk_id)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS postings_chunk_id ON postings (chunk_id)")
+            self._conn.commit()
+        return self._conn
+
+    # -------------------------------
+    #  Index Chunks
+    # -------------------------------
+
+    def add_many(self, documents: Iterable):
+        """
+        Index the given documents (langchain Documents with an id), re-indexing any already in the index.
+        """
+        chunks, postings = [], []
+        for doc in documents:
+            terms = Counter(tokenize(doc.page_content))
+            chunks.append((doc.id, doc.metadata.get('video_id'), doc.metadata.get('embedded_at'), sum(terms.values())))
+            postings.extend((term, doc.id, tf) for term, tf in terms.items())
+
+        if not chunks:
+            return
+
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("DELETE FROM postings WHERE chunk_id = ?", [(chunk[0],) for chunk in chunks])
+            conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", chunks)
+            conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", postings)
+            conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    # -------------------------------
+    #  Search
+    # -------------------------------
+
+    def search(self, query: str, k: int = 15, embedded_after: Optional[float] = None,
+               video_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """
+        The k best (chunk id, BM25 score) matches of the query, best first, optionally only from the given videos.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or k <= 0:
+            return []
+
+        with self._lock:
+            conn = self._connect()
+            total, average_length = conn.execute("SELECT COUNT(*), AVG(length) FROM chunks").fetchone()
+            if not total:
+                return []
+
+            # document frequencies over the whole index, the filter only limits which chunks are returned
+            idf = {}
+            rows = []
+            for start in range(0, len(terms), LOOKUP_BATCH):
+                batch = terms[start:start + LOOKUP_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                for term, frequency in conn.execute(
+                    f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term", batch
+                ):
+                    idf[term] = math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+
+                sql = f"""
+                    SELECT p.term, p.chunk_id, p.tf, c.length, c.video_id FROM postings p JOIN chunks c ON c.chunk_id = p.chunk_id
+                    WHERE p.term IN ({placeholders})
+                """
+                if embedded_after is not None:
+                    rows.extend(conn.execute(sql + " AND c.embedded_at > ?", (*batch, embedded_after)))
+                else:
+                    rows.extend(conn.execute(sql, batch))
+
+        # the video ids can be more than sqlite takes as parameters, so they are matched here
+        if video_ids is not None:
+            video_ids = set(video_ids)
+            rows = [row for row in rows if row[4] in video_ids]
+
+        if not rows:
+            return []
+
+        # every posting scored at once, then summed per chunk
+        terms_column, chunk_ids, tf, length, _ = zip(*rows)
+        tf = np.asarray(tf, dtype=np.float64)
+        length = np.asarray(length, dtype=np.float64)
+        weights = np.asarray([idf[term] for term in terms_column])
+
+        scores = weights * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / (average_length or 1.0)))
+        unique_ids, inverse = np.unique(np.asarray(chunk_ids), return_inverse=True)
+        totals = np.bincount(inverse, weights=scores)
+
+        top = np.argsort(-totals, kind='stable')[:k]
+        return [(str(unique_ids[index]), float(totals[index])) for index in top]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
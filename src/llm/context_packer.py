@@ -0,0 +1,91 @@
+# imports:
+# the token estimate is shared with the rate limiter, so the packed requests match what the limiter reserves
+from typing import Dict, List, Optional, Sequence
+
+from .rate_limiter import estimate_tokens
+
+# ---------------------------------------------------
+#  Context Window of Groq's llama-3.3-70b-versatile
+# ---------------------------------------------------
+
+MODEL_CONTEXT_WINDOW = 131072
+
+# the fraction of the context window a single request is filled up to
+DEFAULT_CONTEXT_FRACTION = 0.75
+
+# below this many chunk tokens per request a query is split into many small requests, which is warned about
+MIN_CHUNK_BUDGET = 1000
+
+# the delimiter between transcript chunks in the prompt
+CHUNK_DELIMITER = "\n\n###\n\n"
+
+# ---------------------------------------------
+#  Token Budget for the Chunks of One Request
+# ---------------------------------------------
+
+# args:
+#       - Takes the tokens of the rendered prompt without any transcripts (template, few-shot examples, question, claims/trends)
+#       - Takes the completion tokens (max_tokens) that need to fit in the same request
+#       - Takes the per request token limit, e.g. Groq's TPM limit, since a request larger than it is rejected outright
+def chunk_token_budget(fixed_tokens, completion_tokens, request_token_limit = None,
+                       context_window = MODEL_CONTEXT_WINDOW, context_fraction = DEFAULT_CONTEXT_FRACTION):
+    budget = int(context_window * context_fraction)
+    if request_token_limit is not None:
+        budget = min(budget, request_token_limit)
+
+    # a request without any transcripts already doesn't fit, so no packing can make it fit
+    chunk_budget = budget - fixed_tokens - completion_tokens
+    if chunk_budget <= 0:
+        raise ValueError(
+            f"The prompt without transcripts ({fixed_tokens} tokens) and the completion ({completion_tokens} tokens) "
+            f"don't fit in the {budget} token request budget"
+        )
+
+    if chunk_budget < MIN_CHUNK_BUDGET:
+        print(f"Only {chunk_budget} of the {budget} request tokens are left for transcript chunks, "
+              f"the chunks will be sent in many small requests", flush=True)
+    return chunk_budget
+
+# -------------------------------------------
+#  Pack Chunks into as Few Requests as Fit
+# -------------------------------------------
+
+def pack_chunks(formatted_chunks: Sequence[str], budget: int, keys: Optional[Sequence[str]] = None,
+                key_costs: Optional[Dict[str, int]] = None) -> List[List[int]]:
+    """
+    Pack formatted chunks into groups whose tokens fit in the budget, using as few groups as possible.
+
+    Chunks are placed first-fit in decreasing size order, then each group lists its chunk indices in the
+    original (retrieval) order and the groups are ordered by their first chunk, so the packing is deterministic.
+    A chunk larger than the budget on its own gets a group to itself, a budget of zero or less is an error.
+
+    With keys (e.g. the video id of each chunk) and key_costs (e.g. the tokens of each video's header), a
+    group pays the key's cost once for all of its chunks with that key.
+    """
+    if budget <= 0:
+        raise ValueError(f"No tokens left for transcript chunks (budget {budget})")
+
+    costs = [estimate_tokens(chunk + CHUNK_DELIMITER) for chunk in formatted_chunks]
+    keys = keys if keys is not None else [None] * len(costs)
+    key_costs = key_costs or {}
+
+    groups = []
+    group_tokens = []
+    group_keys = []
+    for index in sorted(range(len(costs)), key=lambda i: (-(costs[i] + key_costs.get(keys[i], 0)), i)):
+        for group_num, used in enumerate(group_tokens):
+            cost = costs[index] + (0 if keys[index] in group_keys[group_num] else key_costs.get(keys[index], 0))
+            if used + cost <= budget:
+                groups[group_num].append(index)
+                group_tokens[group_num] += cost
+                group_keys[group_num].add(keys[index])
+                break
+        else:
+            groups.append([index])
+            group_tokens.append(costs[index] + key_costs.get(keys[index], 0))
+            group_keys.append({keys[index]})
+
+    return sorted((sorted(group) for group in groups), key=lambda group: group[0])
+
+def join_chunks(formatted_chunks: Sequence[str], group: Sequence[int]) -> str:
+    return CHUNK_DELIMITER.join(formatted_chunks[index] for index in group)
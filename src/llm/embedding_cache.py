@@ -0,0 +1,233 @@
+# imports:
+# sqlite3 for the on-disk cache, numpy to store the vectors as float32 blobs, threading since batches are embedded concurrently
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# ----------------------------------
+#  Cache Defaults
+# ----------------------------------
+
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent.parent / 'data' / 'embedding_cache.sqlite3'
+
+# once the stored vectors pass this size the least recently used ones are evicted (~150k mxbai-embed-large vectors)
+DEFAULT_MAX_BYTES = 600 * 1024 * 1024
+
+# sqlite's default limit on the number of ? parameters is 999 on older builds
+LOOKUP_BATCH = 500
+
+# query vectors are kept apart from the chunk vectors of the same text, under the model name plus this suffix
+QUERY_MODEL_SUFFIX = ':query'
+
+# ----------------------------------
+#  Keys, Content Addressed
+# ----------------------------------
+
+# whitespace differences between re-chunking runs don't change the embedding key
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+# ----------------------------------
+#  Persistent Embedding Cache
+# ----------------------------------
+
+class EmbeddingCache:
+    """
+    SQLite cache of embedding vectors keyed by embedding model and normalized text hash.
+
+    Vectors are stored as float32 blobs, and the least recently used ones are evicted once
+    the stored vectors pass max_bytes. Hits and misses are counted until reset_stats() is called.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES, enabled: bool = True):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.hits = 0
+        self.misses = 0
+
+    # the database is only opened on first use
+    def _connect(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS vectors (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors (last_used)")
+
+            # the running size of the stored vectors, kept by triggers so eviction doesn't sum the table on every put
+            # (summed once for a cache from before the total, recursive triggers so replaced rows are subtracted too)
+            self._conn.execute("PRAGMA recursive_triggers = ON")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, bytes INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO totals SELECT 'vectors', COALESCE(SUM(LENGTH(vector)), 0) FROM vectors")
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS vectors_insert AFTER INSERT ON vectors
+                BEGIN UPDATE totals SET bytes = bytes + LENGTH(NEW.vector) WHERE name = 'vectors'; END
+            """)
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS vectors_delete AFTER DELETE ON vectors
+                BEGIN UPDATE totals SET bytes = bytes - LENGTH(OLD.vector) WHERE name = 'vectors'; END
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute("SELECT bytes FROM totals WHERE name = 'vectors'").fetchone()[0]
+
+    def _evict(self):
+        total = self._total_bytes()
+        if total <= self.max_bytes:
+            return
+
+        # drop the least recently used vectors until the cache fits again
+        freed = 0
+        evict_keys = []
+        for model, text_hash, size in self._conn.execute(
+            "SELECT model, text_hash, LENGTH(vector) FROM vectors ORDER BY last_used ASC"
+        ):
+            if total - freed <= self.max_bytes:
+                break
+            evict_keys.append((model, text_hash))
+            freed += size
+
+        self._conn.executemany("DELETE FROM vectors WHERE model = ? AND text_hash = ?", evict_keys)
+
+    # -------------------------------
+    #  Lookup and Store
+    # -------------------------------
+
+    def get_many(self, model: str, text_hashes: List[str]) -> Dict[str, List[float]]:
+        """
+        The cached vectors of the given text hashes, hashes that are not cached are left out.
+        """
+        if not self.enabled or not text_hashes:
+            return {}
+
+        unique_hashes = list(dict.fromkeys(text_hashes))
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            for start in range(0, len(unique_hashes), LOOKUP_BATCH):
+                batch = unique_hashes[start:start + LOOKUP_BATCH]
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM vectors WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    (model, *batch)
+                )
+                for text_hash, vector in rows:
+                    found[text_hash] = np.frombuffer(vector, dtype=np.float32).tolist()
+
+            now = time.time()
+            conn.executemany("UPDATE vectors SET last_used = ? WHERE model = ? AND text_hash = ?", [(now, model, h) for h in found])
+            conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(unique_hashes) - len(found)
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]):
+        if not self.enabled or not vectors:
+            return
+
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            conn.executemany(
+                "INSERT OR REPLACE INTO vectors VALUES (?, ?, ?, ?)",
+                [(model, text_hash, np.asarray(vector, dtype=np.float32).tobytes(), now) for text_hash, vector in vectors.items()]
+            )
+            self._evict()
+            conn.commit()
+
+    # -------------------------------
+    #  Per Run Statistics
+    # -------------------------------
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# ----------------------------------
+#  Embeddings Wrapper
+# ----------------------------------
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings that look every document up in an EmbeddingCache first, only the misses are sent to the wrapped model.
+
+    Texts that normalize to the same content are embedded once. Queries are cached the same way, apart from the chunks.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, cache: Optional[EmbeddingCache] = None):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache if cache is not None else EmbeddingCache()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        text_hashes = [hash_text(text) for text in texts]
+        vectors = self.cache.get_many(self.model, text_hashes)
+
+        # embed each missing text once, even if it is in the batch more than once
+        missing = {}
+        for text, text_hash in zip(texts, text_hashes):
+            if text_hash not in vectors and text_hash not in missing:
+                missing[text_hash] = text
+
+        if missing:
+            # rounded to float32 like the stored vectors, so a text gets the same vector whether or not it was cached
+            new_vectors = {
+                text_hash: np.asarray(vector, dtype=np.float32).tolist()
+                for text_hash, vector in zip(missing, self.embeddings.embed_documents(list(missing.values())))
+            }
+            self.cache.put_many(self.model, new_vectors)
+            vectors.update(new_vectors)
+
+        return [vectors[text_hash] for text_hash in text_hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        model = self.model + QUERY_MODEL_SUFFIX
+        text_hash = hash_text(text)
+
+        cached = self.cache.get_many(model, [text_hash])
+        if text_hash in cached:
+            return cached[text_hash]
+
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32).tolist()
+        self.cache.put_many(model, {text_hash: vector})
+        return vector
@@ -0,0 +1,138 @@
+# imports:
+# json for the line-delimited entries, os to fsync the appends and atomically replace the file when compacting
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# ----------------------------------
+#  Journal Locations
+# ----------------------------------
+
+DEFAULT_JOURNAL_PATH = Path(__file__).parent.parent.parent / 'data' / 'embedded_journal.jsonl'
+
+# the old log (a json list of video ids rewritten after every file), only read to seed a new journal
+LEGACY_LOG_PATH = Path(__file__).parent.parent.parent / 'data' / 'embedded_files.json'
+
+# compact once the journal has this many times more lines than videos
+COMPACT_RATIO = 2
+
+# ----------------------------------
+#  Append-Only Embedding Journal
+# ----------------------------------
+
+class EmbeddingJournal:
+    """
+    Line-delimited journal of embedded videos: one {"video_id", "chunk_ids", "model", "embedded_at"} entry per line.
+
+    Entries are only ever appended (and fsynced), so a crash can at worst leave a partial last line, which
+    load() drops. compact() rewrites the journal with the latest entry of each video and atomically replaces it.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, legacy_log_path=LEGACY_LOG_PATH):
+        self.path = Path(path)
+        self.legacy_log_path = Path(legacy_log_path) if legacy_log_path is not None else None
+        self._lock = threading.Lock()
+
+        # video id -> latest entry, and the number of lines in the file
+        self.entries: Dict[str, dict] = {}
+        self.lines = 0
+
+    # -------------------------------
+    #  Load
+    # -------------------------------
+
+    def load(self) -> Dict[str, dict]:
+        with self._lock:
+            self.entries = {}
+            self.lines = 0
+
+            if not self.path.exists():
+                self._seed_from_legacy_log()
+                return self.entries
+
+            content = self.path.read_bytes()
+
+            # an interrupted append leaves a partial last line, cut it off so the next append starts on a new line
+            complete = content.rfind(b'\n') + 1
+            if complete < len(content):
+                print(f"Dropping a partial last line of the embedding journal ({len(content) - complete} bytes)")
+                with open(self.path, 'r+b') as journal:
+                    journal.truncate(complete)
+
+            for line in content[:complete].decode('utf-8').splitlines():
+                self.lines += 1
+                try:
+                    entry = json.loads(line)
+                    self.entries[entry['video_id']] = entry
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    print(f"Skipping unreadable embedding journal line {self.lines}")
+
+            return self.entries
+
+    def _seed_from_legacy_log(self):
+        if self.legacy_log_path is None or not self.legacy_log_path.exists():
+            return
+
+        try:
+            video_ids = json.loads(self.legacy_log_path.read_text())
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Warning: could not read legacy embedded log, starting fresh: {e}")
+            return
+
+        self._append([{'video_id': video_id, 'chunk_ids': None, 'model': None, 'embedded_at': None} for video_id in video_ids])
+        print(f"Seeded the embedding journal with {len(video_ids)} video(s) from {self.legacy_log_path.name}")
+
+    def video_ids(self) -> set:
+        with self._lock:
+            return set(self.entries)
+
+    # -------------------------------
+    #  Append
+    # -------------------------------
+
+    def _append(self, entries: List[dict]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as journal:
+            journal.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+            journal.flush()
+            os.fsync(journal.fileno())
+
+        for entry in entries:
+            self.entries[entry['video_id']] = entry
+        self.lines += len(entries)
+
+    def record(self, videos: Dict[str, Iterable[str]], model: str, embedded_at: Optional[float] = None):
+        """
+        Append one entry per embedded video (video id -> its chunk ids) in a single write.
+        """
+        if not videos:
+            return
+
+        embedded_at = embedded_at if embedded_at is not None else time.time()
+        with self._lock:
+            self._append([
+                {'video_id': video_id, 'chunk_ids': list(chunk_ids), 'model': model, 'embedded_at': embedded_at}
+                for video_id, chunk_ids in videos.items()
+            ])
+
+    # -------------------------------
+    #  Compaction
+    # -------------------------------
+
+    def needs_compaction(self) -> bool:
+        with self._lock:
+            return self.lines > COMPACT_RATIO * max(len(self.entries), 1)
+
+    def compact(self):
+        with self._lock:
+            temp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as journal:
+                journal.write(''.join(json.dumps(entry) + '\n' for entry in self.entries.values()))
+                journal.flush()
+                os.fsync(journal.fileno())
+
+            os.replace(temp_path, self.path)
+            self.lines = len(self.entries)
@@ -0,0 +1,289 @@
+# imports:
+# json for the fast path and its C string scanner, re to skip whitespace and prose in one C call
+import re
+import json
+from json.decoder import scanstring
+from typing import Any, List, Optional, Tuple
+
+# ---------------------------------------
+#  Characters the Scanner Cares About
+# ---------------------------------------
+
+STRING_SPECIAL = re.compile(r'["\\]')
+JSON_START = re.compile(r'[{\[]')
+
+# the next structural character, or the next bare literal (number, true/false/null, unquoted key), after any whitespace
+TOKEN = re.compile(r'\s*(?:([{}\[\],:"])|([^\s,:{}\[\]"]+))')
+LITERAL_REST = re.compile(r'[^\s,:{}\[\]"]*')
+LITERALS = {'true': True, 'false': False, 'null': None}
+
+DECODER = json.JSONDecoder()
+
+def decode_string(raw: str) -> str:
+    try:
+        return scanstring(raw + '"', 0)[0]
+    except ValueError:
+        return raw
+
+# ---------------------------------------
+#  Incremental, Error Tolerant Parser
+# ---------------------------------------
+
+class IncrementalJSONParser:
+    """
+    Single pass JSON parser that can be fed a response in pieces (e.g. streamed tokens).
+
+    Anything before the first { or [ (prose, a ```json fence) is skipped and parsing stops once
+    that top level value closes, so trailing prose is never scanned. Missing and trailing commas
+    are tolerated, and if the text ends early result() returns everything parsed so far minus the
+    unfinished value. Each entry of the top level object/list is returned by feed() once it is complete.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.done = False
+
+        # frames of [container, expecting ('key', 'colon', 'value' or 'comma'), pending key]
+        self._stack = []
+
+        # raw pieces of the string or bare literal being read, None when not inside one
+        self._string = None
+        self._escape = False
+        self._literal = None
+
+        self._completed = []
+
+    @property
+    def started(self) -> bool:
+        return self.root is not None
+
+    @property
+    def truncated(self) -> bool:
+        return self.started and not self.done
+
+    def feed(self, text: str) -> List[Tuple[Any, Any]]:
+        """
+        Parse the next piece of text, returning the (key or index, value) of the top level entries it completed.
+        """
+        self._completed = []
+        i, n = 0, len(text)
+
+        # a literal cut off at the end of the previous piece
+        if self._literal is not None and n:
+            rest = LITERAL_REST.match(text).end()
+            self._literal.append(text[:rest])
+            if rest == n:
+                return self._completed
+            self._end_literal()
+            i = rest
+
+        while i < n and not self.done:
+            # inside a string, jump straight to the next quote or backslash
+            if self._string is not None:
+                if self._escape:
+                    self._string.append(text[i])
+                    self._escape = False
+                    i += 1
+                    continue
+
+                match = STRING_SPECIAL.search(text, i)
+                if match is None:
+                    self._string.append(text[i:])
+                    break
+
+                j = match.start()
+                self._string.append(text[i:j])
+                if text[j] == '\\':
+                    self._string.append('\\')
+                    self._escape = True
+                else:
+                    raw = ''.join(self._string)
+                    self._string = None
+                    self._end_string(decode_string(raw))
+                i = j + 1
+                continue
+
+            # skip everything before the top level value
+            if not self._stack:
+                match = JSON_START.search(text, i)
+                if match is None:
+                    break
+                self._open(match.group())
+                i = match.end()
+                continue
+
+            match = TOKEN.match(text, i)
+            if match is None:
+                break
+            i = match.end()
+
+            c = match.group(1)
+            if c is None:
+                # the literal may continue in the next piece
+                self._literal = [match.group(2)]
+                if i < n:
+                    self._end_literal()
+                continue
+
+            frame = self._stack[-1]
+            if c == '{' or c == '[':
+                # an entry of the top level value is usually well formed, so decode it whole in C when it is all here
+                if len(self._stack) == 1 and frame[1] == 'value':
+                    try:
+                        value, i = DECODER.raw_decode(text, i - 1)
+                    except ValueError:
+                        pass
+                    else:
+                        self._value_done(value, attach=True)
+                        continue
+                self._open(c)
+            elif c == '}' or c == ']':
+                self._close()
+            elif c == '"':
+                # a string that ends in this piece is decoded in one C call, otherwise it is buffered until it does
+                try:
+                    value, i = scanstring(text, i)
+                except ValueError:
+                    self._string = []
+                else:
+                    self._end_string(value)
+            elif c == ',':
+                frame[1] = 'key' if isinstance(frame[0], dict) else 'value'
+            else:
+                frame[1] = 'value'
+
+        return self._completed
+
+    def result(self) -> Optional[Any]:
+        """
+        The parsed value, or its complete entries if the text ended early (None if no { or [ was seen).
+        """
+        if self.done or len(self._stack) < 2:
+            return self.root
+
+        # the top level entry being read is attached already, so it is left out of a copy
+        root, _, key = self._stack[0]
+        if isinstance(root, list):
+            return root[:-1]
+        return {entry_key: value for entry_key, value in root.items() if entry_key != key}
+
+    # -------------------------------
+    #  Building the Value
+    # -------------------------------
+
+    def _open(self, c):
+        container = {} if c == '{' else []
+        if not self._stack:
+            self.root = container
+        else:
+            # attached right away, so nested entries are filled in place (result() drops an unfinished top level entry)
+            self._attach(container)
+        self._stack.append([container, 'key' if c == '{' else 'value', None])
+
+    def _close(self):
+        container = self._stack.pop()[0]
+        if not self._stack:
+            self.done = True
+        else:
+            self._value_done(container)
+
+    def _attach(self, value):
+        container, expecting, key = self._stack[-1]
+        if isinstance(container, list):
+            container.append(value)
+        elif key is not None:
+            container[key] = value
+
+    def _value_done(self, value, attach = False):
+        frame = self._stack[-1]
+        if attach:
+            self._attach(value)
+
+        if len(self._stack) == 1:
+            container = frame[0]
+            self._completed.append((frame[2], value) if isinstance(container, dict) else (len(container) - 1, value))
+
+        frame[1] = 'comma'
+        frame[2] = None
+
+    def _end_string(self, value):
+        frame = self._stack[-1]
+        # a string right after a value means the comma is missing, so it starts the next key
+        if isinstance(frame[0], dict) and frame[1] in ('key', 'comma'):
+            frame[1] = 'colon'
+            frame[2] = value
+        else:
+            self._value_done(value, attach=True)
+
+    def _end_literal(self):
+        word = ''.join(self._literal)
+        self._literal = None
+
+        frame = self._stack[-1]
+        if isinstance(frame[0], dict) and frame[1] in ('key', 'comma'):
+            frame[1] = 'colon'
+            frame[2] = word
+            return
+
+        if word in LITERALS:
+            value = LITERALS[word]
+        else:
+            try:
+                value = json.loads(word)
+            except ValueError:
+                value = word
+        self._value_done(value, attach=True)
+
+# ---------------------------------------
+#  List Output to the Expected Dict
+# ---------------------------------------
+
+# the model sometimes returns a list of entries instead of a dict keyed by title
+def entries_to_dict(parsed, query_type: str):
+    if not isinstance(parsed, list):
+        return parsed
+
+    return {
+        item.get(f'{query_type[:-1]} Title') or item.get(f'{query_type[:-1]} title') or item.get('title') or f"{query_type[:-1]} {i+1}":
+        item.get('Description') or item.get('description') or item.get('text') or str(item)
+        for i, item in enumerate(parsed)
+        if isinstance(item, dict)
+    }
+
+# ---------------------------------------
+#  Extract the JSON from a Response
+# ---------------------------------------
+
+# the { or [ positions a value is tried from, prose before the json can hold brackets too (e.g. "the claims [JSON]:")
+MAX_JSON_STARTS = 8
+
+def json_starts(text: str) -> List[int]:
+    return [match.start() for _, match in zip(range(MAX_JSON_STARTS), JSON_START.finditer(text))]
+
+def parse_from(text: str, start: int, query_type: str):
+    # well formed output decodes in one pass in C, raw_decode ignores whatever follows the value
+    try:
+        parsed, _ = DECODER.raw_decode(text, start)
+        return entries_to_dict(parsed, query_type)
+    except ValueError:
+        pass
+
+    # otherwise one tolerant pass handles truncation, missing/trailing commas and the rest
+    parser = IncrementalJSONParser()
+    parser.feed(text[start:])
+    return entries_to_dict(parser.result(), query_type)
+
+def extract_json_from_response(text: str, query_type: str) -> dict:
+    starts = json_starts(text)
+    if not starts:
+        return {"raw_response": text}
+
+    # the first start that gives entries wins, so a bracket in the prose falls through to the actual json
+    first = None
+    for start in starts:
+        parsed = parse_from(text, start, query_type)
+        if isinstance(parsed, dict) and parsed:
+            return parsed
+        if first is None:
+            first = parsed
+    return first
@@ -0,0 +1,181 @@
+# imports:
+# sqlite3 for the on-disk cache, hashlib to hash the rendered prompts, threading since queries can run concurrently
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+# ----------------------------------
+#  Cache Defaults
+# ----------------------------------
+
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent.parent / 'data' / 'llm_cache.sqlite3'
+
+# entries older than this are treated as misses and purged
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+
+# once the stored responses pass this size the least recently used ones are evicted
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+# ----------------------------------
+#  Persistent LLM Response Cache
+# ----------------------------------
+
+def hash_prompt(rendered_prompt: str) -> str:
+    return hashlib.sha256(rendered_prompt.encode('utf-8')).hexdigest()
+
+class LLMCache:
+    """
+    SQLite cache of LLM responses keyed by template name, rendered prompt hash, model and temperature.
+
+    Entries expire after ttl_seconds, and the least recently used entries are evicted once the
+    stored responses pass max_bytes. Hits and misses are counted until reset_stats() is called.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_bytes: int = DEFAULT_MAX_BYTES, enabled: bool = True):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.hits = 0
+        self.misses = 0
+
+    # the database is only opened on first use
+    def _connect(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    template_name TEXT NOT NULL,
+                    prompt_hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    temperature REAL NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (template_name, prompt_hash, model, temperature)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+            # the running size of the stored responses, kept by triggers so eviction doesn't sum the table on every put
+            # (summed once for a cache from before the total, recursive triggers so replaced rows are subtracted too)
+            self._conn.execute("PRAGMA recursive_triggers = ON")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, bytes INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO totals SELECT 'responses', COALESCE(SUM(size), 0) FROM responses")
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses
+                BEGIN UPDATE totals SET bytes = bytes + NEW.size WHERE name = 'responses'; END
+            """)
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses
+                BEGIN UPDATE totals SET bytes = bytes - OLD.size WHERE name = 'responses'; END
+            """)
+            self._purge_expired(time.time())
+            self._conn.commit()
+        return self._conn
+
+    def _purge_expired(self, now):
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute("SELECT bytes FROM totals WHERE name = 'responses'").fetchone()[0]
+
+    def _evict(self):
+        total = self._total_bytes()
+        if total <= self.max_bytes:
+            return
+
+        # drop the least recently used entries until the cache fits again
+        freed = 0
+        evict_keys = []
+        for key_and_size in self._conn.execute(
+            "SELECT template_name, prompt_hash, model, temperature, size FROM responses ORDER BY last_used ASC"
+        ):
+            if total - freed <= self.max_bytes:
+                break
+            evict_keys.append(key_and_size[:4])
+            freed += key_and_size[4]
+
+        self._conn.executemany(
+            "DELETE FROM responses WHERE template_name = ? AND prompt_hash = ? AND model = ? AND temperature = ?",
+            evict_keys
+        )
+
+    # -------------------------------
+    #  Lookup and Store
+    # -------------------------------
+
+    def get(self, template_name: str, rendered_prompt: str, model: str, temperature: float) -> Optional[str]:
+        if not self.enabled:
+            return None
+
+        key = (template_name, hash_prompt(rendered_prompt), model, float(temperature))
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            row = conn.execute(
+                "SELECT response, created_at FROM responses WHERE template_name = ? AND prompt_hash = ? AND model = ? AND temperature = ?",
+                key
+            ).fetchone()
+
+            if row is None or (self.ttl_seconds is not None and row[1] < now - self.ttl_seconds):
+                self.misses += 1
+                return None
+
+            conn.execute(
+                "UPDATE responses SET last_used = ? WHERE template_name = ? AND prompt_hash = ? AND model = ? AND temperature = ?",
+                (now, *key)
+            )
+            conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, template_name: str, rendered_prompt: str, model: str, temperature: float, response: str):
+        if not self.enabled:
+            return
+
+        key = (template_name, hash_prompt(rendered_prompt), model, float(temperature))
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, response, len(response.encode('utf-8')), now, now)
+            )
+            self._evict()
+            conn.commit()
+
+    # -------------------------------
+    #  Per Run Statistics
+    # -------------------------------
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,66 @@
+# imports:
+# numpy for the vectorized similarity matrices
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# ----------------------------------
+#  Normalized float32 Matrices
+# ----------------------------------
+
+# rows scaled to unit length so dot products are cosine similarities, zero rows stay zero (similarity 0 to everything)
+def normalize_rows(matrix) -> np.ndarray:
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+# ----------------------------------
+#  Maximal Marginal Relevance
+# ----------------------------------
+
+def mmr_select_batch(query_vectors, candidates, k: int, lambda_mult: float = 0.5, counts: Optional[Sequence[int]] = None) -> List[List[int]]:
+    """
+    Maximal marginal relevance selection for a batch of queries at once.
+
+    query_vectors is (queries, dim) and candidates (queries, pool, dim), a query with fewer candidates than the
+    pool is padded and its number of real candidates given in counts. Both are normalized once and the
+    candidate-candidate similarities computed in one matrix product, so each selection step is a single
+    vectorized update. Returns the selected candidate indices of each query, in selection order.
+    """
+    queries = normalize_rows(query_vectors)
+    pool = normalize_rows(candidates)
+    batch, size = pool.shape[:2]
+    counts = np.full(batch, size) if counts is None else np.asarray(counts)
+
+    steps = min(k, size)
+    if steps <= 0:
+        return [[] for _ in range(batch)]
+
+    relevance = np.matmul(pool, queries[:, :, None])[:, :, 0]
+    similarity = np.matmul(pool, pool.transpose(0, 2, 1))
+
+    available = np.arange(size)[None, :] < counts[:, None]
+    rows = np.arange(batch)
+    selected = np.empty((batch, steps), dtype=np.int64)
+
+    # the first pick is the most relevant candidate, every next one trades relevance off against its
+    # highest similarity to the candidates already picked
+    score = relevance
+    for step in range(steps):
+        pick = np.argmax(np.where(available, score, -np.inf), axis=1)
+        selected[:, step] = pick
+        available[rows, pick] = False
+
+        redundancy = similarity[rows, pick] if step == 0 else np.maximum(redundancy, similarity[rows, pick])
+        score = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+
+    return [selected[query, :min(k, counts[query])].tolist() for query in range(batch)]
+
+def mmr_select(query_vector, candidates, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """
+    Maximal marginal relevance selection for one query over a (pool, dim) candidate matrix.
+    """
+    candidates = np.asarray(candidates, dtype=np.float32)
+    if len(candidates) == 0:
+        return []
+    return mmr_select_batch(np.asarray(query_vector)[None, :], candidates[None, :, :], k, lambda_mult)[0]
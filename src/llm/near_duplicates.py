@@ -0,0 +1,340 @@
+# imports:
+# numpy for the minhash signatures, sqlite3 for the persistent LSH buckets of the chunks embedded so far,
+# hashlib/zlib for stable (across processes) band and token hashes
+import zlib
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .bm25_index import TOKEN
+from .rate_limiter import estimate_tokens
+
+# ----------------------------------
+#  Index Location and MinHash Settings
+# ----------------------------------
+
+DEFAULT_INDEX_PATH = Path(__file__).parent.parent.parent / 'data' / 'near_duplicates.sqlite3'
+
+# estimated jaccard similarity (of the word shingles) from which a chunk is a near-duplicate of an earlier one
+DEFAULT_THRESHOLD = 0.8
+
+# words per shingle, and the number of hash functions of a signature
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+
+# the hash functions are (a * h + b) mod a mersenne prime, from a fixed seed so signatures match across runs
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+SEED = 1
+
+# sqlite's default limit on the number of ? parameters is 999 on older builds
+LOOKUP_BATCH = 500
+
+# ----------------------------------
+#  MinHash Signatures
+# ----------------------------------
+
+def permutations(num_perm: int = NUM_PERM, seed: int = SEED) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+# 32 bit hashes of the text's overlapping word shingles, a text shorter than a shingle is one shingle
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    words = TOKEN.findall(text.lower())
+    if len(words) <= size:
+        return np.array([zlib.crc32(' '.join(words).encode())], dtype=np.uint64)
+
+    # each word hashed once, then the shingles combined from them as a polynomial in one vectorized pass
+    word_hashes = np.array([zlib.crc32(word.encode()) for word in words], dtype=np.uint64)
+    hashes = np.zeros(len(words) - size + 1, dtype=np.uint64)
+    for offset in range(size):
+        hashes = (hashes * np.uint64(1000003) + word_hashes[offset:len(hashes) + offset]) & MAX_HASH
+    return np.unique(hashes)
+
+def minhash_signatures(texts: Iterable[str], num_perm: int = NUM_PERM, shingle_size: int = SHINGLE_SIZE,
+                       seed: int = SEED) -> np.ndarray:
+    """
+    (texts, num_perm) uint32 MinHash signatures: the fraction of positions two signatures agree on estimates
+    the jaccard similarity of the two texts' shingle sets.
+    """
+    a, b = permutations(num_perm, seed)
+    signatures = [
+        ((shingle_hashes(text, shingle_size)[:, None] * a + b) % MERSENNE_PRIME & MAX_HASH).min(axis=0)
+        for text in texts
+    ]
+    return np.array(signatures, dtype=np.uint32).reshape(-1, num_perm)
+
+# ----------------------------------
+#  LSH Bands
+# ----------------------------------
+
+def rows_per_band(threshold: float, num_perm: int = NUM_PERM) -> int:
+    """
+    The band size of the LSH buckets for a threshold: two signatures share a bucket with probability
+    1 - (1 - s^rows)^bands at similarity s, which rises steepest around (1 / bands)^(1 / rows).
+
+    The largest such point at or below the threshold is used, so pairs just above it are still found (the
+    candidates are checked against the threshold afterwards).
+    """
+    layouts = [rows for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [rows for rows in layouts if (rows / num_perm) ** (1 / rows) <= threshold]
+    return max(below, key=lambda rows: (rows / num_perm) ** (1 / rows)) if below else 1
+
+# one signed 64 bit key per band, the band number hashed in so equal rows of different bands don't collide
+def band_keys(signatures: np.ndarray, rows: int) -> np.ndarray:
+    keys = np.empty((len(signatures), signatures.shape[1] // rows), dtype=np.int64)
+    for band in range(keys.shape[1]):
+        for index, signature in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+            digest = hashlib.blake2b(band.to_bytes(2, 'big') + signature.tobytes(), digest_size=8).digest()
+            keys[index, band] = int.from_bytes(digest, 'big', signed=True)
+    return keys
+
+# ----------------------------------
+#  Persistent Near-Duplicate Index
+# ----------------------------------
+
+class NearDuplicateIndex:
+    """
+    SQLite MinHash LSH index of the chunks embedded so far: each chunk's signature, and its band keys.
+
+    check_many() finds, for each new chunk, the most similar earlier chunk (indexed, staged, or earlier in the same
+    call) whose estimated jaccard similarity reaches the threshold. Chunks that aren't near-duplicates are indexed,
+    or with stage only held in memory until commit() is given their ids once they are embedded, so the index only
+    ever points at embedded chunks. The band layout follows the threshold, and the band keys are rebuilt from the
+    stored signatures when the threshold changes.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, threshold: float = DEFAULT_THRESHOLD):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.rows = rows_per_band(threshold)
+        self._lock = threading.Lock()
+        self._conn = None
+
+        # chunk id -> (video id, signature, band keys) of the staged chunks, and band key -> their chunk ids
+        self._staged = {}
+        self._staged_buckets = {}
+
+        # per run statistics
+        self.checked = 0
+        self.duplicates = 0
+        self.duplicate_tokens = 0
+
+    # the database is only opened on first use
+    def _connect(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS signatures (
+                    chunk_id TEXT PRIMARY KEY,
+                    video_id TEXT,
+                    signature BLOB NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key INTEGER NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    PRIMARY KEY (key, chunk_id)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS buckets_chunk_id ON buckets (chunk_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS signatures_video_id ON signatures (video_id)")
+            self._rebuild_buckets()
+            self._conn.commit()
+        return self._conn
+
+    # signatures are kept as they are, only the band keys depend on the threshold
+    def _rebuild_buckets(self):
+        row = self._conn.execute("SELECT value FROM settings WHERE key = 'rows_per_band'").fetchone()
+        if row is not None and int(row[0]) == self.rows:
+            return
+
+        self._conn.execute("DELETE FROM buckets")
+        found = self._conn.execute("SELECT chunk_id, signature FROM signatures").fetchall()
+        if found:
+            signatures = np.frombuffer(b''.join(signature for _, signature in found), dtype=np.uint32).reshape(len(found), NUM_PERM)
+            self._insert_buckets([chunk_id for chunk_id, _ in found], band_keys(signatures, self.rows))
+        self._conn.execute("INSERT OR REPLACE INTO settings VALUES ('rows_per_band', ?)", (str(self.rows),))
+
+    def _insert_buckets(self, chunk_ids, keys):
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO buckets VALUES (?, ?)",
+            ((int(key), chunk_id) for chunk_id, chunk_keys in zip(chunk_ids, keys) for key in chunk_keys)
+        )
+
+    # chunk id -> signature of the indexed chunks sharing a bucket with any of the keys
+    def _candidates(self, keys: np.ndarray) -> dict:
+        unique_keys = [int(key) for key in np.unique(keys)]
+        by_key, signatures = {}, {}
+        for start in range(0, len(unique_keys), LOOKUP_BATCH):
+            batch = unique_keys[start:start + LOOKUP_BATCH]
+            placeholders = ','.join('?' * len(batch))
+            for key, chunk_id, signature in self._conn.execute(f"""
+                SELECT b.key, b.chunk_id, s.signature FROM buckets b JOIN signatures s ON s.chunk_id = b.chunk_id
+                WHERE b.key IN ({placeholders})
+            """, batch):
+                by_key.setdefault(key, []).append(chunk_id)
+                signatures[chunk_id] = np.frombuffer(signature, dtype=np.uint32)
+
+        for key in unique_keys:
+            for chunk_id in self._staged_buckets.get(key, ()):
+                by_key.setdefault(key, []).append(chunk_id)
+                signatures[chunk_id] = self._staged[chunk_id][1]
+        return by_key, signatures
+
+    def _write_signatures(self, chunk_ids, video_ids, signatures, keys):
+        self._conn.executemany("DELETE FROM buckets WHERE chunk_id = ?", [(chunk_id,) for chunk_id in chunk_ids])
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO signatures VALUES (?, ?, ?)",
+            [(chunk_id, video_id, signature.tobytes()) for chunk_id, video_id, signature in zip(chunk_ids, video_ids, signatures)]
+        )
+        self._insert_buckets(chunk_ids, keys)
+
+    def _unstage(self, chunk_ids):
+        for chunk_id in chunk_ids:
+            _, _, keys = self._staged.pop(chunk_id)
+            for key in keys:
+                self._staged_buckets[key].discard(chunk_id)
+                if not self._staged_buckets[key]:
+                    del self._staged_buckets[key]
+
+    # -------------------------------
+    #  Find Near-Duplicates
+    # -------------------------------
+
+    def check_many(self, documents: List, stage: bool = False) -> List[Optional[Tuple[str, float]]]:
+        """
+        (chunk id, estimated jaccard similarity) of the earlier chunk each document (a langchain Document with
+        an id) near-duplicates, or None for a new chunk, which is then indexed (staged with stage).
+        """
+        if not documents:
+            return []
+
+        signatures = minhash_signatures(doc.page_content for doc in documents)
+        keys = band_keys(signatures, self.rows)
+
+        with self._lock:
+            conn = self._connect()
+            by_key, candidate_signatures = self._candidates(keys)
+
+            results, kept = [], []
+            for index, doc in enumerate(documents):
+                candidates = {chunk_id for key in keys[index] for chunk_id in by_key.get(int(key), ()) if chunk_id != doc.id}
+
+                best = None
+                if candidates:
+                    candidate_ids = sorted(candidates)
+                    matrix = np.stack([candidate_signatures[chunk_id] for chunk_id in candidate_ids])
+                    similarity = (matrix == signatures[index]).mean(axis=1)
+                    position = int(np.argmax(similarity))
+                    if similarity[position] >= self.threshold:
+                        best = (candidate_ids[position], round(float(similarity[position]), 4))
+                results.append(best)
+
+                if best is not None:
+                    self.duplicates += 1
+                    self.duplicate_tokens += estimate_tokens(doc.page_content)
+                    continue
+
+                # new chunks are candidates for the rest of the call too
+                kept.append(index)
+                candidate_signatures[doc.id] = signatures[index]
+                for key in keys[index]:
+                    by_key.setdefault(int(key), []).append(doc.id)
+
+            self.checked += len(documents)
+
+            chunk_ids = [documents[index].id for index in kept]
+            video_ids = [documents[index].metadata.get('video_id') for index in kept]
+            if not stage:
+                self._write_signatures(chunk_ids, video_ids, signatures[kept], keys[kept])
+                conn.commit()
+                return results
+
+            # a chunk staged again replaces its earlier signature
+            self._unstage([chunk_id for chunk_id in chunk_ids if chunk_id in self._staged])
+            for chunk_id, video_id, index in zip(chunk_ids, video_ids, kept):
+                chunk_keys = [int(key) for key in keys[index]]
+                self._staged[chunk_id] = (video_id, signatures[index], chunk_keys)
+                for key in chunk_keys:
+                    self._staged_buckets.setdefault(key, set()).add(chunk_id)
+        return results
+
+    # the staged chunks that are now embedded are indexed
+    def commit(self, chunk_ids: Iterable[str]):
+        with self._lock:
+            conn = self._connect()
+            chunk_ids = [chunk_id for chunk_id in dict.fromkeys(chunk_ids) if chunk_id in self._staged]
+            if not chunk_ids:
+                return
+            staged = [self._staged[chunk_id] for chunk_id in chunk_ids]
+            self._write_signatures(
+                chunk_ids,
+                [video_id for video_id, _, _ in staged],
+                np.stack([signature for _, signature, _ in staged]),
+                np.array([keys for _, _, keys in staged], dtype=np.int64)
+            )
+            conn.commit()
+            self._unstage(chunk_ids)
+
+    # the videos of the given staged chunks, i.e. the ones that aren't embedded yet
+    def staged_videos(self, chunk_ids: Iterable[str]) -> set:
+        with self._lock:
+            return {self._staged[chunk_id][0] for chunk_id in chunk_ids if chunk_id in self._staged}
+
+    # the staged chunks of videos whose embedding failed are dropped, so nothing is checked against them
+    def discard_videos(self, video_ids: Iterable[str]):
+        video_ids = set(video_ids)
+        with self._lock:
+            self._unstage([chunk_id for chunk_id, (video_id, _, _) in self._staged.items() if video_id in video_ids])
+
+    # a video that is embedded again is checked against everything but its own earlier chunks
+    def forget_videos(self, video_ids: Iterable[str]):
+        video_ids = list(video_ids)
+        with self._lock:
+            conn = self._connect()
+            forgotten = set(video_ids)
+            self._unstage([chunk_id for chunk_id, (video_id, _, _) in self._staged.items() if video_id in forgotten])
+            for video_id in video_ids:
+                conn.execute("DELETE FROM buckets WHERE chunk_id IN (SELECT chunk_id FROM signatures WHERE video_id = ?)", (video_id,))
+                conn.execute("DELETE FROM signatures WHERE video_id = ?", (video_id,))
+            conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    # -------------------------------
+    #  Per Run Statistics
+    # -------------------------------
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'checked': self.checked,
+                'near_duplicates': self.duplicates,
+                'near_duplicate_rate': round(self.duplicates / self.checked, 3) if self.checked else 0.0,
+                'near_duplicate_tokens': self.duplicate_tokens
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.checked = 0
+            self.duplicates = 0
+            self.duplicate_tokens = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
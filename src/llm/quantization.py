@@ -0,0 +1,60 @@
+# imports:
+# numpy for the quantized rows and their approximate scores
+import numpy as np
+
+# ----------------------------------
+#  Quantization Kinds
+# ----------------------------------
+
+# int8: each component scaled by the row's largest component to [-127, 127], 1 byte per dimension plus a float32 scale
+# binary: the sign of each component, 1 bit per dimension (32x smaller than float32)
+QUANTIZATIONS = ('int8', 'binary')
+
+def quantized_dtype(kind: str, dim: int) -> np.dtype:
+    """
+    The numpy dtype of one quantized row, so a quantized file maps as a 1d array of rows.
+    """
+    if kind == 'int8':
+        return np.dtype([('q', np.int8, (dim,)), ('scale', np.float32)])
+    if kind == 'binary':
+        return np.dtype((np.uint8, ((dim + 7) // 8,)))
+    raise ValueError(f"Unknown quantization {kind!r}, expected one of {QUANTIZATIONS}")
+
+# ----------------------------------
+#  Quantize
+# ----------------------------------
+
+def quantize(kind: str, vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if kind == 'binary':
+        return np.packbits(vectors > 0, axis=1)
+
+    rows = np.zeros(len(vectors), dtype=quantized_dtype(kind, vectors.shape[1]))
+    largest = np.abs(vectors).max(axis=1)
+    scale = np.where(largest > 0, largest / 127, 1.0).astype(np.float32)
+    rows['q'] = np.clip(np.rint(vectors / scale[:, None]), -127, 127)
+    rows['scale'] = scale
+    return rows
+
+# ----------------------------------
+#  Approximate Scores
+# ----------------------------------
+
+def approximate_scores(kind: str, rows: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """
+    (rows, queries) scores that rank like the dot products of the original vectors with the float32 queries.
+    """
+    if kind == 'int8':
+        return (rows['q'].astype(np.float32) @ queries.T) * rows['scale'][:, None]
+
+    # matching signs minus differing ones, i.e. dim - 2 * hamming distance, the bits compared 64 at a time when they fit
+    rows = np.ascontiguousarray(rows)
+    query_bits = np.packbits(queries > 0, axis=1)
+    if rows.shape[1] % 8 == 0:
+        rows, query_bits = rows.view(np.uint64), query_bits.view(np.uint64)
+
+    scores = np.empty((len(rows), len(queries)), dtype=np.float32)
+    for query, bits in enumerate(query_bits):
+        hamming = np.bitwise_count(np.bitwise_xor(rows, bits)).sum(axis=1, dtype=np.int32)
+        scores[:, query] = queries.shape[1] - 2 * hamming
+    return scores
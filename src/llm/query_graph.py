@@ -0,0 +1,101 @@
+# imports:
+# concurrent.futures for running the independent queries in parallel threads
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List
+
+# ------------------------------------------------------
+#  Inputs of each Scheduled Query Type
+# ------------------------------------------------------
+
+# query type -> the query types whose results it uses
+QUERY_GRAPH = {
+    'claims': [],
+    'risk_factors': [],
+    'trends': ['claims'],
+    'narratives': ['claims', 'trends'],
+}
+
+# ------------------------------------------------------
+#  Validate the Graph
+# ------------------------------------------------------
+
+def check_graph(graph: Dict[str, List[str]]):
+    for node, dependencies in graph.items():
+        for dependency in dependencies:
+            if dependency not in graph:
+                raise ValueError(f"Query '{node}' depends on unknown query '{dependency}'")
+
+    # depth first search for cycles
+    visiting, visited = set(), set()
+
+    def visit(node):
+        if node in visited:
+            return
+        if node in visiting:
+            raise ValueError(f"Query graph has a cycle through '{node}'")
+        visiting.add(node)
+        for dependency in graph[node]:
+            visit(dependency)
+        visiting.discard(node)
+        visited.add(node)
+
+    for node in graph:
+        visit(node)
+
+# ------------------------------------------------------
+#  Run the Graph, Each Node as Soon as its Inputs Exist
+# ------------------------------------------------------
+
+# args:
+#       - Takes the graph of query type -> query types it depends on
+#       - Takes run_node(node, dependency_results, timing), which runs one query; timing is a dict with the node's
+#         start offset that run_node can add to (e.g. to store it with the result)
+#       - Takes the maximum number of queries run at once, by default all independent ones
+# returns the results, the errors and the timings of each node, nodes whose inputs failed are skipped
+def run_graph(graph: Dict[str, List[str]], run_node: Callable, max_workers = None):
+    check_graph(graph)
+
+    results, errors, timings = {}, {}, {}
+    pending = dict(graph)
+    running = {}
+
+    graph_start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(graph) or 1) as executor:
+        while pending or running:
+            # skip nodes whose inputs failed or were skipped themselves
+            for node, dependencies in list(pending.items()):
+                failed = [dependency for dependency in dependencies if dependency in errors]
+                if failed:
+                    errors[node] = f"skipped, depends on failed query/queries {failed}"
+                    del pending[node]
+
+            # start every node whose inputs are all done
+            for node, dependencies in list(pending.items()):
+                if all(dependency in results for dependency in dependencies):
+                    timing = {
+                        'depends_on': list(dependencies),
+                        'started_after_s': round(time.perf_counter() - graph_start, 3)
+                    }
+                    timings[node] = timing
+
+                    future = executor.submit(run_node, node, {dependency: results[dependency] for dependency in dependencies}, timing)
+                    running[future] = (node, time.perf_counter())
+                    del pending[node]
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node, node_start = running.pop(future)
+                timings[node]['finished_after_s'] = round(time.perf_counter() - graph_start, 3)
+                timings[node].setdefault('duration_s', round(time.perf_counter() - node_start, 3))
+
+                try:
+                    results[node] = future.result()
+                except Exception as e:
+                    errors[node] = f"{type(e).__name__}: {e}"
+
+    return results, errors, timings
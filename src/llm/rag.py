@@ -1,8 +1,9 @@
 # imports:
 import os
+import asyncio
 import json
-import re
 import time
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime, timezone
 from typing import Optional, Dict, List
@@ -10,17 +11,34 @@ from typing import Optional, Dict, List
 # import MongoDB
 from pymongo import MongoClient
 
-# import retriever from vector.py
-from .vector import retrieval
+# import retriever from vector.py (the embeddings and vector store are only built on the first retrieval)
+from .vector import retrieval, RETRIEVAL_MODE
 
 # import AI terms from constants file
 from ..constants import AI_TERMS
 
 # import Groq  and Langchain (prompting)
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import AIMessage
 
 # import groq
-from langchain_groq import ChatGroq
+import httpx
+from groq import RateLimitError
+
+# import the shared rate limiter for Groq's RPM/TPM limits
+from .rate_limiter import RateLimiter, estimate_tokens, DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE
+
+# import the packer that fills each request up to the token budget
+from .context_packer import chunk_token_budget, pack_chunks, join_chunks, DEFAULT_CONTEXT_FRACTION, CHUNK_DELIMITER
+
+# import the dependency graph runner for the scheduled queries
+from .query_graph import QUERY_GRAPH, run_graph
+
+# import the persistent cache of LLM responses
+from .llm_cache import LLMCache, DEFAULT_CACHE_PATH, DEFAULT_TTL_SECONDS, DEFAULT_MAX_BYTES
+
+# import the single pass JSON extractor for the model's responses
+from .json_extract import extract_json_from_response, IncrementalJSONParser
 
 # -------------------------
 #  Import the Groq Api Key
@@ -32,36 +50,176 @@ GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 #  ChatGroq with Lamma Setup
 # ---------------------------------
 
-model = ChatGroq(
-    model = "llama-3.3-70b-versatile",
-    temperature = 0.7,
-    max_tokens=2048
+MODEL_NAME = "llama-3.3-70b-versatile"
+TEMPERATURE = 0.7
+# the model no longer writes out the engagement counts, so less room is needed for the completion
+MAX_TOKENS = int(os.getenv('GROQ_MAX_TOKENS', 1536))
+
+# the starting budget defaults to Groq's free tier for this model, set these for a higher tier
+# (after the first response the limits in Groq's headers are used instead)
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv('GROQ_REQUESTS_PER_MINUTE', DEFAULT_REQUESTS_PER_MINUTE))
+GROQ_TOKENS_PER_MINUTE = int(os.getenv('GROQ_TOKENS_PER_MINUTE', DEFAULT_TOKENS_PER_MINUTE))
+
+# the rate limit budget is shared by every query and kept in sync with Groq's response headers
+rate_limiter = RateLimiter(requests_per_minute = GROQ_REQUESTS_PER_MINUTE, tokens_per_minute = GROQ_TOKENS_PER_MINUTE)
+
+# number of times a request is retried after Groq still answers with a 429
+RATE_LIMIT_RETRIES = 3
+
+# the maximum number of chunk groups sent to Groq at once in async mode
+# NOTE: on the free tier (12,000 TPM) a 15 chunk group plus MAX_TOKENS is about the whole minute's budget,
+# so the groups still go out about one per minute - the concurrency only pays off on a higher tier
+MAX_CONCURRENCY = int(os.getenv('GROQ_MAX_CONCURRENCY', 4))
+
+# the sync httpx client (with the rate limiter's response hook) is only created on the first request and closed at shutdown
+http_client = None
+
+def get_http_client():
+    global http_client
+    if http_client is None:
+        http_client = httpx.Client(event_hooks={'response': [rate_limiter.httpx_response_hook]})
+    return http_client
+
+def close_http_client():
+    global http_client
+    if http_client is not None:
+        http_client.close()
+        http_client = None
+
+    # the cached model holds the closed client, so the next request builds a new one
+    get_model.cache_clear()
+
+# the async client is bound to the event loop of a run, so async runs build their own model with a fresh client
+# (langchain_groq is only imported once a model is needed)
+def build_model(http_async_client = None):
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        model = MODEL_NAME,
+        temperature = TEMPERATURE,
+        max_tokens=MAX_TOKENS,
+        http_client = get_http_client(),
+        http_async_client = http_async_client
+    )
+
+@lru_cache(maxsize=1)
+def get_model():
+    return build_model()
+
+# the fraction of the model's context window each request is filled up to with chunks
+CONTEXT_FRACTION = float(os.getenv('CONTEXT_FRACTION', DEFAULT_CONTEXT_FRACTION))
+
+# whether chunks from the same video share one metadata header in the prompt, instead of repeating it on every chunk
+GROUP_CHUNKS_BY_VIDEO = os.getenv('GROUP_CHUNKS_BY_VIDEO', '1') != '0'
+
+# whether responses are streamed and parsed as they arrive, so the stream can stop as soon as the JSON closes
+STREAM_RESPONSES = os.getenv('STREAM_RESPONSES', '1') != '0'
+
+# ----------------------------------
+#  LLM Response Cache
+# ----------------------------------
+
+# re-runs with the same retrieved chunks reuse the stored responses instead of calling Groq again
+llm_cache = LLMCache(
+    path = os.getenv('LLM_CACHE_PATH', DEFAULT_CACHE_PATH),
+    ttl_seconds = float(os.getenv('LLM_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS)),
+    max_bytes = int(os.getenv('LLM_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+    enabled = os.getenv('LLM_CACHE_ENABLED', '1') != '0'
 )
 
+# look up a response in the cache, a hit is marked in the response metadata so run_query can count it
+def cached_response(template_name, rendered_prompt):
+    cached = llm_cache.get(template_name, rendered_prompt, MODEL_NAME, TEMPERATURE)
+    if cached is None:
+        return None
+    return AIMessage(content = cached, response_metadata = {'llm_cache': 'hit'})
+
+# a response cut off by max_tokens (streamed and ended inside the JSON, or finished for length) isn't cached,
+# so the next run asks again instead of reusing the partial output until it expires
+def cache_response(template_name, rendered_prompt, result):
+    metadata = result.response_metadata or {}
+    if metadata.get('truncated') or metadata.get('finish_reason') == 'length':
+        return
+    llm_cache.put(template_name, rendered_prompt, MODEL_NAME, TEMPERATURE, result.text)
+
 # ----------------------------------
 #  MongoDB Setup
 # ----------------------------------
 
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017')
-mongo_client = MongoClient(MONGO_URI)
-db = mongo_client['youtube_intelligence']
-results_collection = db['results']
+
+# the client is only created on first use, so importing this module doesn't start pymongo's monitor threads
+@lru_cache(maxsize=1)
+def get_db():
+    return MongoClient(MONGO_URI)['youtube_intelligence']
+
+def get_results_collection():
+    return get_db()['results']
+
+# one document per successful scheduled run, its watermark is where the next incremental run starts
+def get_runs_collection():
+    return get_db()['runs']
+
+# the watermark of the last successful scheduled run, None before the first one
+def last_run_watermark():
+    last_run = get_runs_collection().find_one({}, sort=[('watermark', -1)])
+    return last_run['watermark'] if last_run is not None else None
+
+# the most recent stored result of a query type (the documents store their date as run_data)
+def latest_result(query_type):
+    return get_results_collection().find_one({'query_type': query_type}, sort=[('run_data', -1)])
+
+# the most entries an incremental run keeps once the new ones are merged into the previous run's results
+MAX_MERGED_ENTRIES = int(os.getenv('MAX_MERGED_ENTRIES', 100))
+
+# the new entries first (replacing previous ones with the same title), then the previous ones, most recently found
+# first, so the oldest entries age out once there are more than max_entries
+def merge_results(previous, new, max_entries = MAX_MERGED_ENTRIES):
+    merged = dict(new)
+    for title, entry in previous.items():
+        if len(merged) >= max_entries:
+            break
+        merged.setdefault(title, entry)
+    return merged
 
 #----------------------------------
 #  Load Example Output Files for Few-Shot Prompting
 #----------------------------------
 
-try:
-    claims_file = json.load(open(Path(__file__).parent.parent.parent / "data" / "example_output" / "claims.json", "r"))
-    narratives_file = json.load(open(Path(__file__).parent.parent.parent / "data" / "example_output" / "narratives.json", "r"))
-    trends_file = json.load(open(Path(__file__).parent.parent.parent / "data" / "example_output" / "trends.json", "r"))
-    risk_factors_file = json.load(open(Path(__file__).parent.parent.parent / "data" / "example_output" / "risk_factors.json", "r"))
-except Exception as e:
-    print(f"Error loading example output files: {e}")
-    claims_file = "Error loading claims examples"
-    narratives_file = "Error loading narratives examples"
-    trends_file = "Error loading trends examples"
-    risk_factors_file = "Error loading risk factors examples"
+EXAMPLES_PATH = Path(__file__).parent.parent.parent / "data" / "example_output"
+
+# the engagement counts are added in python after the LLM responds, so the few-shot examples don't show them to the model
+ENGAGEMENT_KEYS = ('view_count', 'like_count', 'comment_count')
+ENGAGEMENT_FIELDS = ENGAGEMENT_KEYS + tuple(f"total_{key}" for key in ENGAGEMENT_KEYS)
+
+def strip_engagement(examples):
+    if not isinstance(examples, dict):
+        return examples
+    return {
+        title: {key: value for key, value in entry.items() if key not in ENGAGEMENT_FIELDS} if isinstance(entry, dict) else entry
+        for title, entry in examples.items()
+    }
+
+# the example files are read once, on the first query
+@lru_cache(maxsize=1)
+def load_examples():
+    try:
+        examples = {
+            query_type: json.load(open(EXAMPLES_PATH / f"{query_type}.json", "r"))
+            for query_type in ('claims', 'narratives', 'trends', 'risk_factors')
+        }
+    except Exception as e:
+        print(f"Error loading example output files: {e}")
+        examples = {
+            'claims': "Error loading claims examples",
+            'narratives': "Error loading narratives examples",
+            'trends': "Error loading trends examples",
+            'risk_factors': "Error loading risk factors examples"
+        }
+
+    # the risk factors examples have no engagement counts
+    for query_type in ('claims', 'narratives', 'trends'):
+        examples[query_type] = strip_engagement(examples[query_type])
+    return examples
 
 # --------------------------------
 #  Templates for each Query type
@@ -96,13 +254,13 @@ Use the examples below as a reference as to what the analysis should look like.
 - No introduction, no explanation, no notes after the JSON.
 - Aim for 1 claim per transcript chunks minimum — do not generate more entries than you can complete.
 - Always close the JSON object with }} before stopping.
-- Use this exact structure where each KEY is the claim TITLE and each VALUE is the dictionary of DESCRIPTION or QUOTE, video_id, view_count, like_count, and comment_count.
+- Use this exact structure where each KEY is the claim TITLE and each VALUE is the dictionary of DESCRIPTION or QUOTE and video_id.
 - Following description or quote of the claim, provide the video id where the claim comes from.
-- From the video id(s) provide the the video's view_count, like_count, comment_count.
+- Do not provide view, like or comment counts, they are added afterwards from the video ids.
 - Do not have newlines or other tags in the response.
 
 ### Output Format
-{{"Claim title here": {{"Quote": "quote of the claim here", "video_id": "video_id here", "view_count": "view_count here", "like_count": "like_count here", "comment_count": "comment_count here"}}, "Another claim title": {{"Quote": "quote here", "video_id": "video_id here", "view_count": "view_count here", "like_count": "like_count here", "comment_count": "comment_count here"}}}}
+{{"Claim title here": {{"Quote": "quote of the claim here", "video_id": "video_id here"}}, "Another claim title": {{"Quote": "quote here", "video_id": "video_id here"}}}}
 
 Do not reference speaker in description/quote.
 """,
@@ -138,13 +296,13 @@ Use the examples below as a reference as to what the analysis should look like.
 - No introduction, no explanation, no notes after the JSON.
 - Aim for 5-8 findings maximum — do not generate more entries than you can complete.
 - Always close the JSON object with }} before stopping.
-- Use this exact structure where each KEY is the trend TITLE and each VALUE is the dictionary of DESCRIPTION, video_ids, total view_count, total like_count, and total comment_count.
+- Use this exact structure where each KEY is the trend TITLE and each VALUE is the dictionary of DESCRIPTION and video_ids.
 - Following description or quote of the trend, provide the video id(s) where the trend comes from.
-- From the video id(s) provide all the video's total view_count, total like_count, total comment_count.
+- Do not provide view, like or comment counts or totals, they are added afterwards from the video ids.
 - Do not have newlines or other tags in the response.
 
 ### Output Format
-{{"Trend title here": {{"Description: "description of trend here", "video_ids": ["video_id here", "another video_id"], "total_view_count": "total view_count here", "total_like_count": "total like_count here", "total_comment_count": "total comment_count here"}}, "Another trend title": {{"Description: "description here", "video_ids": ["video_id here", "another video_id"], "total_view_count": "total view_count here", "total_like_count": "total like_count here", "total_comment_count": "total comment_count here"}}}}
+{{"Trend title here": {{"Description": "description of trend here", "video_ids": ["video_id here", "another video_id"]}}, "Another trend title": {{"Description": "description here", "video_ids": ["video_id here", "another video_id"]}}}}
 
 Do not reference speaker in description.
 """,
@@ -183,13 +341,13 @@ Use the examples below as a reference as to what the analysis should look like.
 - No introduction, no explanation, no notes after the JSON.
 - Aim for 5-8 findings maximum — do not generate more entries than you can complete.
 - Always close the JSON object with }} before stopping
-- Use this exact structure where each KEY is the narrative TITLE and each VALUE is the dictionary of DESCRIPTION, video_ids, total view_count, total like_count, and total comment_count.
+- Use this exact structure where each KEY is the narrative TITLE and each VALUE is the dictionary of DESCRIPTION and video_ids.
 - Following description or quote of the narrative, provide the video id(s) where the narrative comes from.
-- From the video id(s) provide all the video's total view_count, total like_count, total comment_count.
+- Do not provide view, like or comment counts or totals, they are added afterwards from the video ids.
 - Do not have newlines or other tags in the response.
 
 ### Output Format
-{{"Narrative title here": {{"Description: "description of narrative here", "video_ids": ["video_id here", "another video_id"], "total_view_count": "total view_count here", "total_like_count": "total like_count here", "total_comment_count": "total comment_count here"}}, "Another narrative title": {{"Description: "description here", "video_ids": ["video_id here", "another video_id"], "total_view_count": "total view_count here", "total_like_count": "total like_count here", "total_comment_count": "total comment_count here"}}}}
+{{"Narrative title here": {{"Description": "description of narrative here", "video_ids": ["video_id here", "another video_id"]}}, "Another narrative title": {{"Description": "description here", "video_ids": ["video_id here", "another video_id"]}}}}
 
 Do not reference speaker in description.
 """,
@@ -224,7 +382,6 @@ Use the examples below as a reference as to what the analysis should look like.
 - Always close the JSON object with }} before stopping.
 - Use this exact structure where each KEY is the risk factor TITLE and each VALUE is the DESCRIPTION of risk factor.
 - In description of the risk factors, provide the video id(s) where the risk factors comes from.
-- From the video id(s) provide the the video's view_count, like_count, comment_count.
 - Do not have newlines or other tags in the response.
 
 ### Output Format
@@ -241,13 +398,17 @@ Do not reference speaker in description.
 
 BASE_TERMS = ' '.join(AI_TERMS)
 
-QUERY_ENRICHMENT = {
-    'claims': f'claims assertions arguments statements positions {BASE_TERMS}',
-    'trends': f'trends patterns emerging developments growing {BASE_TERMS}',
-    'narratives': f'narrative framing story perspective discourse {BASE_TERMS}',
-    'risk_factors': f'risk concerns dangers threats warnings safety {BASE_TERMS}'
+# words describing what each query type looks for
+QUERY_TERMS = {
+    'claims': 'claims assertions arguments statements positions',
+    'trends': 'trends patterns emerging developments growing',
+    'narratives': 'narrative framing story perspective discourse',
+    'risk_factors': 'risk concerns dangers threats warnings safety'
 }
 
+# vector retrieval also gets all the AI terms, hybrid retrieval matches the terms in the chunks with BM25 instead
+QUERY_ENRICHMENT = {query_type: f'{terms} {BASE_TERMS}' for query_type, terms in QUERY_TERMS.items()}
+
 # Weelky scheduled prompts - add to main.py scheduled_job_sequence()
 SCHEDULED_QUERIES = {
     "claims": "What specific claims are being made about AI?",
@@ -256,121 +417,41 @@ SCHEDULED_QUERIES = {
     "risk_factors": "What risks or concerns about AI are being raised?",
 }
 
-# -------------------------------------
-#  Functions to Repair and Extract JSON
-# -------------------------------------
+# ----------------------------------------
+#  Function to Add the Engagement Metrics
+#  from the Chunk Metadata
+# ----------------------------------------
 
-def repair_json(text: str) -> str:
-    """
-    Attempt to fix common JSON truncation issues before parsing.
-    """
-    text = text.strip()
-
-    # Count opening and closing braces
-    open_braces   = text.count('{')
-    close_braces  = text.count('}')
-    open_brackets  = text.count('[')
-    close_brackets = text.count(']')
-
-    # If the last character is a comma (truncated mid-entry), remove it
-    if text.endswith(','):
-        text = text[:-1]
-
-    # If the last character is an incomplete value, remove the last entry
-    if not text.endswith(('}', ']', '"')):
-        # Find the last complete key-value pair
-        last_complete = max(text.rfind('",'), text.rfind('"}'))
-        if last_complete != -1:
-            text = text[:last_complete + 1]
-
-    # Append missing closing braces/brackets
-    text += '}' * (open_braces - close_braces)
-    text += ']' * (open_brackets - close_brackets)
-
-    return text
-
-def extract_json_from_response(text: str, query_type: str) -> dict:
-    # strip any trailing text after } (or ] in the case where its a list)
-    last_brace = max(text.rfind('}'), text.rfind(']'))
-    if last_brace != -1: # the case where ther is trailing text
-        text = text[:last_brace + 1]
-
-    # direct parse
-    try:
-        parsed = json.loads(text)
-
-        # if an array is returned (not the dict), then convert to dict
-        if isinstance(parsed, list):
-            return {
-                    item.get(f'{query_type[:-1]} Title') or item.get(f'{query_type[:-1]} title') or item.get('title') or f"{query_type[:-1]} {i+1}": 
-                    item.get('Description') or item.get('description') or item.get('text') or str(item)
-                    for i, item in enumerate(parsed)
-                    if isinstance(item, dict)
-            }
-        return parsed
-    except json.JSONDecodeError:
-        pass
-
-    # repair then parse
-    try:
-        repaired_text = repair_json(text)
-        parsed = json.loads(repaired_text)
-
-        # if an array is returned (not the dict), then convert to dict
-        if isinstance(parsed, list):
-            return {
-                    item.get(f'{query_type[:-1]} Title') or item.get(f'{query_type[:-1]} title') or item.get('title') or f"{query_type[:-1]} {i+1}": 
-                    item.get('Description') or item.get('description') or item.get('text') or str(item)
-                    for i, item in enumerate(parsed)
-                    if isinstance(item, dict)
-            }
-        return parsed
-    except json.JSONDecodeError:
-        pass
-
-    repaired_text = repair_json(text)
-
-    # if we get codeblocks
-    code_block = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', repaired_text)
-    if code_block:
-        try:
-            repaired = repair_json(code_block.group(1))
-            parsed = json.loads(repaired)
-            if isinstance(parsed, list):
-                return {
-                    item.get(f'{query_type[:-1]} Title') or item.get(f'{query_type[:-1]} title') or item.get('title') or f"{query_type[:-1]} {i+1}": 
-                    item.get('Description') or item.get('description') or item.get('text') or str(item)
-                    for i, item in enumerate(parsed)
-                    if isinstance(item, dict)                }
-            return parsed
-        except json.JSONDecodeError:
-            pass
-
-    # then try finding a JSON object
-    json_obj = re.search(r'\{[\s\S]*\}', repaired_text)
-    if json_obj:
-        try:
-            return json.loads(json_obj.group())
-        except json.JSONDecodeError:
-            pass
+def video_metrics_from_chunks(chunks) -> dict:
+    metrics = {}
+    for chunk in chunks:
+        m = chunk.metadata
+        if m.get('video_id'):
+            metrics[m['video_id']] = {key: int(m.get(key, 0) or 0) for key in ENGAGEMENT_KEYS}
+    return metrics
 
-    # try finding a JSON array
-    json_arr = re.search(r'\[[\s\S]*\]', repaired_text)
-    if json_arr:
-        try:
-            parsed = json.loads(json_arr.group())
-            if isinstance(parsed, list):
-                return {
-                    item.get(f'{query_type[:-1]} Title') or item.get(f'{query_type[:-1]} title') or item.get('title') or f"{query_type[:-1]} {i+1}": 
-                    item.get('Description') or item.get('description') or item.get('text') or str(item)
-                    for i, item in enumerate(parsed)
-                    if isinstance(item, dict)                }
-            return parsed
-        except json.JSONDecodeError:
-            pass
-
-    # last resort return raw text
-    return {"raw_response": text}
+# the model only returns the video id(s) of each entry, the counts (or totals over the video ids) are joined from the chunks' video metrics
+def add_engagement_metrics(results: dict, chunks) -> dict:
+    metrics = video_metrics_from_chunks(chunks)
+
+    for entry in results.values():
+        if not isinstance(entry, dict):
+            continue
+
+        # any counts the model wrote anyway are replaced by the exact ones
+        for key in ENGAGEMENT_FIELDS:
+            entry.pop(key, None)
+
+        if isinstance(entry.get('video_ids'), list):
+            # each video is only counted once, and video ids that weren't in the chunks (made up by the model) are left out of the totals
+            video_ids = [video_id for video_id in dict.fromkeys(entry['video_ids']) if video_id in metrics]
+            for key in ENGAGEMENT_KEYS:
+                entry[f"total_{key}"] = sum(metrics[video_id][key] for video_id in video_ids)
+
+        elif entry.get('video_id') in metrics:
+            entry.update(metrics[entry['video_id']])
+
+    return results
 
 # -----------------------------------
 #  Function to Format the Trnascript
@@ -380,9 +461,7 @@ def extract_json_from_response(text: str, query_type: str) -> dict:
 # originally had max chars per chunk when using ollama locally, because it would take too long but now have a better model through a cloud api so don't need it
 # MAX_CHARS_PER_CHUNK = 1500
 
-def format_chunk_with_metadata(doc):
-    m = doc.metadata
-    content = doc.page_content
+def format_video_header(m):
     return (
         f"Title: {m.get('title', 'unknown')}\n"
         f"Video Id: {m.get('video_id', 'unknown')}\n"
@@ -391,9 +470,165 @@ def format_chunk_with_metadata(doc):
         f"Like Count: {m.get('like_count', 0)}\n"
         f"Comment Count: {m.get('comment_count', 0)}\n"
         f"Duration: {m.get('total_duration', 'unknown')}\n"
-        f"{content}"
     )
 
+def format_chunk_with_metadata(doc):
+    return f"{format_video_header(doc.metadata)}{doc.page_content}"
+
+# ----------------------------------------
+#  Function to Format the Chunks Grouped
+#  by Video (one Header per Video)
+# ----------------------------------------
+
+VIDEO_CHUNK_DELIMITER = "\n\n---\n\n"
+
+def format_chunk_body(doc):
+    return f"Chunk Start: {doc.metadata.get('start', 0.0)}\n{doc.page_content}"
+
+# each video's header is emitted once, followed by its chunks in start order, videos are in the order they were first retrieved
+def format_chunks_by_video(chunks):
+    videos = {}
+    for chunk in chunks:
+        videos.setdefault(chunk.metadata.get('video_id', 'unknown'), []).append(chunk)
+
+    return CHUNK_DELIMITER.join(
+        format_video_header(video_chunks[0].metadata)
+        + VIDEO_CHUNK_DELIMITER.join(format_chunk_body(chunk) for chunk in sorted(video_chunks, key=lambda c: c.metadata.get('start', 0.0)))
+        for video_chunks in videos.values()
+    )
+
+# -----------------------------------
+#  Rate Limited Chain Invocation
+# -----------------------------------
+
+# estimate the tokens of a request, covering the prompt and the completion tokens
+def estimate_request_tokens(template, inputs):
+    return estimate_tokens(template) + sum(estimate_tokens(value) for value in inputs.values()) + MAX_TOKENS
+
+# retry policy shared by the sync and async paths, returns whether to retry after a 429
+def retry_after_rate_limit(error, attempt):
+    # the groq client already retried, so sync the budget with the 429 and wait for it to reset
+    rate_limiter.update_from_headers(error.response.headers, 429)
+    if attempt == RATE_LIMIT_RETRIES:
+        return False
+
+    print(f"[Attempt {attempt}/{RATE_LIMIT_RETRIES}] Groq rate limit hit: {rate_limiter.state()}", flush=True)
+    return True
+
+# ----------------------------------------
+#  Streamed Responses, Parsed as they
+#  Arrive
+# ----------------------------------------
+
+class ResponseStream:
+    """
+    Collects a streamed response while feeding it to the incremental JSON parser.
+
+    on_entry(key, value) is called for each top level entry (claim, trend, ...) as soon as it closes,
+    and add() returns True once the top level object has closed so the rest of the stream can be dropped.
+    """
+
+    def __init__(self, on_entry = None):
+        self.parser = IncrementalJSONParser()
+        self.pieces = []
+        self.on_entry = on_entry
+
+    def add(self, chunk) -> bool:
+        text = chunk.text
+        self.pieces.append(text)
+        for key, value in self.parser.feed(text):
+            if self.on_entry is not None:
+                self.on_entry(key, value)
+        return self.parser.done
+
+    # truncated means the stream ended inside the JSON, e.g. when the response hit max_tokens
+    def message(self, stopped_early):
+        return AIMessage(content = ''.join(self.pieces), response_metadata = {
+            'streamed': True,
+            'stopped_early': stopped_early,
+            'truncated': self.parser.truncated
+        })
+
+def stream_chain(chain, inputs, on_entry = None):
+    stream = ResponseStream(on_entry)
+    chunks = chain.stream(inputs)
+    stopped_early = False
+    try:
+        for chunk in chunks:
+            if stream.add(chunk):
+                stopped_early = True
+                break
+    finally:
+        # closing the generator closes the http response, so the trailing text is never generated/downloaded
+        chunks.close()
+    return stream.message(stopped_early)
+
+async def astream_chain(chain, inputs, on_entry = None):
+    stream = ResponseStream(on_entry)
+    chunks = chain.astream(inputs)
+    stopped_early = False
+    try:
+        async for chunk in chunks:
+            if stream.add(chunk):
+                stopped_early = True
+                break
+    finally:
+        await chunks.aclose()
+    return stream.message(stopped_early)
+
+# invoke the prompt | model chain once there is budget for it, unless the response is already cached
+# with stream the response is parsed as it arrives and on_entry(key, value) is called for each completed entry
+def invoke_chain(prompt, template, inputs, template_name = 'claims', stream = False, on_entry = None):
+    rendered_prompt = prompt.format(**inputs)
+    cached = cached_response(template_name, rendered_prompt)
+    if cached is not None:
+        return cached
+
+    chain = prompt | get_model()
+    tokens = estimate_request_tokens(template, inputs)
+
+    for attempt in range(1, RATE_LIMIT_RETRIES + 1):
+        rate_limiter.acquire(tokens)
+        try:
+            result = stream_chain(chain, inputs, on_entry) if stream else chain.invoke(inputs)
+            cache_response(template_name, rendered_prompt, result)
+            return result
+        except RateLimitError as e:
+            if not retry_after_rate_limit(e, attempt):
+                raise
+        finally:
+            # the response hook normally releases the reservation, this covers requests that never got a response
+            rate_limiter.release()
+
+# invoke the chain concurrently for every group of inputs, returning the responses in the same order as the inputs
+async def ainvoke_chains(prompt, template, inputs, max_concurrency = MAX_CONCURRENCY, template_name = 'claims', stream = False, on_entry = None):
+    async with httpx.AsyncClient(event_hooks={'response': [rate_limiter.ahttpx_response_hook]}) as async_client:
+        chain = prompt | build_model(http_async_client = async_client)
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def ainvoke_chain(group_inputs):
+            rendered_prompt = prompt.format(**group_inputs)
+            cached = cached_response(template_name, rendered_prompt)
+            if cached is not None:
+                return cached
+
+            tokens = estimate_request_tokens(template, group_inputs)
+
+            async with semaphore:
+                for attempt in range(1, RATE_LIMIT_RETRIES + 1):
+                    await rate_limiter.aacquire(tokens)
+                    try:
+                        result = await astream_chain(chain, group_inputs, on_entry) if stream else await chain.ainvoke(group_inputs)
+                        cache_response(template_name, rendered_prompt, result)
+                        return result
+                    except RateLimitError as e:
+                        if not retry_after_rate_limit(e, attempt):
+                            raise
+                    finally:
+                        rate_limiter.release()
+
+        return await asyncio.gather(*(ainvoke_chain(group_inputs) for group_inputs in inputs))
+
 # -----------------------------------
 #  Core Query Function
 # -----------------------------------
@@ -408,171 +643,167 @@ def format_chunk_with_metadata(doc):
 #       - Takes claims, optional dict with claims from claim query
 #       - Takes trends, optional dict with trends from trend query
 #       - Takes previously used transcript chunks, option list with transcripts chunks used in claims query for trends query then chunks used in claims and trends query for narratives query
-def run_query(query_type, question, claims: Optional[Dict] = None, trends: Optional[Dict] = None, previous_chunks: Optional[List] = None, k_chunks = 15):
+#       - Takes async mode, if True the groups of chunks are sent to the LLM concurrently, at most max_concurrency at a time
+#       - Takes timings, optional dict (e.g. from the scheduled query graph) the stage timings are added to and stored with the result
+#       - Takes group by video, if True each video's metadata header is only written once per request
+#       - Takes stream, if True responses are parsed while they stream in and each stream stops once its JSON closes
+#       - Takes embedded after, optional unix time, only chunks embedded after it are retrieved (incremental runs)
+#       - Takes merge with, optional previous result document of this query type, the new findings are merged into its results
+#       - Takes retrieval mode, 'vector' (mmr over the enriched query) or 'hybrid' (BM25 and vector rankings fused, no AI terms enrichment)
+#       - Takes filters, optional dict of published_after, published_before, channel_ids and min_view_count, only chunks of matching videos are retrieved
+def run_query(query_type, question, claims: Optional[Dict] = None, trends: Optional[Dict] = None, previous_chunks: Optional[List] = None, k_chunks = 15,
+              async_mode = False, max_concurrency = MAX_CONCURRENCY, timings: Optional[Dict] = None, group_by_video = GROUP_CHUNKS_BY_VIDEO,
+              stream = STREAM_RESPONSES, embedded_after: Optional[float] = None, merge_with: Optional[Dict] = None,
+              retrieval_mode = RETRIEVAL_MODE, filters: Optional[Dict] = None):
+    query_start = time.perf_counter()
+    timings = timings if timings is not None else {}
+    timings['started_at'] = datetime.now(timezone.utc)
+
     # get the template from the TEMPLATES dictionary and then create the prompt model chain
-    template = TEMPLATES.get(query_type, TEMPLATES['claims'])
+    template_name = query_type if query_type in TEMPLATES else 'claims'
+    template = TEMPLATES[template_name]
     prompt = ChatPromptTemplate.from_template(template)
 
-    # inject the format instructions from the parser into the prompt
-    chain = prompt | model
-
     # -----------------------------------
     #  Use Enriched Query with Key Terms
     # -----------------------------------
-    enriched_query = f"{question} {QUERY_ENRICHMENT.get(query_type, '')}"
+    enrichment = QUERY_TERMS if retrieval_mode == 'hybrid' else QUERY_ENRICHMENT
+    enriched_query = f"{question} {enrichment.get(query_type, '')}"
 
     # get relevant transcript chunks from ChromaDB
-    transcript_chunks = retrieval(enriched_query, k_chunks)
-
-    # create of list of the concatenated chunks to later be iterated through to call the llm
-    concatenated_chunks = []
+    stage_start = time.perf_counter()
+    transcript_chunks = retrieval(enriched_query, k_chunks, embedded_after, retrieval_mode, filters)
+    timings['retrieval_s'] = round(time.perf_counter() - stage_start, 3)
 
     # -----------------------------------
     #  If Previous Chunks Exist then Add
     # -----------------------------------
 
-    if previous_chunks != None:
-        chunk_counter = 1
-
-        curr_chunks = []
-        for chunk in previous_chunks:
-            if chunk_counter <= 15:
-                # build context string from retrieved chunks
-                # added a delimiter since the model will need to distinguish between them now that theres metadata
-                curr_chunks.append(format_chunk_with_metadata(chunk))
-                chunk_counter += 1
-
-            else: # the current chunk is a 16th one, so start a new curr_chunks cancatenated string and set chunk_counter back to 1
-                # add to the concatenated chunks list
-                concatenated_chunks.append("\n\n###\n\n".join(curr_chunks))
-
-                curr_chunks = [format_chunk_with_metadata(chunk)]
-                chunk_counter = 1
-    else:
-        previous_chunks = []
+    # copied, since other queries (e.g. trends and narratives running after claims) share the same previous chunks
+    previous_chunks = list(previous_chunks) if previous_chunks != None else []
 
     # ------------------------------------------------
     #  Add new chunks fetched, not in Previous Chunks
     # ------------------------------------------------
 
-    # every 15 chunks we get a new create start with on a new concatenated string of chunks (so the request won't be blocked for exceeding the TPM of Groq's llama-3.3-70b-versatile model)
-    chunk_counter = 1
-
-    curr_chunks = []
     for chunk in transcript_chunks:
         if chunk not in previous_chunks:
-            if chunk_counter <= 15:
-                # build context string from retrieved chunks
-                # added a delimiter since the model will need to distinguish between them now that theres metadata
-                formatted_chunk = format_chunk_with_metadata(chunk)
-                curr_chunks.append(formatted_chunk)
-
-                chunk_counter += 1
-
-            else: # the current chunk is a 16th one, so start a new curr_chunks cancatenated string and set chunk_counter back to 1
-                # add to the concatenated chunks list
-                concatenated_chunks.append("\n\n###\n\n".join(curr_chunks))
-
-                curr_chunks = [format_chunk_with_metadata(chunk)]
-                chunk_counter = 1
-
             # add the current chunk to previous chunks to provide the source chunks in mongodb with the chunks and the next queries (trends and narratives after claims)
             previous_chunks.append(chunk)
-    concatenated_chunks.append("\n\n###\n\n".join(curr_chunks))
 
     # --------------------------------------------
-    #  Invoke based off query_type, for few-shot
+    #  Inputs based off query_type, for few-shot
     # --------------------------------------------
 
-    # then for each concatenated transcripts in the list (maximum of 15 chunks + their metadata each) iterate and invoke the llm query
     # store results in this dictionary
     results = {}
 
-    # --------------------------------------------------------------------------------------------------------------------------
-    #  Between each Query we Need to wait a Minute, since there is a TPM (Tokens per Minute) limit/rate in Groq for this model
-    # --------------------------------------------------------------------------------------------------------------------------
+    examples = load_examples()
 
     match query_type:
         case 'claims':
-            for transcripts in concatenated_chunks:
-                result = chain.invoke({"transcripts": transcripts, "question": question, 'claims_examples': claims_file})
+            base_inputs = {"question": question, 'claims_examples': examples['claims']}
 
-                # put the result through a parser to extract the json from the resonse
-                parsed_result = extract_json_from_response(result.text, query_type)
+        case 'trends':
+            # claims (from the prior scheduled queries) provide context with the transcripts from the claims query and additional transcripts,
+            # else (claims is None) it just runs the generic trends query
+            base_inputs = {"claims": claims, "question": question, 'trends_examples': examples['trends']}
 
-                results.update(parsed_result)
+        case 'narratives':
+            # claims and trends (from the prior scheduled queries) provide context with the transcripts from the claims query, trends query, and additional transcripts,
+            # else just run the generic narratives query
+            if claims == None or trends == None:
+                claims, trends = None, None
 
-                # wait 60 seconds between queries to avoid the TPM
-                time.sleep(60)
+            base_inputs = {"claims": claims, "trends": trends, "question": question, 'narratives_examples': examples['narratives']}
 
-        case 'trends':
-            for transcripts in concatenated_chunks:
-                # Check if there are claims (from the prior scheduled queries) to provide context, with the transcripts from the claims query and additional transcripts
-                if claims != None:
-                    result = chain.invoke({"transcripts": transcripts, "claims": claims, "question": question, 'trends_examples': trends_file})
+        case 'risk_factors':
+            base_inputs = {"question": question, 'risks_examples': examples['risk_factors']}
 
-                    # put the result through a parser to extract the json from the resonse
-                    parsed_result = extract_json_from_response(result.text, query_type)
+        case _:
+            base_inputs = {"question": question, 'claims_examples': examples['claims']}
 
-                    results.update(parsed_result)
+    # ---------------------------------------------------------------------
+    #  Pack the Chunks into as Few Requests as Fit in the Token Budget
+    # ---------------------------------------------------------------------
 
-                else:
-                    # else just run generic trends query
-                    result = chain.invoke({"transcripts": transcripts, "claims": None, "question": question, 'trends_examples': trends_file})
+    # the template, few-shot examples, question and claims/trends are in every request, the rest of the budget goes to the chunks
+    # (a request is also kept under Groq's TPM limit, since larger requests are rejected outright)
+    fixed_tokens = estimate_tokens(prompt.format(transcripts = "", **base_inputs))
+    budget = chunk_token_budget(fixed_tokens, MAX_TOKENS, rate_limiter.token_limit, context_fraction = CONTEXT_FRACTION)
 
-                    # put the result through a parser to extract the json from the resonse
-                    parsed_result = extract_json_from_response(result.text, query_type)
+    # added a delimiter since the model will need to distinguish between them now that theres metadata
+    formatted_chunks = [format_chunk_with_metadata(chunk) for chunk in previous_chunks]
 
-                    results.update(parsed_result)
+    if group_by_video:
+        # the chunks are packed without their header, and each request pays for a video's header once
+        video_ids = [chunk.metadata.get('video_id', 'unknown') for chunk in previous_chunks]
+        header_tokens = {video_id: estimate_tokens(format_video_header(chunk.metadata) + CHUNK_DELIMITER) for video_id, chunk in zip(video_ids, previous_chunks)}
+        groups = pack_chunks([format_chunk_body(chunk) for chunk in previous_chunks], budget, keys = video_ids, key_costs = header_tokens)
 
-                # wait 60 seconds between queries to avoid the TPM
-                time.sleep(60)
+        transcripts = [format_chunks_by_video([previous_chunks[index] for index in group]) for group in groups]
+    else:
+        groups = pack_chunks(formatted_chunks, budget)
+        transcripts = [join_chunks(formatted_chunks, group) for group in groups]
 
-        case 'narratives':
-            for transcripts in concatenated_chunks:
-                # Check if there are claims and trends (from the prior scheduled queries) to provide context, with the transcripts from the claims query, trends query, and additional transcripts
-                if claims != None and trends != None:
-                    result = chain.invoke({"transcripts": transcripts, "claims": claims, "trends": trends, "question": question, 'narratives_examples': narratives_file})
+    print(f"{query_type}: packed {len(formatted_chunks)} chunks into {len(groups)} request(s) of at most {budget} chunk tokens", flush=True)
 
-                    # put the result through a parser to extract the json from the resonse
-                    parsed_result = extract_json_from_response(result.text, query_type)
+    # tokens saved in each request by not repeating the video headers
+    tokens_saved = [estimate_tokens(join_chunks(formatted_chunks, group)) - estimate_tokens(request_transcripts) for group, request_transcripts in zip(groups, transcripts)]
+    if group_by_video:
+        print(f"{query_type}: grouping chunks by video saved {tokens_saved} prompt tokens per request", flush=True)
 
-                    results.update(parsed_result)
+    inputs = [{"transcripts": request_transcripts, **base_inputs} for request_transcripts in transcripts]
 
-                else:
-                    # else just run generic narratives query
-                    result = chain.invoke({"transcripts": transcripts, "claims": None, "trends": None, "question": question, 'narratives_examples': narratives_file})
+    # ---------------------------------------------------------------------------------------------------------------
+    #  Each Query goes through the Rate Limiter, which only waits once Groq's TPM (Tokens per Minute) budget is spent
+    # ---------------------------------------------------------------------------------------------------------------
 
-                    # put the result through a parser to extract the json from the resonse
-                    parsed_result = extract_json_from_response(result.text, query_type)
+    # in async mode the groups are sent concurrently (capped by max_concurrency and the rate limiter), otherwise one at a time
+    stage_start = time.perf_counter()
 
-                    results.update(parsed_result)
+    # with streaming each entry is logged as soon as the model closes it
+    def on_entry(key, value):
+        print(f"{query_type}: received {key!r} after {time.perf_counter() - stage_start:.1f}s", flush=True)
 
-                # wait 60 seconds between queries to avoid the TPM
-                time.sleep(60)
+    if async_mode:
+        responses = asyncio.run(ainvoke_chains(prompt, template, inputs, max_concurrency, template_name, stream, on_entry))
+    else:
+        responses = [invoke_chain(prompt, template, group_inputs, template_name, stream, on_entry) for group_inputs in inputs]
+    timings['llm_s'] = round(time.perf_counter() - stage_start, 3)
+    timings['llm_calls'] = len(responses)
 
-        case 'risk_factors':
-            for transcripts in concatenated_chunks:
-                result = chain.invoke({"transcripts": transcripts, "question": question, 'risks_examples': risk_factors_file})
+    # a truncated response ran out of max_tokens before its JSON closed, only its complete entries are kept
+    timings['stopped_early'] = sum(1 for result in responses if result.response_metadata.get('stopped_early'))
+    timings['truncated'] = sum(1 for result in responses if result.response_metadata.get('truncated'))
+    if timings['truncated']:
+        print(f"{query_type}: {timings['truncated']}/{len(responses)} response(s) were truncated, consider raising GROQ_MAX_TOKENS", flush=True)
 
-                # put the result through a parser to extract the json from the resonse
-                parsed_result = extract_json_from_response(result.text, query_type)
+    cache_hits = sum(1 for result in responses if result.response_metadata.get('llm_cache') == 'hit')
+    print(f"{query_type} LLM cache: {cache_hits}/{len(responses)} responses from cache", flush=True)
 
-                results.update(parsed_result)
+    # responses come back in the same order as the groups, so the results merge deterministically
+    for result in responses:
+        # put the result through a parser to extract the json from the resonse
+        parsed_result = extract_json_from_response(result.text, query_type)
 
-                # wait 60 seconds between queries to avoid the TPM
-                time.sleep(60)
+        results.update(parsed_result)
 
-        case _:
-            for transcripts in concatenated_chunks:
-                result = chain.invoke({"transcripts": transcripts, "question": question, 'claims_examples': claims_file})
+    # add the view, like and comment counts of the video ids in each entry
+    add_engagement_metrics(results, previous_chunks)
 
-                parsed_result = extract_json_from_response(result.text, query_type)
+    # ------------------------------------------------------------
+    #  Merge the New Findings into the Previous Run's Results
+    # ------------------------------------------------------------
 
-                results.update(parsed_result)
+    # entries found again in the new chunks replace the previous ones, the rest of the previous results are kept up to MAX_MERGED_ENTRIES
+    # (only the new entries are returned for the downstream prompts, so their size doesn't grow with the history)
+    new_results = results
+    if merge_with is not None:
+        results = merge_results(merge_with.get('result_text', {}), new_results)
+        print(f"{query_type}: merged {len(new_results)} new entries into {len(results) - len(new_results)} previous ones", flush=True)
 
-                # wait 60 seconds between queries to avoid the TPM
-                time.sleep(60)
+    print(f"{query_type} rate limit budget: {rate_limiter.state()}", flush=True)
 
     # Build source chunk references from metadatas
     source_chunks = [
@@ -594,6 +825,8 @@ def run_query(query_type, question, claims: Optional[Dict] = None, trends: Optio
         for chunk in previous_chunks
     ]
 
+    timings['duration_s'] = round(time.perf_counter() - query_start, 3)
+
     #  Insert the result into MongoDB
     # format schema to MongoDB
     document = {
@@ -602,17 +835,27 @@ def run_query(query_type, question, claims: Optional[Dict] = None, trends: Optio
             'question': question,
             'result_text': results,
             'source_chunks': source_chunks,
-            'model': 'llama-3.3-70b-versatile',
-            'retrieval_k': len(previous_chunks)
+            'model': MODEL_NAME,
+            'retrieval_k': len(previous_chunks),
+            'retrieval_mode': retrieval_mode,
+            'filters': filters,
+            'llm_cache': {'hits': cache_hits, 'calls': len(responses)},
+            'prompt_tokens_saved': tokens_saved,
+            'incremental': {
+                'embedded_after': embedded_after,
+                'merged_from': str(merge_with['_id']) if merge_with is not None and '_id' in merge_with else None
+            },
+            'timings': timings
     }
 
     # then insert new result
-    insert_result = results_collection.insert_one(document)
+    insert_result = get_results_collection().insert_one(document)
 
     return {
         'id': str(insert_result.inserted_id),
         'query_type': query_type,
         'result_text': results,
+        'new_result_text': new_results,
         'source_chunks': previous_chunks
     }
 
@@ -620,37 +863,82 @@ def run_query(query_type, question, claims: Optional[Dict] = None, trends: Optio
 #  Weekly Scheduled Queries
 # ----------------------------------
 
-def run_scheduled_queries(k_c = 15, k_t = 15, k_n = 15):
+# with incremental, only chunks embedded since the last successful run are analysed and merged into that run's results
+# filters (e.g. a published_after window) are applied to the retrieval of every query
+def run_scheduled_queries(k_c = 15, k_t = 15, k_n = 15, k_r = 15, async_mode = False, incremental = False, filters = None):
     # get the query type and query for each of the weekly queries
 
-    # ---------------------------------------------------------
-    #  Store the Claims and Use to Build Trends and Narratives
-    # ---------------------------------------------------------
-
-    try:
-        # run claim query through LLM (using RAG) and keep results for the trends and narratives
-        claims = run_query('claims', SCHEDULED_QUERIES['claims'], k_chunks = k_c)
+    # count the cache hits of this run only
+    llm_cache.reset_stats()
+
+    # ------------------------------------------------------------
+    #  Incremental Runs Start at the Last Successful Run
+    # ------------------------------------------------------------
+
+    # set before retrieval, so chunks embedded while this run is going are picked up by the next one
+    watermark = time.time()
+
+    embedded_after = last_run_watermark() if incremental else None
+    if incremental and embedded_after is None:
+        print("No previous successful run, running over the whole collection")
+    elif incremental:
+        print(f"Incremental run over chunks embedded after {datetime.fromtimestamp(embedded_after, timezone.utc)}")
+
+    # ---------------------------------------------------------------------
+    #  Run the Queries as a Graph: claims and risk factors start together,
+    #  trends once claims finishes, then narratives once trends finishes
+    # ---------------------------------------------------------------------
+
+    k_chunks = {'claims': k_c, 'trends': k_t, 'narratives': k_n, 'risk_factors': k_r}
+
+    def run_node(query_type, inputs, timing):
+        claims = inputs.get('claims')
+        trends = inputs.get('trends')
+
+        # the trends query uses the claims and their chunks, the narratives query the claims, the trends and the trends' chunks (which include the claims')
+        prev_chunks = None
+        if trends != None:
+            prev_chunks = trends['source_chunks']
+        elif claims != None:
+            prev_chunks = claims['source_chunks']
+
+        # the findings of this run, in an incremental run the merged history is only stored
+        result = run_query(
+            query_type,
+            SCHEDULED_QUERIES[query_type],
+            claims = claims['new_result_text'] if claims != None else None,
+            trends = trends['new_result_text'] if trends != None else None,
+            previous_chunks = prev_chunks,
+            k_chunks = k_chunks[query_type],
+            async_mode = async_mode,
+            timings = timing,
+            embedded_after = embedded_after,
+            merge_with = latest_result(query_type) if embedded_after is not None else None,
+            filters = filters
+        )
 
         # print results
-        print(f"claims query stored with id: {claims['id']}")
+        print(f"{query_type} query stored with id: {result['id']}")
+        return result
 
-        # then run the trend query using the claims, and prior transcripts
-        prev_chunks = claims['source_chunks']
-        print(prev_chunks)
-        trends = run_query('trends', SCHEDULED_QUERIES['trends'], claims = claims['result_text'], previous_chunks = prev_chunks, k_chunks = k_t)
+    results, errors, timings = run_graph(QUERY_GRAPH, run_node)
 
-        # print results
-        print(f"trends query stored with id: {trends['id']}")
+    for query_type, error in errors.items():
+        print(f"Error with running query of type {query_type}: {error}")
 
-        # then run the narratives query using the claims, trends, and prioor transcripts
-        prev_chunks = trends['source_chunks']
-        narratives = run_query('narratives', SCHEDULED_QUERIES['narratives'], claims = claims['result_text'], trends = trends['result_text'], previous_chunks = prev_chunks, k_chunks = k_n)
+    for query_type, timing in timings.items():
+        print(f"{query_type}: started after {timing['started_after_s']}s, took {timing.get('duration_s')}s")
 
-        # print results
-        print(f"narratives query stored with id: {narratives['id']}")
+    print(f"LLM cache for this run: {llm_cache.stats()}")
 
-    except Exception as e:
-        print(f"Error with running query of types claims/trends/narratives: {e}")
+    # the watermark only moves forward when every query succeeded, otherwise the next run covers these chunks again
+    if not errors:
+        get_runs_collection().insert_one({
+            'run_date': datetime.now(timezone.utc),
+            'watermark': watermark,
+            'embedded_after': embedded_after,
+            'incremental': incremental
+        })
 
     print("Scheduled Queries Run")
 
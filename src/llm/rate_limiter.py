@@ -0,0 +1,273 @@
+# imports:
+# re to parse Groq's reset durations (e.g. "2m59.56s"), time and threading for the shared, thread-safe budget
+# contextvars to find the reservation of the request a response belongs to
+import re
+import time
+import asyncio
+import threading
+import itertools
+import contextvars
+from typing import Optional, Mapping
+
+# ------------------------------------------------------------
+#  Default Budget for Groq's llama-3.3-70b-versatile Model
+#  (only used until the first response headers come back)
+# ------------------------------------------------------------
+
+DEFAULT_REQUESTS_PER_MINUTE = 30
+DEFAULT_TOKENS_PER_MINUTE = 12000
+
+# window used to refill the local budget when Groq hasn't told us a reset time
+BUDGET_WINDOW_SECONDS = 60.0
+
+# rough characters per token, used to estimate the size of a request before sending it
+CHARS_PER_TOKEN = 4
+
+# ------------------------------------------
+#  Helpers to Parse Groq Rate Limit Headers
+# ------------------------------------------
+
+DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+DURATION_UNITS = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+
+def parse_reset_duration(value) -> Optional[float]:
+    """
+    Convert a Groq reset value such as "2m59.56s", "7.66s" or "120ms" (or a plain number of seconds) into seconds.
+    """
+    if value is None:
+        return None
+
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+def parse_int(value) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+def estimate_tokens(text) -> int:
+    return len(str(text)) // CHARS_PER_TOKEN + 1
+
+# the reservation made by the current thread/task, so its response hook can release it
+current_reservation = contextvars.ContextVar('rate_limit_reservation', default=None)
+
+# ------------------------------------------
+#  Shared Request/Token Bucket Rate Limiter
+# ------------------------------------------
+
+class RateLimiter:
+    """
+    Request and token budget shared by every LLM call.
+
+    The budget is seeded with the per-minute defaults and then kept in sync with the
+    x-ratelimit-* and retry-after headers Groq sends back, so callers only wait when
+    the budget is actually exhausted.
+
+    Requests that were reserved but not yet answered are tracked as outstanding, since the
+    remaining budget Groq reports does not count them yet.
+    """
+
+    def __init__(self, requests_per_minute: int = DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE):
+        self._lock = threading.Lock()
+
+        self.request_limit = requests_per_minute
+        self.token_limit = tokens_per_minute
+
+        self.remaining_requests = requests_per_minute
+        self.remaining_tokens = tokens_per_minute
+
+        # monotonic times at which the request/token budgets are restored
+        self.requests_reset_at = None
+        self.tokens_reset_at = None
+
+        # set from a 429 retry-after, nothing is sent before this time
+        self.blocked_until = 0.0
+
+        # reservation id -> tokens, for requests sent but not yet answered
+        self._reservations = {}
+        self._reservation_ids = itertools.count(1)
+        self.outstanding_tokens = 0
+
+        self.headers_seen = False
+        self.total_wait_seconds = 0.0
+
+    # -------------------------------
+    #  Budget Bookkeeping
+    # -------------------------------
+
+    def _refill(self, now):
+        # once a reset time passes the whole budget is available again
+        if self.requests_reset_at is not None and now >= self.requests_reset_at:
+            self.remaining_requests = self.request_limit
+            self.requests_reset_at = None
+
+        if self.tokens_reset_at is not None and now >= self.tokens_reset_at:
+            self.remaining_tokens = self.token_limit
+            self.tokens_reset_at = None
+
+    def _wait_time(self, tokens, now):
+        waits = [self.blocked_until - now]
+
+        if self.remaining_requests < 1 and self.requests_reset_at is not None:
+            waits.append(self.requests_reset_at - now)
+
+        # a request larger than the whole limit can never fit, so only wait for the budget to be full again
+        if self.remaining_tokens < min(tokens, self.token_limit) and self.tokens_reset_at is not None:
+            waits.append(self.tokens_reset_at - now)
+
+        return max(waits)
+
+    def _reserve(self, tokens, now):
+        self.remaining_requests -= 1
+        self.remaining_tokens -= tokens
+
+        reservation_id = next(self._reservation_ids)
+        self._reservations[reservation_id] = tokens
+        self.outstanding_tokens += tokens
+        current_reservation.set(reservation_id)
+
+        # without server headers start a local window the first time budget is spent
+        if self.requests_reset_at is None:
+            self.requests_reset_at = now + BUDGET_WINDOW_SECONDS
+        if self.tokens_reset_at is None:
+            self.tokens_reset_at = now + BUDGET_WINDOW_SECONDS
+
+    def reserve_or_wait_time(self, tokens: int = 0) -> float:
+        """
+        Reserve budget for one request of about `tokens` tokens, or return the seconds to wait before trying again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            wait = self._wait_time(tokens, now)
+            if wait > 0:
+                return wait
+
+            self._reserve(tokens, now)
+            return 0.0
+
+    def acquire(self, tokens: int = 0):
+        """
+        Block until there is budget for one request of about `tokens` tokens.
+        """
+        while True:
+            wait = self.reserve_or_wait_time(tokens)
+            if wait <= 0:
+                return
+
+            print(f"Rate limit budget exhausted, waiting {wait:.1f} seconds: {self.state()}", flush=True)
+            with self._lock:
+                self.total_wait_seconds += wait
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0):
+        """
+        Async version of acquire, sleeps without blocking the event loop.
+        """
+        while True:
+            wait = self.reserve_or_wait_time(tokens)
+            if wait <= 0:
+                return
+
+            print(f"Rate limit budget exhausted, waiting {wait:.1f} seconds: {self.state()}", flush=True)
+            with self._lock:
+                self.total_wait_seconds += wait
+            await asyncio.sleep(wait)
+
+    def release(self, reservation_id: Optional[int] = None):
+        """
+        Mark a reserved request as answered (by default the current thread/task's one), releasing it is safe to repeat.
+        """
+        if reservation_id is None:
+            reservation_id = current_reservation.get()
+            current_reservation.set(None)
+        if reservation_id is None:
+            return
+
+        with self._lock:
+            self.outstanding_tokens -= self._reservations.pop(reservation_id, 0)
+
+    # -------------------------------
+    #  Sync with Groq's Headers
+    # -------------------------------
+
+    def update_from_headers(self, headers: Mapping, status_code: Optional[int] = None):
+        """
+        Sync the budget with the rate limit headers of a Groq response.
+        """
+        headers = {str(key).lower(): value for key, value in headers.items()}
+
+        with self._lock:
+            now = time.monotonic()
+
+            request_limit = parse_int(headers.get('x-ratelimit-limit-requests'))
+            token_limit = parse_int(headers.get('x-ratelimit-limit-tokens'))
+            remaining_requests = parse_int(headers.get('x-ratelimit-remaining-requests'))
+            remaining_tokens = parse_int(headers.get('x-ratelimit-remaining-tokens'))
+            reset_requests = parse_reset_duration(headers.get('x-ratelimit-reset-requests'))
+            reset_tokens = parse_reset_duration(headers.get('x-ratelimit-reset-tokens'))
+
+            if request_limit is not None:
+                self.request_limit = request_limit
+            if token_limit is not None:
+                self.token_limit = token_limit
+            # Groq's remaining budget doesn't include requests still in flight, so keep their reservations
+            if remaining_requests is not None:
+                self.remaining_requests = remaining_requests - len(self._reservations)
+                self.headers_seen = True
+            if remaining_tokens is not None:
+                self.remaining_tokens = remaining_tokens - self.outstanding_tokens
+                self.headers_seen = True
+            if reset_requests is not None:
+                self.requests_reset_at = now + reset_requests
+            if reset_tokens is not None:
+                self.tokens_reset_at = now + reset_tokens
+
+            # a 429 means the budget is gone regardless of what we thought was left
+            if status_code == 429:
+                retry_after = parse_reset_duration(headers.get('retry-after'))
+                if retry_after is None:
+                    retry_after = reset_tokens or BUDGET_WINDOW_SECONDS
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def httpx_response_hook(self, response):
+        # event hook for the httpx.Client given to ChatGroq, the request it answers is no longer outstanding
+        self.release()
+        self.update_from_headers(response.headers, response.status_code)
+
+    async def ahttpx_response_hook(self, response):
+        # event hook for the httpx.AsyncClient used in async runs
+        self.release()
+        self.update_from_headers(response.headers, response.status_code)
+
+    # -------------------------------
+    #  Budget State for Logging
+    # -------------------------------
+
+    def state(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'remaining_requests': self.remaining_requests,
+                'request_limit': self.request_limit,
+                'requests_reset_in': round(max(self.requests_reset_at - now, 0.0), 2) if self.requests_reset_at is not None else None,
+                'remaining_tokens': self.remaining_tokens,
+                'outstanding_requests': len(self._reservations),
+                'outstanding_tokens': self.outstanding_tokens,
+                'token_limit': self.token_limit,
+                'tokens_reset_in': round(max(self.tokens_reset_at - now, 0.0), 2) if self.tokens_reset_at is not None else None,
+                'blocked_for': round(max(self.blocked_until - now, 0.0), 2),
+                'from_headers': self.headers_seen,
+                'total_wait_seconds': round(self.total_wait_seconds, 2)
+            }
@@ -1,215 +1,737 @@
 import os
+import sys
 import json
+import time
+from functools import lru_cache
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-from langchain_ollama import OllamaEmbeddings
-from langchain_chroma import Chroma
+import numpy as np
 from langchain_core.documents import Document
 
+from ..services.transcript_manifest import manifest
+from .embedding_journal import EmbeddingJournal
+from .mmr import mmr_select_batch
+from .bm25_index import BM25Index, DEFAULT_INDEX_PATH as DEFAULT_BM25_INDEX_PATH
+from .near_duplicates import NearDuplicateIndex, DEFAULT_INDEX_PATH as DEFAULT_NEAR_DUPLICATE_INDEX_PATH, DEFAULT_THRESHOLD as DEFAULT_NEAR_DUPLICATE_THRESHOLD
+from .vector_backends import (
+    ChromaBackend, FlatIndexBackend, migrate, compare, sweep_hnsw, hnsw_metadata, hnsw_settings, set_ef_search,
+    DEFAULT_FLAT_INDEX_PATH, DEFAULT_RESCORE_FACTOR,
+    DEFAULT_HNSW_SPACE, DEFAULT_HNSW_M, DEFAULT_HNSW_EF_CONSTRUCTION, DEFAULT_HNSW_EF_SEARCH
+)
+from .video_store import VideoStore, split_metadata, VIDEO_FIELDS, DEFAULT_STORE_PATH as DEFAULT_VIDEO_STORE_PATH
+from .embedding_cache import EmbeddingCache, CachedEmbeddings, DEFAULT_CACHE_PATH as DEFAULT_EMBEDDING_CACHE_PATH, DEFAULT_MAX_BYTES as DEFAULT_EMBEDDING_CACHE_MAX_BYTES
+
 # ----------------------------------------------
 #  Setup for Embeddings and VectorDB
 # ----------------------------------------------
 
 # embedding model from Ollama
-embeddings = OllamaEmbeddings(model = "mxbai-embed-large")
+EMBEDDING_MODEL = "mxbai-embed-large"
+
+# chunks embedded before (same model, same normalized text) come from the on-disk cache, only new chunks go to Ollama
+# (the sqlite file is only opened on the first lookup)
+embedding_cache = EmbeddingCache(
+    path = os.getenv('EMBEDDING_CACHE_PATH', DEFAULT_EMBEDDING_CACHE_PATH),
+    max_bytes = int(os.getenv('EMBEDDING_CACHE_MAX_BYTES', DEFAULT_EMBEDDING_CACHE_MAX_BYTES)),
+    enabled = os.getenv('EMBEDDING_CACHE_ENABLED', '1') != '0'
+)
 
-# the instantiation of the vector store and db location
-db_location = Path(__file__).parent.parent.parent / "chroma_langchain_db"
+# the video level fields (title, counts, ...) are kept once per video here, chunks only carry their video id, start and duration
+video_store = VideoStore(os.getenv('VIDEO_STORE_PATH', DEFAULT_VIDEO_STORE_PATH))
 
-vector_store = Chroma(
-    collection_name = "transcripts",
-    persist_directory = str(db_location),
-    embedding_function = embeddings
+# the inverted index of the chunk texts for the lexical side of hybrid retrieval, filled as chunks are embedded
+bm25_index = BM25Index(os.getenv('BM25_INDEX_PATH', DEFAULT_BM25_INDEX_PATH))
+
+# MinHash LSH index of the embedded chunks, new chunks are checked against it before they are embedded
+near_duplicate_index = NearDuplicateIndex(
+    os.getenv('NEAR_DUPLICATE_INDEX_PATH', DEFAULT_NEAR_DUPLICATE_INDEX_PATH),
+    float(os.getenv('NEAR_DUPLICATE_THRESHOLD', DEFAULT_NEAR_DUPLICATE_THRESHOLD))
 )
 
+# the db location of the vector store
+db_location = Path(__file__).parent.parent.parent / "chroma_langchain_db"
+
+# HNSW settings of the transcripts collection (chroma's defaults unless set), tune them with `python -m src.llm.vector sweep-hnsw`.
+# space, M and ef_construction only apply when the collection is created, ef_search is applied to the existing collection too
+# (a process reads it when it first loads the index)
+HNSW_SPACE = os.getenv('HNSW_SPACE', DEFAULT_HNSW_SPACE)
+HNSW_M = int(os.getenv('HNSW_M', DEFAULT_HNSW_M))
+HNSW_EF_CONSTRUCTION = int(os.getenv('HNSW_EF_CONSTRUCTION', DEFAULT_HNSW_EF_CONSTRUCTION))
+HNSW_EF_SEARCH = int(os.getenv('HNSW_EF_SEARCH', DEFAULT_HNSW_EF_SEARCH))
+
+# the embeddings and the vector store are built on first use, so importing this module (e.g. from the API)
+# neither loads langchain_ollama/chromadb nor opens the persist directory, and works while Ollama or Chroma are down
+@lru_cache(maxsize=1)
+def get_embeddings():
+    from langchain_ollama import OllamaEmbeddings
+    return CachedEmbeddings(OllamaEmbeddings(model = EMBEDDING_MODEL), EMBEDDING_MODEL, embedding_cache)
+
+@lru_cache(maxsize=1)
+def get_vector_store():
+    from langchain_chroma import Chroma
+    store = Chroma(
+        collection_name = "transcripts",
+        persist_directory = str(db_location),
+        embedding_function = get_embeddings(),
+        collection_metadata = hnsw_metadata(HNSW_SPACE, HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH)
+    )
+
+    settings = hnsw_settings(store._collection)
+    configured = {'space': HNSW_SPACE, 'm': HNSW_M, 'ef_construction': HNSW_EF_CONSTRUCTION}
+    if any(settings[key] != value for key, value in configured.items()):
+        print(f"transcripts collection was built with {settings}, the configured {configured} only apply to a new collection", flush=True)
+    set_ef_search(store._collection, HNSW_EF_SEARCH)
+    return store
+
+# 'chroma' (HNSW, the default) or 'flat' (exact search over a memory-mapped index shared by every process that opens it)
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+
+# the directory of the flat index, filled from Chroma by `python -m src.llm.vector migrate-flat`
+FLAT_INDEX_PATH = os.getenv('FLAT_INDEX_PATH', DEFAULT_FLAT_INDEX_PATH)
+
+# '' for an exact search over the float vectors, 'int8' or 'binary' for a quantized first pass rescored with the float vectors
+FLAT_INDEX_QUANTIZATION = os.getenv('FLAT_INDEX_QUANTIZATION', '')
+
+# the candidates rescored per result after a quantized first pass
+FLAT_INDEX_RESCORE_FACTOR = int(os.getenv('FLAT_INDEX_RESCORE_FACTOR', DEFAULT_RESCORE_FACTOR))
+
+@lru_cache(maxsize=1)
+def get_flat_index():
+    return FlatIndexBackend(FLAT_INDEX_PATH, get_embeddings(), FLAT_INDEX_QUANTIZATION, FLAT_INDEX_RESCORE_FACTOR)
+
+# the backend retrieval and the embed stage go through
+def get_backend():
+    if VECTOR_BACKEND == 'flat':
+        return get_flat_index()
+    return ChromaBackend(get_vector_store())
+
+# -----------------------------------------
+#  Query Embeddings, Cached
+# -----------------------------------------
+
+# the number of query vectors kept in memory, the enriched scheduled queries are the same every week
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 256))
+
+# in memory first, then the on-disk cache (keyed by model and query text), only new queries go to Ollama
+@lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+def cached_query_embedding(query):
+    return tuple(get_embeddings().embed_query(query))
+
+def embed_query(query):
+    return list(cached_query_embedding(query))
+
 # -----------------------------------------
 #  K chunk retrieval for RAG
 # -----------------------------------------
 
-def retrieval(query, k_chunks = 15):
-    if k_chunks > 300:
-        k_chunks = 300
+# the candidate pool mmr selects from, and the chunks returned at most
+MMR_FETCH_K = int(os.getenv('MMR_FETCH_K', 300))
+
+# 0 = max diversity, 1 = max similarity
+MMR_LAMBDA = 0.3
+
+# 'vector' for mmr over the vector search, 'hybrid' to also rank the chunks with BM25 and fuse both rankings
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'vector')
+
+# the rank offset of reciprocal rank fusion, damps the weight of the top few ranks of each ranking
+RRF_K = 60
+
+# -----------------------------------------
+#  Structured Filters, through the Video Store
+# -----------------------------------------
 
-    retrieved = vector_store.as_retriever(
-        search_type="mmr", # favors diversity over purely similarity
-        # How many docs to look up
-        search_kwargs = {
-            "k": k_chunks, # the number of chunks to return
-            "fetch_k": 300, # the candidate pool to select from
-            "lambda_mult": 0.3 # 0 = max diversity, 1 = max similarity
-        }
-    ).invoke(query)
+# the filters retrieval accepts, published_after/published_before take datetimes, ISO strings or unix times
+RETRIEVAL_FILTERS = ('published_after', 'published_before', 'channel_ids', 'min_view_count')
+
+# the video fields only live in the video store, so the filters select video ids there and the searches are restricted to those
+def filtered_video_ids(filters):
+    if not filters:
+        return None
+
+    unknown = set(filters) - set(RETRIEVAL_FILTERS)
+    if unknown:
+        raise ValueError(f"Unknown retrieval filter(s) {sorted(unknown)}, expected some of {RETRIEVAL_FILTERS}")
+    return video_store.video_ids_matching(**filters)
+
+def build_where(embedded_after = None, video_ids = None):
+    # chunks embedded before embedded_at was added to the metadata never match, they were covered by earlier runs
+    clauses = []
+    if embedded_after is not None:
+        clauses.append({"embedded_at": {"$gt": embedded_after}})
+    if video_ids is not None:
+        clauses.append({"video_id": {"$in": video_ids}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+# the fetch_k nearest chunks of each query, with their embeddings as one padded float32 matrix (queries, fetch_k, dim)
+def fetch_candidates(query_vectors, fetch_k = MMR_FETCH_K, where = None):
+    results = get_backend().query(query_vectors, fetch_k, where)
+
+    counts = [len(ids) for ids in results['ids']]
+    matrix = np.zeros((len(query_vectors), max(counts, default=0), len(query_vectors[0])), dtype=np.float32)
+    for query, embeddings in enumerate(results['embeddings']):
+        if counts[query]:
+            matrix[query, :counts[query]] = embeddings
+
+    documents = [
+        [Document(page_content = text, metadata = metadata or {}, id = chunk_id) for chunk_id, text, metadata in zip(ids, texts, metadatas)]
+        for ids, texts, metadatas in zip(results['ids'], results['documents'], results['metadatas'])
+    ]
+    return documents, matrix, counts
 
+# -----------------------------------------
+#  Lexical Ranking, Fused with the Vectors
+# -----------------------------------------
+
+# each id scores 1 / (RRF_K + rank) in every ranking it is in, best fused score first
+def reciprocal_rank_fusion(rankings, rrf_k = RRF_K):
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+# fuses the mmr selection (in selection order) with the BM25 ranking of the query, chunks only found by BM25 are read from the vector store
+def fuse_lexical(query, vector_ranked, k_chunks, embedded_after = None, video_ids = None):
+    lexical = [chunk_id for chunk_id, _ in bm25_index.search(query, k_chunks, embedded_after, video_ids)]
+    fused = reciprocal_rank_fusion([[doc.id for doc in vector_ranked], lexical])[:k_chunks]
+
+    by_id = {doc.id: doc for doc in vector_ranked}
+    missing = [chunk_id for chunk_id in fused if chunk_id not in by_id]
+    if missing:
+        found = get_backend().get(ids = missing)
+        for chunk_id, text, metadata in zip(found['ids'], found['documents'], found['metadatas']):
+            by_id[chunk_id] = Document(page_content = text, metadata = metadata or {}, id = chunk_id)
+
+    # a chunk in the index but no longer in the vector store is dropped
+    return [by_id[chunk_id] for chunk_id in fused if chunk_id in by_id]
+
+# embedded_after (unix time) restricts retrieval to chunks embedded after it, e.g. since the last scheduled run
+# filters (see RETRIEVAL_FILTERS) restrict it to the chunks of matching videos, before the search rather than after
+# several queries are searched in one vector store call, and their mmr selections made together
+def retrieval_many(queries, k_chunks = 15, embedded_after = None, mode = RETRIEVAL_MODE, filters = None):
+    k_chunks = min(k_chunks, MMR_FETCH_K)
+
+    video_ids = filtered_video_ids(filters)
+    if video_ids is not None and not video_ids:
+        return [[] for _ in queries]
+
+    where = build_where(embedded_after, video_ids)
+
+    # searched by the cached query vectors, so a repeated query isn't embedded again
+    query_vectors = [embed_query(query) for query in queries]
+    documents, matrix, counts = fetch_candidates(query_vectors, MMR_FETCH_K, where)
+
+    # mmr favors diversity over purely similarity
+    selections = mmr_select_batch(np.asarray(query_vectors, dtype=np.float32), matrix, k_chunks, MMR_LAMBDA, counts)
+
+    retrieved = []
+    for query, candidates, selected in zip(queries, documents, selections):
+        if mode == 'hybrid':
+            chunks = fuse_lexical(query, [candidates[index] for index in selected], k_chunks, embedded_after, video_ids)
+        else:
+            # the chunks are kept in order of similarity, as the langchain retriever returned them
+            chunks = [candidates[index] for index in sorted(selected)]
+
+        # join the video fields back onto the chunks
+        retrieved.append(video_store.join(chunks))
     return retrieved
 
+def retrieval(query, k_chunks = 15, embedded_after = None, mode = RETRIEVAL_MODE, filters = None):
+    return retrieval_many([query], k_chunks, embedded_after, mode, filters)[0]
+
+# -----------------------------------------
+#  Embedding Batch Settings
+# -----------------------------------------
+
+# chunks per add_documents call, batches are filled across files
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 256))
+
+# add_documents calls (Ollama embedding requests) in flight at once
+EMBED_WORKERS = int(os.getenv('EMBED_WORKERS', 4))
+
+# what happens to a chunk that near-duplicates an embedded one (re-uploads, clips, repeated sponsor reads):
+# 'flag' embeds it with the chunk it repeats in its near_duplicate_of metadata, 'collapse' leaves it out, 'off' skips the check
+NEAR_DUPLICATE_MODE = os.getenv('NEAR_DUPLICATE_MODE', 'flag')
+NEAR_DUPLICATE_MODES = ('off', 'flag', 'collapse')
+
+# -----------------------------------------
+#  Build the Documents of one File
+# -----------------------------------------
+
+# returns the video id, the video level fields and the documents of a transcript file, or None if the file can't be used
+def file_documents(path_to_transcripts, js):
+    filepath = os.path.join(path_to_transcripts, js)
+
+    # get chunks from filepath
+    try:
+        with open(filepath, 'r') as file:
+            chunks = json.load(file)
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"Skipping {js} - could not read file: {e}")
+        return None
+
+    # check that there exists at least one chunk and that there is a chunk list
+    if not isinstance(chunks, list) or len(chunks) == 0:
+        print(f"Skipping {js} - empty or malformed content.")
+        return None
+
+    # --------------------------
+    #  Get Metadata
+    # --------------------------
+
+    # parse the channel_id and video_index from filename for metadata
+    # expected format: {channel_id}_transcript_{video_index}.json
+    # replace nonmetadata info with pipe |, then split around it
+    parts = js.replace("_transcript_", "|").replace(".json", "").split("|")
+
+    channel_id = parts[0] if len(parts) == 2 else "unknown"
+    video_index = parts[1] if len(parts) == 2 else "unknown"
+
+    # video metrics are in a dictionary at the end of the list of transcripts, they're stored once for the video
+    video_metrics = chunks[-1]
+    video_id = video_metrics['video_id']
+    video = {
+        "channel_id": channel_id,
+        "video_index": video_index,
+        "title": video_metrics['title'],
+        "published_at": video_metrics['published_at'],
+        "view_count": video_metrics['view_count'],
+        "like_count": video_metrics["like_count"],
+        "comment_count": video_metrics["comment_count"],
+        "total_duration": video_metrics["duration"],
+        "source_file": js
+    }
+
+    # when the chunks were embedded, so incremental runs only retrieve chunks added since the last run
+    embedded_at = time.time()
+
+    file_docs = []
+    # then iterate through the pandas dataframe made from the trnascript file
+    for i, chunk in enumerate(chunks):
+        # ignore final chunk (i.e. the metadata dictionary from video metrics)
+        if i == len(chunks) - 1:
+            continue
+
+        # guard against malformed chunks, missing fields
+        text = chunk.get('text', '').strip()
+
+        # don't bother adding empty text to documents
+        if not text:
+            continue
+
+        doc = Document(
+            # the content to be embedded for the vector db
+            page_content = text,
+
+            # the metadata, the video level fields are joined from the video store at retrieval
+            metadata = {
+                "start": chunk.get("start", 0.0),
+                "duration": chunk.get("duration", 0.0),
+                "video_id": video_id,
+                "embedded_at": embedded_at
+            },
+
+            # id for transcript chunk
+            id = f"{js}_{i}"
+        )
+        file_docs.append(doc)
+
+    return video_id, video, file_docs
+
+# -----------------------------------------
+#  Near-Duplicate Chunks
+# -----------------------------------------
+
+# the documents of a file to embed after the near-duplicate check of the given mode, and the other videos whose
+# not yet embedded chunks its near-duplicates point at (it is only logged once they are)
+def deduplicate_documents(video_id, file_docs, mode = NEAR_DUPLICATE_MODE):
+    if mode not in NEAR_DUPLICATE_MODES:
+        raise ValueError(f"Unknown near-duplicate mode {mode!r}, expected one of {NEAR_DUPLICATE_MODES}")
+    if mode == 'off':
+        return file_docs, set()
+
+    # a video embedded again is only compared with the other videos
+    near_duplicate_index.forget_videos([video_id])
+
+    # the kept chunks are staged, add_batch indexes them once they are in the vector store
+    kept, duplicate_of = [], []
+    for doc, duplicate in zip(file_docs, near_duplicate_index.check_many(file_docs, stage=True)):
+        if duplicate is None:
+            kept.append(doc)
+            continue
+        duplicate_of.append(duplicate[0])
+        if mode == 'flag':
+            doc.metadata['near_duplicate_of'] = duplicate[0]
+            kept.append(doc)
+    return kept, near_duplicate_index.staged_videos(duplicate_of) - {video_id}
+
+# what the near-duplicates of this run cost (flag) or saved (collapse), prompt tokens being the chunk texts
+# that can no longer fill a prompt next to the chunk they repeat
+def near_duplicate_report(mode = NEAR_DUPLICATE_MODE):
+    report = {'mode': mode, **near_duplicate_index.stats()}
+    collapsed = mode == 'collapse'
+    report['embeddings_saved'] = report['near_duplicates'] if collapsed else 0
+    report['prompt_tokens_saved'] = report['near_duplicate_tokens'] if collapsed else 0
+    return report
+
+# -----------------------------------------
+#  Stream Documents into Cross-File Batches
+# -----------------------------------------
+
+# yields lists of (video id, document) of batch_size, a file's documents can be split over two batches
+def document_batches(files_documents, batch_size = EMBED_BATCH_SIZE):
+    batch = []
+    for video_id, file_docs in files_documents:
+        for doc in file_docs:
+            batch.append((video_id, doc))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def add_batch(batch):
+    documents = [doc for _, doc in batch]
+    get_backend().add_documents(documents)
+
+    # indexed once the chunks are in the vector store, so a failed batch is left out of both
+    bm25_index.add_many(documents)
+    near_duplicate_index.commit(doc.id for doc in documents)
+
 # -----------------------------------------
 #  Embed Transcripts
 # -----------------------------------------
 
-def embed_transcripts():
+def embed_transcripts(batch_size = EMBED_BATCH_SIZE, workers = EMBED_WORKERS):
     # ----------------------------------------------
     #  Setup for Retrieval of Transcripts
     # ----------------------------------------------
 
     path_to_transcripts = Path(__file__).parent.parent.parent / 'data' / 'transcripts'
 
-    transcripts_files = [pos_transcript for pos_transcript in os.listdir(path_to_transcripts) if pos_transcript.endswith('.json')]
-
     # ----------------------------------------------
     #  Get Logging
     # ----------------------------------------------
 
-    # create a log path to save files that have been embedded already
-    embedded_log_path = Path(__file__).parent.parent.parent / 'data' / "embedded_files.json"
-    already_embedded = set()
+    # the journal of videos that have been embedded already (seeded from embedded_files.json the first time)
+    journal = EmbeddingJournal()
+    journal.load()
+    already_embedded = journal.video_ids()
 
-    # load the already_embedded set with the information from the log file
-    if embedded_log_path.exists():
-        try:
-            already_embedded = set(json.loads(embedded_log_path.read_text()))
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Warning: count not read embedded log, starting fresh: {e}")
+    # ----------------------------------------------
+    #  Find New Files in the Manifest
+    # ----------------------------------------------
+
+    # only files changed outside of the chunker (or not in the manifest yet) are parsed here
+    print(f"Transcript manifest synced: {manifest.sync(path_to_transcripts)}", flush=True)
+    new_files = manifest.files(exclude_video_ids = already_embedded)
+    print(f"{len(new_files)} new transcript file(s) to embed", flush=True)
 
     # ----------------------------------------------
-    #  Get New Files/Documents and Parse and Embed
+    #  Get New Files/Documents, each File Read Once
     # ----------------------------------------------
 
-    new_files = []
-    for file in transcripts_files:
-        filepath = os.path.join(path_to_transcripts, file)
+    # video id -> chunks not yet embedded, a video is only logged once all of its chunks are in
+    pending = {}
+    # video id -> its chunk ids, recorded in the journal
+    chunk_ids = {}
+    # videos with a failed batch, never logged so they are embedded again on the next run
+    failed = set()
+    # video id -> the videos holding the not yet embedded chunks its near-duplicates point at
+    waits_for = {}
+    # videos with all their chunks in, in order, logged once the videos they wait for are (failed if one of those fails)
+    waiting = {}
+    logged = set()
+
+    # takes the waiting videos that can be logged now
+    def ready_videos():
+        ready = []
+        changed = True
+        while changed:
+            changed = False
+            for video_id in list(waiting):
+                blocking = waits_for.get(video_id, set())
+                if blocking & failed:
+                    print(f" {video_id} repeats chunks of a video that failed, embedding it again next run", flush=True)
+                    failed.add(video_id)
+                elif blocking <= logged:
+                    logged.add(video_id)
+                    ready.append(video_id)
+                else:
+                    continue
+                del waiting[video_id]
+                changed = True
+        return ready
+
+    def new_files_documents():
+        for js, _ in new_files:
+            file = file_documents(path_to_transcripts, js)
+            if file is None:
+                continue
 
-        # get chunks from filepath
-        try:
-            with open(filepath, 'r') as file:
-                chunks = json.load(file)
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Skipping {file} - could not read file: {e}")
-            continue
+            video_id, video, file_docs = file
+
+            if not file_docs:
+                print(f"No valid chunks found in {js}, skipping.", flush=True)
+                continue
+
+            # stored before its chunks are added, so retrieval can always join them
+            video_store.upsert_many({video_id: video})
+
+            file_docs, waits_for[video_id] = deduplicate_documents(video_id, file_docs)
+
+            # every chunk repeats an embedded one, logged with no chunks so it isn't checked again next run
+            # (once the chunks it repeats are embedded)
+            if not file_docs:
+                print(f"All chunks of {js} are near-duplicates, collapsed.", flush=True)
+                chunk_ids[video_id] = []
+                waiting[video_id] = True
+                record(ready_videos())
+                continue
+
+            pending[video_id] = pending.get(video_id, 0) + len(file_docs)
+            chunk_ids.setdefault(video_id, []).extend(doc.id for doc in file_docs)
+            yield video_id, file_docs
+
+    # ----------------------------------------------
+    #  Embed the Batches, Several in Flight
+    # ----------------------------------------------
+
+    total_chunks_embedded = 0
+    batch_num = 0
+    running = {}
+
+    # append to the journal per batch, so a crash only re-embeds the batches that were in flight
+    def record(completed):
+        if completed:
+            journal.record({video_id: chunk_ids.pop(video_id) for video_id in completed}, EMBEDDING_MODEL)
+            print(f"Embedded {total_chunks_embedded} chunks so far, {len(completed)} video(s) done", flush=True)
+
+    def finish(done):
+        nonlocal total_chunks_embedded
+        for future in done:
+            batch_num, batch = running.pop(future)
+            try:
+                future.result()
+                total_chunks_embedded += len(batch)
+            except Exception as e:
+                print(f" Failed to embed batch {batch_num}: {e}", flush=True)
+                failed.update(video_id for video_id, _ in batch)
+                # nothing is checked against the chunks of the failed videos that are still staged
+                near_duplicate_index.discard_videos(video_id for video_id, _ in batch)
+
+            for video_id, _ in batch:
+                pending[video_id] -= 1
+                if pending[video_id] == 0:
+                    del pending[video_id]
+                    if video_id not in failed:
+                        waiting[video_id] = True
+
+        record(ready_videos())
 
-        # get video id
-        video_metrics = chunks[-1]
-        video_id = video_metrics['video_id']
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in document_batches(new_files_documents(), batch_size):
+            batch_num += 1
 
-        # check if this video has already been embedded
-        if video_id not in already_embedded:
-            new_files.append(os.path.basename(filepath))
+            # keep at most two batches per worker queued, so the files are read as the batches are embedded
+            while len(running) >= workers * 2:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                finish(done)
 
-    print(new_files)
-    if not new_files:
+            print(f"[batch {batch_num}] Embedding {len(batch)} chunks...", flush=True)
+            running[executor.submit(add_batch, batch)] = (batch_num, batch)
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            finish(done)
+
+    if batch_num == 0:
         print("No new transcript files to embed.")
     else:
-        print(f"Embedding {len(new_files)} new transcript file(s)...")
+        print(f"Embedded {total_chunks_embedded} chunks in {batch_num} batch(es), {len(failed)} video(s) failed", flush=True)
+        print(f"Embedding cache: {embedding_cache.stats()}", flush=True)
+    if NEAR_DUPLICATE_MODE != 'off':
+        print(f"Near-duplicates: {near_duplicate_report()}", flush=True)
 
-        total_chunks_embedded = 0
+    # rewrite the journal with one line per video once superseded lines pile up
+    if journal.needs_compaction():
+        journal.compact()
+        print(f"Compacted the embedding journal to {journal.lines} line(s)", flush=True)
 
-        # go through each file in new files
-        for file_num, js in enumerate(new_files):
-            print(f"[{file_num + 1}/{len(new_files)}] Embedding {js}...", flush=True)
+# -----------------------------------------
+#  Move the Video Fields off Existing Chunks
+# -----------------------------------------
 
-            filepath = os.path.join(path_to_transcripts, js)
+def metadata_bytes(metadatas):
+    return sum(len(json.dumps(metadata)) for metadata in metadatas)
+
+# moves the video level fields of chunks embedded before the split into the video store, and reports the savings
+def normalize_chunk_metadata(store = None, videos = None, page_size = 5000):
+    store = store if store is not None else get_vector_store()
+    videos = videos if videos is not None else video_store
+
+    full_bytes, chunk_bytes, moved_chunks = 0, 0, 0
+    video_rows = {}
+
+    offset = 0
+    while True:
+        page = store.get(include=['metadatas'], limit=page_size, offset=offset)
+        if not page['ids']:
+            break
+        offset += len(page['ids'])
+
+        # the full metadata of each chunk, including fields already moved to the store
+        joined = videos.get_many(metadata.get('video_id') for metadata in page['metadatas'])
+        full = [{**metadata, **joined.get(metadata.get('video_id'), {})} for metadata in page['metadatas']]
+
+        split = [split_metadata(metadata) for metadata in full]
+        page_videos = {chunk['video_id']: video for chunk, video in split if video and 'video_id' in chunk}
+        videos.upsert_many(page_videos)
+        video_rows.update(page_videos)
+
+        # update merges metadata, a None value removes the key from the chunk
+        moved_ids, moved = [], []
+        for chunk_id, metadata in zip(page['ids'], page['metadatas']):
+            video_keys = [key for key in metadata if key in VIDEO_FIELDS]
+            if video_keys:
+                moved_ids.append(chunk_id)
+                moved.append({key: None for key in video_keys})
+        if moved_ids:
+            store._collection.update(ids=moved_ids, metadatas=moved)
+        moved_chunks += len(moved_ids)
+
+        full_bytes += metadata_bytes(full)
+        chunk_bytes += metadata_bytes(chunk for chunk, _ in split)
+
+    video_bytes = metadata_bytes(video_rows.values())
+    saved = full_bytes - chunk_bytes - video_bytes
+    print(
+        f"Chunks: {offset}, videos: {len(video_rows)}, chunks moved: {moved_chunks}\n"
+        f"Metadata per chunk: {full_bytes} bytes -> {chunk_bytes} bytes on the chunks + {video_bytes} bytes in the video store "
+        f"({saved} bytes, {saved / full_bytes * 100 if full_bytes else 0.0:.1f}% saved)",
+        flush=True
+    )
+    return {'chunks': offset, 'videos': len(video_rows), 'moved_chunks': moved_chunks,
+            'full_bytes': full_bytes, 'chunk_bytes': chunk_bytes, 'video_bytes': video_bytes}
 
-            # get chunks from filepath
-            try:
-                with open(filepath, 'r') as file:
-                    chunks = json.load(file)
-            except (json.JSONDecodeError, IOError) as e:
-                print(f"Skipping {js} - could not read file: {e}")
-                continue
+# -----------------------------------------
+#  Index the Chunks Embedded before BM25
+# -----------------------------------------
 
-            # check that there exists at least one chunk and that there is a chunk list
-            if not isinstance(chunks, list) or len(chunks) == 0:
-                print(f"Skipping {js} - empty or malformed content.")
-                continue
+def build_bm25_index(store = None, index = None, page_size = 5000):
+    store = store if store is not None else get_backend()
+    index = index if index is not None else bm25_index
 
-            # --------------------------
-            #  Get Metadata
-            # --------------------------
-
-            # parse the channel_id and video_index from filename for metadata
-            # expected format: {channel_id}_transcript_{video_index}.json
-            # replace nonmetadata info with pipe |, then split around it
-            parts = js.replace("_transcript_", "|").replace(".json", "").split("|")
-
-            channel_id = parts[0] if len(parts) == 2 else "unknown"
-            video_index = parts[1] if len(parts) == 2 else "unknown"
-
-            # video metrics are in a dictionary at the end of the list of transcripts
-            video_metrics = chunks[-1]
-            title = video_metrics['title']
-            video_id = video_metrics['video_id']
-            published_at = video_metrics['published_at']
-            view_count = video_metrics['view_count']
-            like_count = video_metrics["like_count"]
-            comment_count = video_metrics["comment_count"]
-            total_duration = video_metrics["duration"]
-
-            file_docs = []
-            file_ids = []
-            # then iterate through the pandas dataframe made from the trnascript file
-            for i, chunk in enumerate(chunks):
-                # ignore final chunk (i.e. the metadata dictionary from video metrics)
-                if i == len(chunks) - 1:
-                    continue
+    offset = 0
+    while True:
+        page = store.get(include=['metadatas', 'documents'], limit=page_size, offset=offset)
+        if not page['ids']:
+            break
+        offset += len(page['ids'])
 
-                # guard against malformed chunks, missing fields
-                text = chunk.get('text', '').strip()
+        index.add_many(
+            Document(page_content = text, metadata = metadata or {}, id = chunk_id)
+            for chunk_id, text, metadata in zip(page['ids'], page['documents'], page['metadatas'])
+        )
+        print(f"Indexed {offset} chunks", flush=True)
 
-                # don't bother adding empty text to documents
-                if not text:
-                    continue
+    return offset
+
+# -----------------------------------------
+#  Find the Near-Duplicates already Embedded
+# -----------------------------------------
 
-                doc = Document(
-                    # the content to be embedded for the vector db
-                    page_content = text,
-
-                    # the metadata
-                    metadata = {
-                        "start": chunk.get("start", 0.0),
-                        "duration": chunk.get("duration", 0.0),
-                        "channel_id": channel_id,
-                        "video_id": video_id,
-                        "video_index": video_index,
-                        "title": title,
-                        "published_at": published_at,
-                        "view_count": view_count,
-                        "like_count": like_count,
-                        "comment_count": comment_count,
-                        "total_duration": total_duration,
-                        "source_file": js
-                    },
-
-                    # id for transcript chunk
-                    id = f"{js}_{i}"
-                )
-                file_ids.append(f"{js}_{i}")
-                file_docs.append(doc)
-
-            # ----------------------------------------
-            #  Embed and Save Video Ids into Log File
-            # ----------------------------------------
+# indexes the chunks embedded before the near-duplicate check, in store order, and reports what collapsing the
+# near-duplicates among them would have saved (they stay in the store)
+def build_near_duplicate_index(store = None, index = None, page_size = 5000):
+    store = store if store is not None else get_backend()
+    index = index if index is not None else near_duplicate_index
+
+    offset = 0
+    index.reset_stats()
+    while True:
+        page = store.get(include=['metadatas', 'documents'], limit=page_size, offset=offset)
+        if not page['ids']:
+            break
+        offset += len(page['ids'])
+
+        index.check_many([
+            Document(page_content = text, metadata = metadata or {}, id = chunk_id)
+            for chunk_id, text, metadata in zip(page['ids'], page['documents'], page['metadatas'])
+        ])
+        print(f"Checked {offset} chunks", flush=True)
+
+    stats = index.stats()
+    print(f"Near-duplicates already embedded: {stats}", flush=True)
+    return stats
 
-            if not file_docs:
-                print(f"No valid chunks found in {js}, skipping.", flush=True)
-                continue
+# -----------------------------------------
+#  Move the Chunks to the Flat Index
+# -----------------------------------------
 
-            try:
-                print(f" Built {len(file_docs)} docs, starting embed...", flush=True)
-                # embed this file's chunks immediatley - do not batch across files
-                vector_store.add_documents(documents=file_docs, ids=file_ids)
-                print(f"Add documents returned", flush=True)
+# copies the vectors, texts and metadata out of chroma_langchain_db, nothing is embedded again
+def migrate_to_flat_index(source = None, target = None, page_size = 5000):
+    source = source if source is not None else ChromaBackend(get_vector_store())
+    target = target if target is not None else get_flat_index()
+    return migrate(source, target, page_size)
 
-                # update sidecar log
-                already_embedded.add(video_id)
+# recall@k of the flat index against Chroma, and the latency of both, over the given queries
+def compare_backends(queries, k = 15, reference = None, candidate = None):
+    reference = reference if reference is not None else ChromaBackend(get_vector_store())
+    candidate = candidate if candidate is not None else get_flat_index()
 
-                # if this is the first run and the embedded_log_path doesn't exist yet, then it is created here
-                embedded_log_path.write_text(json.dumps(list(already_embedded)))
+    report = compare(reference, candidate, [embed_query(query) for query in queries], k)
+    if isinstance(candidate, FlatIndexBackend):
+        report['quantization'] = candidate.quantization
+        report['footprint'] = candidate.footprint()
+    print(f"Chroma vs flat index: {report}", flush=True)
+    return report
 
-                total_chunks_embedded += len(file_docs)
-                print(f"Embedded {len(file_docs)} chunks", flush=True)
+# -----------------------------------------
+#  Tune the HNSW Settings
+# -----------------------------------------
 
-            except Exception as e:
-                print(f" Failed to embed {js}: {e}", flush=True)
-                continue
+# the settings swept by sweep-hnsw, the space is the configured one since unit-length vectors rank the same in all three
+HNSW_SWEEP_M = (8, 16, 32, 48)
+HNSW_SWEEP_EF_CONSTRUCTION = (100, 200, 400)
+HNSW_SWEEP_EF_SEARCH = (50, 100, 200, 400, 800)
+
+# recall@k and latency of each HNSW setting over the chunks of the transcripts collection, against exact search
+def sweep_hnsw_settings(queries, ks = (15, 40, MMR_FETCH_K), source = None, ms = HNSW_SWEEP_M,
+                        ef_constructions = HNSW_SWEEP_EF_CONSTRUCTION, ef_searches = HNSW_SWEEP_EF_SEARCH):
+    source = source if source is not None else ChromaBackend(get_vector_store())
+    query_vectors = [embed_query(query) for query in queries]
+    return sweep_hnsw(source, query_vectors, ks, (HNSW_SPACE,), ms, ef_constructions, ef_searches,
+                      directory = db_location.parent / 'data')
 
 if __name__ == '__main__':
-    embed_transcripts()
+    # python -m src.llm.vector normalize-metadata, once for chunks embedded before the video store
+    if len(sys.argv) > 1 and sys.argv[1] == 'normalize-metadata':
+        normalize_chunk_metadata()
+    # python -m src.llm.vector build-bm25, once for chunks embedded before the BM25 index
+    elif len(sys.argv) > 1 and sys.argv[1] == 'build-bm25':
+        build_bm25_index()
+    # python -m src.llm.vector find-near-duplicates, once for chunks embedded before the near-duplicate check
+    elif len(sys.argv) > 1 and sys.argv[1] == 'find-near-duplicates':
+        build_near_duplicate_index()
+    # python -m src.llm.vector migrate-flat, then compare-backends to check recall and latency before setting VECTOR_BACKEND=flat
+    elif len(sys.argv) > 1 and sys.argv[1] == 'migrate-flat':
+        migrate_to_flat_index()
+    # python -m src.llm.vector quantize-flat, once after setting FLAT_INDEX_QUANTIZATION on an existing flat index
+    elif len(sys.argv) > 1 and sys.argv[1] == 'quantize-flat':
+        get_flat_index().build_quantized()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'compare-backends':
+        from .rag import SCHEDULED_QUERIES, QUERY_ENRICHMENT
+        for k in (15, 40, MMR_FETCH_K):
+            compare_backends([f"{question} {QUERY_ENRICHMENT[query_type]}" for query_type, question in SCHEDULED_QUERIES.items()], k)
+    # python -m src.llm.vector sweep-hnsw, recall vs latency of HNSW settings over temporary copies of the collection
+    elif len(sys.argv) > 1 and sys.argv[1] == 'sweep-hnsw':
+        from .rag import SCHEDULED_QUERIES, QUERY_ENRICHMENT
+        rows = sweep_hnsw_settings([f"{question} {QUERY_ENRICHMENT[query_type]}" for query_type, question in SCHEDULED_QUERIES.items()])
+        print(json.dumps(rows, indent=2))
+    else:
+        embed_transcripts()
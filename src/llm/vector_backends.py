@@ -0,0 +1,615 @@
+# imports:
+# numpy for the memory-mapped vectors and the exact search, sqlite3 for the sidecar id/metadata table,
+# threading since batches are added from the embedding workers
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+from itertools import product
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .mmr import normalize_rows
+from .quantization import quantize, quantized_dtype, approximate_scores
+
+# ----------------------------------
+#  Index Location
+# ----------------------------------
+
+DEFAULT_FLAT_INDEX_PATH = Path(__file__).parent.parent.parent / 'data' / 'flat_index'
+
+# the vectors file and the sidecar table inside the index directory
+VECTORS_FILE = 'vectors.f32'
+SIDECAR_FILE = 'chunks.sqlite3'
+
+# the quantized copies of the vectors, for the first pass of a quantized search
+QUANTIZED_FILES = {'int8': 'vectors.i8', 'binary': 'vectors.bin'}
+
+# a quantized first pass keeps this many times n_results candidates for the exact float rescoring
+DEFAULT_RESCORE_FACTOR = 4
+
+# rows quantized and scored at once, so a first pass never holds more than a block of rows as floats
+SCORE_BLOCK = 16384
+
+# ----------------------------------
+#  Backend Interface
+# ----------------------------------
+
+class VectorBackend:
+    """
+    What retrieval and the embed stage need from a vector store, results are shaped like Chroma's collection results.
+
+        add_documents(documents)                      embed and store (or replace) langchain Documents with ids
+        query(query_vectors, n_results, where)        {'ids', 'documents', 'metadatas', 'embeddings'}, one list per query
+        get(ids, include, limit, offset, where)       {'ids', 'documents', 'metadatas'(, 'embeddings')}
+        count()
+    """
+
+    def add_documents(self, documents: List[Document]):
+        raise NotImplementedError
+
+    def query(self, query_vectors, n_results: int, where: Optional[dict] = None) -> dict:
+        raise NotImplementedError
+
+    def get(self, ids: Optional[List[str]] = None, include=('metadatas', 'documents'), limit: Optional[int] = None,
+            offset: Optional[int] = None, where: Optional[dict] = None) -> dict:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+class ChromaBackend(VectorBackend):
+    """
+    The langchain Chroma vector store (HNSW index in the chroma_langchain_db persist directory).
+    """
+
+    # a bare chromadb collection is enough to query and get (nothing is embedded), the store is then None
+    def __init__(self, store, collection = None):
+        self.store = store
+        self.collection = collection if collection is not None else store._collection
+
+    def add_documents(self, documents):
+        self.store.add_documents(documents=documents, ids=[doc.id for doc in documents])
+
+    def query(self, query_vectors, n_results, where = None):
+        return self.collection.query(
+            query_embeddings = query_vectors,
+            n_results = n_results,
+            where = where,
+            include = ["metadatas", "documents", "embeddings"]
+        )
+
+    def get(self, ids = None, include = ('metadatas', 'documents'), limit = None, offset = None, where = None):
+        return self.collection.get(ids = ids, include = list(include), limit = limit, offset = offset, where = where)
+
+    def count(self):
+        return self.collection.count()
+
+# ----------------------------------
+#  HNSW Settings of a Chroma Collection
+# ----------------------------------
+
+# the distance functions chroma's HNSW index supports, for unit-length vectors they all rank the same
+HNSW_SPACES = ('l2', 'cosine', 'ip')
+
+# chroma's own defaults, what a collection created without settings uses
+DEFAULT_HNSW_SPACE = 'l2'
+DEFAULT_HNSW_M = 16
+DEFAULT_HNSW_EF_CONSTRUCTION = 100
+DEFAULT_HNSW_EF_SEARCH = 100
+
+def hnsw_metadata(space: str = DEFAULT_HNSW_SPACE, m: int = DEFAULT_HNSW_M, ef_construction: int = DEFAULT_HNSW_EF_CONSTRUCTION,
+                  ef_search: int = DEFAULT_HNSW_EF_SEARCH) -> dict:
+    """
+    The collection metadata that creates a Chroma collection with these HNSW settings.
+
+    Space, M and ef_construction shape the graph, so they only apply when the collection is created.
+    ef_search (the candidate list size of a search) can be changed later, see set_ef_search().
+    """
+    if space not in HNSW_SPACES:
+        raise ValueError(f"Unknown HNSW space {space!r}, expected one of {HNSW_SPACES}")
+    return {'hnsw:space': space, 'hnsw:M': int(m), 'hnsw:construction_ef': int(ef_construction), 'hnsw:search_ef': int(ef_search)}
+
+# the HNSW settings a collection was actually created with (space, M, ef_construction, ef_search)
+def hnsw_settings(collection) -> dict:
+    hnsw = (collection.configuration_json or {}).get('hnsw') or {}
+    return {
+        'space': hnsw.get('space', DEFAULT_HNSW_SPACE),
+        'm': hnsw.get('max_neighbors', DEFAULT_HNSW_M),
+        'ef_construction': hnsw.get('ef_construction', DEFAULT_HNSW_EF_CONSTRUCTION),
+        'ef_search': hnsw.get('ef_search', DEFAULT_HNSW_EF_SEARCH)
+    }
+
+# an existing collection keeps its ef_search, so a new value is applied with modify()
+def set_ef_search(collection, ef_search: int):
+    if hnsw_settings(collection)['ef_search'] != ef_search:
+        collection.modify(configuration={'hnsw': {'ef_search': int(ef_search)}})
+
+# ----------------------------------
+#  Metadata Filters as SQL
+# ----------------------------------
+
+OPERATORS = {'$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<=', '$eq': '=', '$ne': '!='}
+
+# a Chroma where clause ($and/$or, comparisons, $in/$nin) as a condition on the sidecar's json metadata
+def where_to_sql(where: dict):
+    if len(where) != 1:
+        return where_to_sql({'$and': [{key: value} for key, value in where.items()]})
+
+    (key, condition), = where.items()
+    if key in ('$and', '$or'):
+        parts = [where_to_sql(clause) for clause in condition]
+        sql = f" {key[1:].upper()} ".join(f"({part_sql})" for part_sql, _ in parts)
+        return sql, [parameter for _, part_parameters in parts for parameter in part_parameters]
+
+    column = f"json_extract(metadata, '$.\"{key}\"')"
+    if not isinstance(condition, dict):
+        condition = {'$eq': condition}
+
+    (operator, value), = condition.items()
+    if operator in ('$in', '$nin'):
+        # one json parameter, so the list can be longer than sqlite's parameter limit
+        return f"{column} {'NOT IN' if operator == '$nin' else 'IN'} (SELECT value FROM json_each(?))", [json.dumps(list(value))]
+    if operator not in OPERATORS:
+        raise ValueError(f"Unsupported where operator {operator}")
+    return f"{column} {OPERATORS[operator]} ?", [value]
+
+# ----------------------------------
+#  Flat Index, Memory-Mapped
+# ----------------------------------
+
+# the positions of the k best scores of each column (query), best first
+def top_k(scores: np.ndarray, k: int) -> List[np.ndarray]:
+    if k <= 0:
+        return [np.zeros(0, dtype=np.int64) for _ in range(scores.shape[1])]
+
+    top = []
+    for column in range(scores.shape[1]):
+        best = np.argpartition(-scores[:, column], k - 1)[:k]
+        top.append(best[np.argsort(-scores[best, column], kind='stable')])
+    return top
+
+class FlatIndexBackend(VectorBackend):
+    """
+    Exact (brute force) cosine search over unit-length float32 vectors in a memory-mapped file, row i of the
+    file belongs to row i of a sidecar SQLite table of chunk ids, texts and metadata.
+
+    The file is mapped read-only, so every API/worker process searching the same index shares one copy through
+    the page cache instead of loading its own. Vectors are appended (and fsynced) before their sidecar rows are
+    committed, so readers only ever see complete rows. There is a single writer at a time (the embed stage).
+
+    With quantization ('int8' or 'binary') the first pass scans a quantized copy of the vectors (4x or 32x smaller)
+    and only the rescore_factor * n_results best candidates are read from the float file and scored exactly.
+    The quantized copies are written by the writer: add() keeps the configured one (and any other already built)
+    up to date, and build_quantized() writes one for an existing index. Searches only map them read-only, rows
+    past the end of a quantized copy are rescored with the float vectors directly.
+    """
+
+    def __init__(self, path=DEFAULT_FLAT_INDEX_PATH, embeddings=None, quantization: Optional[str] = None,
+                 rescore_factor: int = DEFAULT_RESCORE_FACTOR):
+        self.path = Path(path)
+        self.embeddings = embeddings
+        self.quantization = quantization or None
+        self.rescore_factor = rescore_factor
+        self._lock = threading.Lock()
+        self._conn = None
+
+        # the mapped vectors and the number of rows they were mapped with
+        self._vectors = None
+        self._mapped_rows = 0
+
+        # the same for the quantized copy
+        self._quantized = None
+        self._quantized_rows = 0
+        self._warned_behind = False
+
+    # the sidecar is only opened on first use
+    def _connect(self):
+        if self._conn is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path / SIDECAR_FILE), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    row INTEGER PRIMARY KEY,
+                    chunk_id TEXT UNIQUE NOT NULL,
+                    document TEXT,
+                    metadata TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.commit()
+        return self._conn
+
+    def _dim(self) -> Optional[int]:
+        row = self._conn.execute("SELECT value FROM settings WHERE key = 'dim'").fetchone()
+        return int(row[0]) if row is not None else None
+
+    # remapped whenever another process (or add) committed more rows
+    def _matrix(self) -> np.ndarray:
+        rows = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        if rows == 0:
+            return np.zeros((0, self._dim() or 0), dtype=np.float32)
+
+        if self._vectors is None or rows != self._mapped_rows:
+            self._vectors = np.memmap(self.path / VECTORS_FILE, dtype=np.float32, mode='r', shape=(rows, self._dim()))
+            self._mapped_rows = rows
+        return self._vectors
+
+    # the quantized rows written so far (at most the committed ones), mapped read-only
+    def _quantized_matrix(self, rows: int) -> np.ndarray:
+        dtype = quantized_dtype(self.quantization, self._dim() or 0)
+        path = self.path / QUANTIZED_FILES[self.quantization]
+
+        stored = min(path.stat().st_size // dtype.itemsize if path.exists() else 0, rows)
+        if stored == 0:
+            return np.zeros(0, dtype=dtype)
+        if self._quantized is None or self._quantized_rows != stored:
+            self._quantized = np.memmap(path, dtype=dtype, mode='r', shape=(stored,))
+            self._quantized_rows = stored
+        return self._quantized
+
+    # -------------------------------
+    #  Write
+    # -------------------------------
+
+    def add(self, ids: List[str], embeddings, documents: List[str], metadatas: List[dict]):
+        """
+        Store the given vectors with their chunk ids, texts and metadata, replacing the rows of ids already stored.
+        """
+        # the last one wins for an id given more than once
+        latest = {chunk_id: position for position, chunk_id in enumerate(ids)}
+        positions = list(latest.values())
+        if not positions:
+            return
+
+        vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32)[positions])
+
+        with self._lock:
+            conn = self._connect()
+            dim = self._dim()
+            if dim is None:
+                conn.execute("INSERT INTO settings VALUES ('dim', ?)", (str(vectors.shape[1]),))
+            elif dim != vectors.shape[1]:
+                raise ValueError(f"The flat index holds {dim} dimension vectors, got {vectors.shape[1]}")
+
+            existing = {}
+            chunk_ids = list(latest)
+            for start in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[start:start + 500]
+                existing.update(conn.execute(
+                    f"SELECT chunk_id, row FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                ))
+
+            # new chunks get the rows after the committed ones, in order
+            committed_rows = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            rows, appended = [], []
+            for chunk_id, vector in zip(chunk_ids, vectors):
+                if chunk_id in existing:
+                    rows.append(existing[chunk_id])
+                else:
+                    rows.append(committed_rows + len(appended))
+                    appended.append(vector)
+
+            # replaced rows are rewritten in place, and new rows written after the committed ones
+            # (over any partial rows an interrupted add left past them)
+            row_bytes = vectors.shape[1] * 4
+            vectors_path = self.path / VECTORS_FILE
+            with open(vectors_path, 'r+b' if vectors_path.exists() else 'wb') as file:
+                for row, chunk_id, vector in zip(rows, chunk_ids, vectors):
+                    if chunk_id in existing:
+                        file.seek(row * row_bytes)
+                        file.write(vector.tobytes())
+                file.seek(committed_rows * row_bytes)
+                file.write(b''.join(vector.tobytes() for vector in appended))
+                file.truncate()
+                file.flush()
+                os.fsync(file.fileno())
+
+            # the configured quantized copy, and any other already built, get the same rows
+            for kind, name in QUANTIZED_FILES.items():
+                if kind == self.quantization or (self.path / name).exists():
+                    self._write_quantized(kind, committed_rows, rows, vectors)
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)",
+                [(row, chunk_id, documents[position], json.dumps(metadatas[position] or {}))
+                 for row, chunk_id, position in zip(rows, chunk_ids, positions)]
+            )
+            conn.commit()
+
+    # brings a quantized copy up to the committed rows from the float file, then writes the given rows
+    # (replaced ones in place, new ones after the committed ones), the same way add writes the float rows
+    def _write_quantized(self, kind: str, committed_rows: int, rows=(), vectors=None):
+        dim = self._dim()
+        dtype = quantized_dtype(kind, dim)
+        path = self.path / QUANTIZED_FILES[kind]
+
+        stored = min(path.stat().st_size // dtype.itemsize if path.exists() else 0, committed_rows)
+        with open(path, 'r+b' if path.exists() else 'wb') as file:
+            if stored < committed_rows:
+                floats = np.memmap(self.path / VECTORS_FILE, dtype=np.float32, mode='r', shape=(committed_rows, dim))
+                file.seek(stored * dtype.itemsize)
+                for start in range(stored, committed_rows, SCORE_BLOCK):
+                    file.write(quantize(kind, floats[start:start + SCORE_BLOCK]).tobytes())
+
+            end = committed_rows
+            if vectors is not None:
+                quantized = quantize(kind, vectors)
+                for position, row in enumerate(rows):
+                    file.seek(row * dtype.itemsize)
+                    file.write(quantized[position:position + 1].tobytes())
+                    end = max(end, row + 1)
+            file.truncate(end * dtype.itemsize)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def build_quantized(self, kind: Optional[str] = None):
+        """
+        Write the quantized copy (the configured one by default) of every stored row, for an index filled
+        before the quantization was set. add() keeps it up to date from then on.
+        """
+        kind = kind or self.quantization
+        # raises for an unknown (or no) quantization
+        quantized_dtype(kind, 0)
+        with self._lock:
+            conn = self._connect()
+            if self._dim() is None:
+                return
+            (self.path / QUANTIZED_FILES[kind]).unlink(missing_ok=True)
+            self._write_quantized(kind, conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0])
+
+    def add_documents(self, documents):
+        vectors = self.embeddings.embed_documents([doc.page_content for doc in documents])
+        self.add([doc.id for doc in documents], vectors, [doc.page_content for doc in documents], [doc.metadata for doc in documents])
+
+    # -------------------------------
+    #  Read
+    # -------------------------------
+
+    def _filtered_rows(self, where) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        sql, parameters = where_to_sql(where)
+        return np.asarray([row for row, in self._conn.execute(f"SELECT row FROM chunks WHERE {sql} ORDER BY row", parameters)], dtype=np.int64)
+
+    def _rows_to_chunks(self, rows) -> Dict[int, tuple]:
+        chunks = {}
+        rows = [int(row) for row in rows]
+        for start in range(0, len(rows), 500):
+            batch = rows[start:start + 500]
+            for row, chunk_id, document, metadata in self._conn.execute(
+                f"SELECT row, chunk_id, document, metadata FROM chunks WHERE row IN ({','.join('?' * len(batch))})", batch
+            ):
+                chunks[row] = (chunk_id, document, json.loads(metadata))
+        return chunks
+
+    def query(self, query_vectors, n_results, where = None):
+        queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32))
+
+        with self._lock:
+            self._connect()
+            matrix = self._matrix()
+            rows = self._filtered_rows(where)
+
+            n_results = min(n_results, len(matrix) if rows is None else len(rows))
+            if self.quantization and n_results:
+                top = self._quantized_search(matrix, rows, queries, n_results)
+            else:
+                top = top_k(self._exact_scores(matrix, rows, queries), n_results)
+                if rows is not None:
+                    top = [rows[best] for best in top]
+
+            chunks = self._rows_to_chunks(np.unique(np.concatenate(top)) if top else [])
+            results = {'ids': [], 'documents': [], 'metadatas': [], 'embeddings': []}
+            for best_rows in top:
+                results['ids'].append([chunks[int(row)][0] for row in best_rows])
+                results['documents'].append([chunks[int(row)][1] for row in best_rows])
+                results['metadatas'].append([chunks[int(row)][2] for row in best_rows])
+                results['embeddings'].append(np.asarray(matrix[best_rows]))
+        return results
+
+    # every candidate scored against every query: unfiltered straight from the mapped file, filtered rows a block at
+    # a time, so only a block of them is ever copied out of the mapping
+    def _exact_scores(self, matrix, rows, queries) -> np.ndarray:
+        if len(matrix) == 0:
+            return np.zeros((0, len(queries)), dtype=np.float32)
+        if rows is None:
+            return np.asarray(matrix @ queries.T)
+
+        scores = np.empty((len(rows), len(queries)), dtype=np.float32)
+        for start in range(0, len(rows), SCORE_BLOCK):
+            scores[start:start + SCORE_BLOCK] = matrix[rows[start:start + SCORE_BLOCK]] @ queries.T
+        return scores
+
+    # first pass over the quantized rows a block at a time, then the shortlist of each query rescored with the float vectors
+    def _quantized_search(self, matrix, rows, queries, n_results):
+        quantized = self._quantized_matrix(len(matrix))
+
+        # the rows (all or the filtered ones, in order) that have a quantized copy, and the ones past its end
+        if rows is None:
+            covered, missing = None, np.arange(len(quantized), len(matrix))
+        else:
+            split = int(np.searchsorted(rows, len(quantized)))
+            covered, missing = rows[:split], rows[split:]
+        covered_count = len(quantized) if covered is None else len(covered)
+
+        if len(missing) and not self._warned_behind:
+            print(f"The {self.quantization} copy of the flat index is {len(matrix) - len(quantized)} rows behind, they are "
+                  f"scored exactly until `python -m src.llm.vector quantize-flat` is run", flush=True)
+            self._warned_behind = True
+
+        # unfiltered blocks are slices of the mapped rows, filtered ones only gather a block at a time
+        approximate = np.zeros((0, len(queries)), dtype=np.float32)
+        if covered_count:
+            approximate = np.concatenate([
+                approximate_scores(
+                    self.quantization,
+                    quantized[start:start + SCORE_BLOCK] if covered is None else quantized[covered[start:start + SCORE_BLOCK]],
+                    queries
+                )
+                for start in range(0, covered_count, SCORE_BLOCK)
+            ])
+
+        top = []
+        for query, shortlist in enumerate(top_k(approximate, min(covered_count, n_results * self.rescore_factor))):
+            shortlist_rows = np.sort(np.concatenate([shortlist if covered is None else covered[shortlist], missing]))
+            exact = matrix[shortlist_rows] @ queries[query]
+            top.append(shortlist_rows[top_k(exact[:, None], n_results)[0]])
+        return top
+
+    # the approximate and exact bytes a search reads per chunk, for the footprint report
+    def footprint(self) -> dict:
+        with self._lock:
+            rows = self._connect().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            dim = self._dim() or 0
+        footprint = {'rows': rows, 'float32_bytes': rows * dim * 4}
+        for kind in QUANTIZED_FILES:
+            footprint[f'{kind}_bytes'] = rows * quantized_dtype(kind, dim).itemsize
+        return footprint
+
+    def get(self, ids = None, include = ('metadatas', 'documents'), limit = None, offset = None, where = None):
+        clauses, parameters = [], []
+        if ids is not None:
+            clauses.append("chunk_id IN (SELECT value FROM json_each(?))")
+            parameters.append(json.dumps(list(ids)))
+        if where:
+            sql, where_parameters = where_to_sql(where)
+            clauses.append(f"({sql})")
+            parameters.extend(where_parameters)
+
+        sql = "SELECT row, chunk_id, document, metadata FROM chunks"
+        if clauses:
+            sql += f" WHERE {' AND '.join(clauses)}"
+        sql += " ORDER BY row"
+        if limit is not None or offset is not None:
+            sql += " LIMIT ? OFFSET ?"
+            parameters.extend([limit if limit is not None else -1, offset or 0])
+
+        with self._lock:
+            found = self._connect().execute(sql, parameters).fetchall()
+            results = {
+                'ids': [chunk_id for _, chunk_id, _, _ in found],
+                'documents': [document for _, _, document, _ in found],
+                'metadatas': [json.loads(metadata) for _, _, _, metadata in found]
+            }
+            if 'embeddings' in include:
+                results['embeddings'] = np.asarray(self._matrix()[[row for row, _, _, _ in found]])
+        return results
+
+    def count(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._vectors = None
+            self._mapped_rows = 0
+            self._quantized = None
+            self._quantized_rows = 0
+
+# ----------------------------------
+#  Migration and Comparison
+# ----------------------------------
+
+def migrate(source: VectorBackend, target: FlatIndexBackend, page_size: int = 5000) -> int:
+    """
+    Copy every chunk (vector, text and metadata) of the source backend into the flat index, without re-embedding.
+    """
+    offset = 0
+    while True:
+        page = source.get(include=['metadatas', 'documents', 'embeddings'], limit=page_size, offset=offset)
+        if not page['ids']:
+            break
+        offset += len(page['ids'])
+
+        target.add(page['ids'], page['embeddings'], page['documents'], page['metadatas'])
+        print(f"Migrated {offset} chunks", flush=True)
+    return offset
+
+def compare(reference: VectorBackend, candidate: VectorBackend, query_vectors, k: int = 15, repeat: int = 3) -> dict:
+    """
+    Recall@k of the candidate backend against the reference backend's results, and the query latency of both.
+    """
+    def timed(backend):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            results = backend.query(query_vectors, k)
+        return results, (time.perf_counter() - start) / repeat * 1e3
+
+    reference_results, reference_ms = timed(reference)
+    candidate_results, candidate_ms = timed(candidate)
+
+    recalls = [
+        len(set(expected) & set(found)) / len(expected) if expected else 1.0
+        for expected, found in zip(reference_results['ids'], candidate_results['ids'])
+    ]
+    return {
+        'queries': len(query_vectors),
+        'k': k,
+        f'recall_at_{k}': round(float(np.mean(recalls)), 4) if recalls else 1.0,
+        'reference_ms': round(reference_ms, 2),
+        'candidate_ms': round(candidate_ms, 2)
+    }
+
+def sweep_hnsw(source: VectorBackend, query_vectors, ks=(15, 40, 300), spaces=(DEFAULT_HNSW_SPACE,), ms=(DEFAULT_HNSW_M,),
+               ef_constructions=(DEFAULT_HNSW_EF_CONSTRUCTION,), ef_searches=(DEFAULT_HNSW_EF_SEARCH,), directory=None,
+               page_size: int = 5000) -> List[dict]:
+    """
+    Recall@k and latency of Chroma HNSW indexes over the source's vectors, for every combination of the given
+    settings, against an exact (brute force) search of the same vectors.
+
+    The vectors are copied once into a temporary flat index (the exact reference), then into one temporary
+    collection per (space, M, ef_construction), which is queried at every ef_search. The source is only read,
+    but chroma's clients in this process are reset (see below), so a source Chroma store is not usable after.
+    """
+    import chromadb
+    from chromadb.api.client import SharedSystemClient
+
+    if directory is not None:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=directory) as workdir:
+        exact = FlatIndexBackend(Path(workdir) / 'exact')
+        chunks = migrate(source, exact, page_size)
+        hnsw_path = str(Path(workdir) / 'hnsw')
+        client = chromadb.PersistentClient(path=hnsw_path)
+
+        rows = []
+        for space, m, ef_construction in product(spaces, ms, ef_constructions):
+            start = time.perf_counter()
+            collection = client.create_collection('sweep', metadata=hnsw_metadata(space, m, ef_construction))
+            for offset in range(0, chunks, page_size):
+                page = exact.get(include=['embeddings'], limit=page_size, offset=offset)
+                collection.add(ids=page['ids'], embeddings=page['embeddings'])
+            build_s = time.perf_counter() - start
+
+            for ef_search in ef_searches:
+                # a loaded index keeps the ef_search it was loaded with, so the collection is reopened by a new client
+                set_ef_search(collection, ef_search)
+                SharedSystemClient.clear_system_cache()
+                client = chromadb.PersistentClient(path=hnsw_path)
+                collection = client.get_collection('sweep')
+                candidate = ChromaBackend(None, collection)
+                for k in ks:
+                    report = compare(exact, candidate, query_vectors, min(k, chunks))
+                    rows.append({
+                        'space': space, 'm': m, 'ef_construction': ef_construction, 'ef_search': ef_search, 'k': k,
+                        'recall': report[f"recall_at_{min(k, chunks)}"], 'hnsw_ms': report['candidate_ms'],
+                        'exact_ms': report['reference_ms'], 'build_s': round(build_s, 2)
+                    })
+                    print(f"{space:>6} M={m:<3} ef_construction={ef_construction:<4} ef_search={ef_search:<4} k={k:<4} "
+                          f"recall {rows[-1]['recall']:.3f}  {rows[-1]['hnsw_ms']:8.1f} ms  (exact {rows[-1]['exact_ms']:.1f} ms, "
+                          f"build {build_s:.1f}s)", flush=True)
+
+            client.delete_collection('sweep')
+        exact.close()
+        SharedSystemClient.clear_system_cache()
+    return rows
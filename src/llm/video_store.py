@@ -0,0 +1,213 @@
+# imports:
+# sqlite3 for the keyed store of video level fields, threading since batches are embedded concurrently
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# ----------------------------------
+#  Store Location and Fields
+# ----------------------------------
+
+DEFAULT_STORE_PATH = Path(__file__).parent.parent.parent / 'data' / 'videos.sqlite3'
+
+# the video level fields, kept once per video instead of on every chunk
+VIDEO_FIELDS = [
+    'channel_id', 'video_index', 'title', 'published_at', 'view_count', 'like_count', 'comment_count', 'total_duration', 'source_file'
+]
+
+# the fields each chunk keeps in the vector store (embedded_at is what incremental runs filter on)
+CHUNK_FIELDS = ['video_id', 'start', 'duration', 'embedded_at']
+
+# sqlite's default limit on the number of ? parameters is 999 on older builds
+LOOKUP_BATCH = 500
+
+# ----------------------------------
+#  Range-Comparable Publish Times
+# ----------------------------------
+
+# unix time of a datetime, an ISO 8601 string (YouTube's publishedAt) or a number, None if it can't be read
+def to_timestamp(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        # naive datetimes are taken as UTC, like YouTube's timestamps
+        return (value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)).timestamp()
+    return None
+
+# ----------------------------------
+#  Keyed Store of the Videos
+# ----------------------------------
+
+class VideoStore:
+    """
+    SQLite table of the video level fields (title, counts, duration, ...) keyed by video id.
+
+    Chunks in the vector store only carry their video id, start and duration, and join()
+    adds the video fields back onto retrieved chunks at read time. The table doubles as the
+    side index retrieval filters on (publish time, channel, views), see video_ids_matching().
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    # the database is only opened on first use
+    def _connect(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS videos (
+                    video_id TEXT PRIMARY KEY,
+                    {', '.join(VIDEO_FIELDS)},
+                    published_ts REAL
+                )
+            """)
+            self._add_published_ts()
+            self._conn.execute("CREATE INDEX IF NOT EXISTS videos_published_ts ON videos (published_ts)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS videos_channel_id ON videos (channel_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS videos_view_count ON videos (view_count)")
+            self._conn.commit()
+        return self._conn
+
+    # stores created before the filters get the numeric publish time column, filled from published_at
+    def _add_published_ts(self):
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(videos)")]
+        if 'published_ts' in columns:
+            return
+
+        self._conn.execute("ALTER TABLE videos ADD COLUMN published_ts REAL")
+        self._conn.executemany(
+            "UPDATE videos SET published_ts = ? WHERE video_id = ?",
+            [(to_timestamp(published_at), video_id) for video_id, published_at in self._conn.execute("SELECT video_id, published_at FROM videos")]
+        )
+
+    # -------------------------------
+    #  Write
+    # -------------------------------
+
+    def upsert_many(self, videos: Dict[str, dict]):
+        """
+        Insert or replace the given videos (video id -> video fields).
+        """
+        if not videos:
+            return
+
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                f"INSERT OR REPLACE INTO videos VALUES ({', '.join('?' * (len(VIDEO_FIELDS) + 2))})",
+                [
+                    (video_id, *(fields.get(field) for field in VIDEO_FIELDS), to_timestamp(fields.get('published_at')))
+                    for video_id, fields in videos.items()
+                ]
+            )
+            conn.commit()
+
+    def update_fields(self, updates: Dict[str, dict]) -> int:
+        """
+        Update some fields (e.g. the counts) of existing videos, returns the number of videos changed.
+        """
+        changed = 0
+        with self._lock:
+            conn = self._connect()
+            for video_id, fields in updates.items():
+                fields = {field: value for field, value in fields.items() if field in VIDEO_FIELDS}
+                if not fields:
+                    continue
+                if 'published_at' in fields:
+                    fields['published_ts'] = to_timestamp(fields['published_at'])
+                cursor = conn.execute(
+                    f"UPDATE videos SET {', '.join(f'{field} = ?' for field in fields)} WHERE video_id = ?",
+                    (*fields.values(), video_id)
+                )
+                changed += cursor.rowcount
+            conn.commit()
+        return changed
+
+    # -------------------------------
+    #  Read
+    # -------------------------------
+
+    def get_many(self, video_ids: Iterable[str]) -> Dict[str, dict]:
+        unique_ids = list(dict.fromkeys(video_ids))
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            for start in range(0, len(unique_ids), LOOKUP_BATCH):
+                batch = unique_ids[start:start + LOOKUP_BATCH]
+                rows = conn.execute(
+                    f"SELECT video_id, {', '.join(VIDEO_FIELDS)} FROM videos WHERE video_id IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+                for row in rows:
+                    found[row[0]] = {field: value for field, value in zip(VIDEO_FIELDS, row[1:]) if value is not None}
+        return found
+
+    def video_ids_matching(self, published_after=None, published_before=None, channel_ids: Optional[Iterable[str]] = None,
+                           min_view_count: Optional[int] = None) -> List[str]:
+        """
+        The ids of the videos published in the window (datetimes, ISO strings or unix times), on the given channels
+        and with at least min_view_count views. Videos without a publish time never match a publish window.
+        """
+        clauses, parameters = [], []
+        if published_after is not None:
+            clauses.append("published_ts >= ?")
+            parameters.append(to_timestamp(published_after))
+        if published_before is not None:
+            clauses.append("published_ts < ?")
+            parameters.append(to_timestamp(published_before))
+        if channel_ids is not None:
+            channel_ids = list(channel_ids)
+            clauses.append(f"channel_id IN ({','.join('?' * len(channel_ids))})")
+            parameters.extend(channel_ids)
+        if min_view_count is not None:
+            clauses.append("view_count >= ?")
+            parameters.append(min_view_count)
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._connect().execute(f"SELECT video_id FROM videos{where} ORDER BY video_id", parameters).fetchall()
+        return [row[0] for row in rows]
+
+    def join(self, documents: List) -> List:
+        """
+        Add the video fields onto the metadata of each document (in place).
+
+        The store's fields win over copies still on the chunk (chunks embedded before the split), since it holds the refreshed counts.
+        """
+        videos = self.get_many(doc.metadata.get('video_id') for doc in documents if doc.metadata.get('video_id'))
+        for doc in documents:
+            video = videos.get(doc.metadata.get('video_id'))
+            if video is not None:
+                doc.metadata = {**doc.metadata, **video}
+        return documents
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# ----------------------------------
+#  Split a Full Chunk Metadata
+# ----------------------------------
+
+def split_metadata(metadata: dict):
+    """
+    Split a chunk's full metadata into the fields the chunk keeps and the video level fields.
+    """
+    chunk = {field: metadata[field] for field in CHUNK_FIELDS if field in metadata}
+    video = {field: metadata[field] for field in VIDEO_FIELDS if field in metadata}
+    return chunk, video
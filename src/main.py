@@ -3,23 +3,26 @@ import os
 import datetime
 import subprocess
 from typing import Optional
+from functools import lru_cache
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from apscheduler.schedulers.background import BackgroundScheduler
 
 from pymongo import MongoClient
 
-# import scheduled RAG query runner
-from .llm.rag import run_scheduled_queries
+# NOTE: the RAG query runner (Groq, the embeddings, Chroma) and the metrics refresh (the YouTube API client) are
+# imported inside the scheduled jobs, so the API starts without loading them and serves results while Ollama or Chroma are down
 
 # ----------------------------------
 #  Setup MongoDB
 # ----------------------------------
 
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017')
-mongo_client = MongoClient(MONGO_URI)
-db = mongo_client['youtube_intelligence']
-results_collection = db['results']
+
+# the client is only created on the first request
+@lru_cache(maxsize=1)
+def get_results_collection():
+    return MongoClient(MONGO_URI)['youtube_intelligence']['results']
 
 # ----------------------------------
 #  Cron Job Scheduler
@@ -37,6 +40,9 @@ def run_script(script_name):
 
 # the function that defines the scripts that will be run once a week
 def scheduled_job_sequence():
+    # import scheduled RAG query runner
+    from .llm.rag import run_scheduled_queries
+
     try:
         # ------------------------------
         #  Give Module Path of Scripts
@@ -57,10 +63,18 @@ def scheduled_job_sequence():
         # then run the vector.py and rag.py (run_scheduled_queries())
         run_script('llm.vector')
 
-        run_scheduled_queries(k_c = 40, k_t = 5, k_n = 5)
+        # only the videos embedded since last week are analysed, and merged into last week's results
+        run_scheduled_queries(k_c = 40, k_t = 5, k_n = 5, async_mode = True, incremental = True)
     except Exception as e:
         print(f"Transcript retrieval scripts failed to run: {e}")
 
+# refresh the view/like/comment counts of the embedded videos
+def refresh_metrics_job():
+    # import the daily refresh of the video metrics in the video store
+    from .services.refresh_video_metrics import refresh_video_metrics
+
+    refresh_video_metrics()
+
 # create the scheduler to run in an interval of a week
 @asynccontextmanager
 async def weeklylifespan(app: FastAPI):
@@ -76,11 +90,24 @@ async def weeklylifespan(app: FastAPI):
             timezone='US/Central', # run on UTC timezone (would run 6pm in CST), or run in central time (so 6am UTC)
             next_run_time=datetime.datetime.now() # run once on startup, then follow the cron job schedule
     )
+
+    # refresh the view/like/comment counts of the embedded chunks every day, only metadata is updated so it's cheap
+    scheduler.add_job(
+            refresh_metrics_job,
+            trigger="cron",
+            hour=3,
+            minute=0,
+            timezone='US/Central'
+    )
     scheduler.start()
 
     yield
     scheduler.shutdown()
 
+    # close the Groq http client once the scheduled jobs are stopped (rag is already loaded if a job ever ran)
+    from .llm.rag import close_http_client
+    close_http_client()
+
 app = FastAPI(lifespan=weeklylifespan)
 
 # ----------------------
@@ -100,7 +127,7 @@ def get_results(query_type: Optional[str] = None, limit: int = 5):
         query_filter['query_type'] = query_type
 
     results = list(
-        results_collection
+        get_results_collection()
         .find(query_filter, {'_id': 0})  # exclude MongoDB's _id field
         .sort('run_date', -1)            # most recent first
         .limit(limit)
@@ -112,7 +139,7 @@ def get_results(query_type: Optional[str] = None, limit: int = 5):
 @app.get("/claims")
 def get_claims(limit: int = 20):
     results = list(
-        results_collection
+        get_results_collection()
         .find({'query_type': 'claims'}, {'_id': 0})
         .sort('run_date', -1)
         .limit(limit)
@@ -124,7 +151,7 @@ def get_claims(limit: int = 20):
 @app.get("/trends")
 def get_trends(limit: int = 7):
     results = list(
-        results_collection
+        get_results_collection()
         .find({'query_type': 'trends'}, {'_id': 0})
         .sort('run_date', -1)
         .limit(limit)
@@ -136,7 +163,7 @@ def get_trends(limit: int = 7):
 @app.get("/narratives")
 def get_narratives(limit: int = 3):
     results = list(
-        results_collection
+        get_results_collection()
         .find({'query_type': 'narratives'}, {'_id': 0})
         .sort('run_date', -1)
         .limit(limit)
@@ -148,7 +175,7 @@ def get_narratives(limit: int = 3):
 @app.get("/risk_factors")
 def get_risk_factors(limit: int = 5):
     results = list(
-        results_collection
+        get_results_collection()
         .find({'query_type': 'risk_factors'}, {'_id': 0})
         .sort('run_date', -1)
         .limit(limit)
@@ -5,6 +5,9 @@ import json
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor
 
+# the manifest of chunked files, so the embed stage doesn't have to parse every file to find new ones
+from .transcript_manifest import manifest
+
 # define the path to the folder with the transcripts
 folder_path = Path(__file__).parent.parent.parent / 'data' / 'transcripts'
 
@@ -47,8 +50,12 @@ def read_and_chunk_transcript(filepath, video_metrics, max_chunk_count=500, over
 
         # then write the new transcript back
         try:
-            with open(filepath, 'w') as json_file:
-                json.dump(larger_chunks, json_file, indent=4)
+            content = json.dumps(larger_chunks, indent=4).encode('utf-8')
+            with open(filepath, 'wb') as json_file:
+                json_file.write(content)
+
+            # record the file in the manifest with its video id, chunk count and content hash
+            manifest.record(filepath, larger_chunks, content)
 
             return f"Successfully wrote to .json the larger chunks"
 
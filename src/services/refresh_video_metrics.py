@@ -0,0 +1,79 @@
+# imports:
+# os for the YouTube API key, the Google API client to get the fresh statistics
+# the video store whose counts are refreshed, and the journal of embedded videos
+import os
+
+from googleapiclient.errors import HttpError
+
+from ..llm.vector import video_store
+from ..llm.embedding_journal import EmbeddingJournal
+
+# ---------------------------------------
+#  Settings
+# ---------------------------------------
+
+# videos.list takes at most 50 ids per call (1 quota unit each)
+VIDEOS_PER_REQUEST = 50
+
+# the engagement fields in the video store and their videos.list statistics names
+STATISTICS_FIELDS = {
+    'view_count': 'viewCount',
+    'like_count': 'likeCount',
+    'comment_count': 'commentCount',
+}
+
+# ---------------------------------------
+#  Get the Fresh Statistics, 50 at a Time
+# ---------------------------------------
+
+def fetch_statistics(videos, video_ids):
+    statistics = {}
+    for i in range(0, len(video_ids), VIDEOS_PER_REQUEST):
+        try:
+            response = videos.list(part='statistics', id=video_ids[i:i + VIDEOS_PER_REQUEST]).execute()
+        except HttpError as e:
+            print(f'Error response status code : {e.status_code}, reason : {e.error_details}')
+            continue
+
+        for item in response.get('items', []):
+            statistics[item['id']] = {
+                field: int(item['statistics'].get(name, 0))
+                for field, name in STATISTICS_FIELDS.items()
+            }
+    return statistics
+
+# ---------------------------------------
+#  Refresh the Counts in the Video Store
+# ---------------------------------------
+
+def refresh_video_metrics(videos = None, store = video_store, video_ids = None):
+    """
+    Refresh the view/like/comment counts of every embedded video.
+
+    The counts live once per video in the video store (joined onto chunks at retrieval), so only those rows are
+    updated and the vector store is never touched. The run costs one videos.list call per 50 videos.
+    """
+    own_client = videos is None
+    if own_client:
+        # the discovery client is only needed (and imported) when no videos resource is passed in
+        from googleapiclient.discovery import build
+        youtube = build('youtube', 'v3', developerKey=os.getenv('YOUTUBE_API_KEY'))
+        videos = youtube.videos()
+
+    try:
+        if video_ids is None:
+            journal = EmbeddingJournal()
+            journal.load()
+            video_ids = sorted(journal.video_ids())
+
+        statistics = fetch_statistics(videos, video_ids)
+        updated = store.update_fields(statistics)
+
+        print(f"Refreshed the metrics of {updated}/{len(video_ids)} video(s)", flush=True)
+        return {'videos': len(video_ids), 'refreshed': updated}
+    finally:
+        if own_client:
+            youtube.close()
+
+if __name__ == '__main__':
+    refresh_video_metrics()
@@ -0,0 +1,186 @@
+# imports:
+# sqlite3 for the manifest, hashlib for the content hashes, threading since the chunker writes files from many threads
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+# ----------------------------------
+#  Manifest Location
+# ----------------------------------
+
+DEFAULT_MANIFEST_PATH = Path(__file__).parent.parent.parent / 'data' / 'transcripts_manifest.sqlite3'
+
+# 'chunked' files are embedded, 'empty' (chunked without any chunk) and 'unreadable' (raw or malformed) ones are only
+# recorded so they aren't parsed again until they change
+CHUNKED = 'chunked'
+EMPTY = 'empty'
+UNREADABLE = 'unreadable'
+
+# ----------------------------------
+#  Helpers
+# ----------------------------------
+
+# expected format: {channel_id}_transcript_{video_index}.json
+def parse_transcript_filename(filename: str) -> Tuple[str, str]:
+    parts = filename.replace("_transcript_", "|").replace(".json", "").split("|")
+    if len(parts) == 2:
+        return parts[0], parts[1]
+    return "unknown", "unknown"
+
+def hash_content(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+# ----------------------------------
+#  Manifest of the Chunked Transcripts
+# ----------------------------------
+
+class TranscriptManifest:
+    """
+    SQLite index of the transcript files: file -> video id, channel id, chunk count, content hash, mtime, size and status.
+
+    The chunker records every file it writes, and sync() picks up files changed or removed outside of it by
+    comparing mtime and size, so only those files are ever parsed to find their video id. Files that can't be
+    embedded are recorded with their status too, so they are only parsed again once they change.
+    """
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    # the database is only opened on first use
+    def _connect(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    file TEXT PRIMARY KEY,
+                    video_id TEXT NOT NULL,
+                    channel_id TEXT NOT NULL,
+                    video_index TEXT NOT NULL,
+                    chunk_count INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+            self._add_status()
+            self._conn.execute("CREATE INDEX IF NOT EXISTS files_video_id ON files (video_id)")
+            self._conn.commit()
+        return self._conn
+
+    # manifests created before the status only hold chunked files
+    def _add_status(self):
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(files)")]
+        if 'status' not in columns:
+            self._conn.execute(f"ALTER TABLE files ADD COLUMN status TEXT NOT NULL DEFAULT '{CHUNKED}'")
+
+    # -------------------------------
+    #  Record Files
+    # -------------------------------
+
+    def _upsert(self, filepath: Path, video_id: str, chunk_count: int, content_hash: str, status: str = CHUNKED):
+        stat = filepath.stat()
+        channel_id, video_index = parse_transcript_filename(filepath.name)
+        self._connect().execute(
+            """
+            INSERT OR REPLACE INTO files (file, video_id, channel_id, video_index, chunk_count, content_hash, mtime, size, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (filepath.name, video_id, channel_id, video_index, chunk_count, content_hash, stat.st_mtime, stat.st_size, status)
+        )
+
+    def record(self, filepath, chunks: List, content: bytes):
+        """
+        Record a chunked transcript file just written with the given chunks (metrics dict last) and bytes.
+        """
+        filepath = Path(filepath)
+        with self._lock:
+            self._upsert(filepath, chunks[-1].get('video_id', 'unknown'), len(chunks) - 1, hash_content(content),
+                         CHUNKED if len(chunks) > 1 else EMPTY)
+            self._conn.commit()
+
+    def sync(self, folder) -> dict:
+        """
+        Bring the manifest in line with the files in the folder, only new or changed files are parsed.
+        Skipped counts the new or changed files that can't be embedded (raw, malformed or without chunks).
+        """
+        counts = {'added': 0, 'updated': 0, 'removed': 0, 'skipped': 0}
+
+        with self._lock:
+            conn = self._connect()
+            known = {file: (mtime, size) for file, mtime, size in conn.execute("SELECT file, mtime, size FROM files")}
+
+            on_disk = set()
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.json') or not entry.is_file():
+                        continue
+                    on_disk.add(entry.name)
+
+                    stat = entry.stat()
+                    if known.get(entry.name) == (stat.st_mtime, stat.st_size):
+                        continue
+
+                    try:
+                        content = Path(entry.path).read_bytes()
+                    except IOError as e:
+                        print(f"Manifest skipping {entry.name}: {e}")
+                        counts['skipped'] += 1
+                        continue
+
+                    try:
+                        chunks = json.loads(content)
+                        video_id = chunks[-1]['video_id']
+                    except (json.JSONDecodeError, UnicodeDecodeError, IndexError, KeyError, TypeError) as e:
+                        # raw (not yet chunked) or malformed transcripts have no metrics dict at the end
+                        print(f"Manifest skipping {entry.name}: {e}")
+                        self._upsert(Path(entry.path), '', 0, hash_content(content), UNREADABLE)
+                        counts['skipped'] += 1
+                        continue
+
+                    if len(chunks) < 2:
+                        self._upsert(Path(entry.path), video_id, 0, hash_content(content), EMPTY)
+                        counts['skipped'] += 1
+                        continue
+
+                    self._upsert(Path(entry.path), video_id, len(chunks) - 1, hash_content(content))
+                    counts['updated' if entry.name in known else 'added'] += 1
+
+            removed = [(file,) for file in known if file not in on_disk]
+            conn.executemany("DELETE FROM files WHERE file = ?", removed)
+            counts['removed'] = len(removed)
+            conn.commit()
+
+        return counts
+
+    # -------------------------------
+    #  Queries
+    # -------------------------------
+
+    def files(self, exclude_video_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, str]]:
+        """
+        The (file, video id) of every chunked transcript, minus the given video ids (e.g. the already embedded ones).
+        """
+        # one json parameter, so the excluded ids can be more than sqlite takes as parameters
+        exclude = json.dumps(list(exclude_video_ids or ()))
+        with self._lock:
+            return self._connect().execute(
+                "SELECT file, video_id FROM files WHERE status = ? AND video_id NOT IN (SELECT value FROM json_each(?)) ORDER BY file",
+                (CHUNKED, exclude)
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# shared by the chunker and the embed stage
+manifest = TranscriptManifest()
@@ -17,6 +17,9 @@ from concurrent.futures import ThreadPoolExecutor
 # import the function to chunk the transcripts
 from .chunk_transcripts import read_and_chunk_transcript
 
+# import the journal of embedded videos
+from ..llm.embedding_journal import EmbeddingJournal
+
 from youtube_transcript_api import YouTubeTranscriptApi
 from youtube_transcript_api.proxies import WebshareProxyConfig
 from youtube_transcript_api._errors import (
@@ -92,16 +95,10 @@ def clean_transcript(text):
 # Function to Asynchronously get Transcripts and Clean
 # --------------------------------------------------------
 
-# bring in the embedded log file so we will not fetch transcripts that it already has
-embedded_log_path = Path(__file__).parent.parent.parent / 'data' / "embedded_files.json"
-already_fetched = set()
-
-# load the already_embedded set with the information from the log file
-if embedded_log_path.exists():
-    try:
-        already_embedded = set(json.loads(embedded_log_path.read_text()))
-    except (json.JSONDecodeError, IOError) as e:
-        print(f"Warning: count not read embedded log, starting fresh: {e}")
+# bring in the embedding journal so we will not fetch transcripts that it already has
+embedding_journal = EmbeddingJournal()
+embedding_journal.load()
+already_fetched = embedding_journal.video_ids()
 
 def fetch_transript(channel_id, vidx, vid_id):
     result = {
@@ -0,0 +1,39 @@
+"""
+Benchmark of Chroma's HNSW settings: recall@k against exact search and query latency for a grid of M,
+ef_construction and ef_search, over the same synthetic corpus as benchmark_vector_backends.
+On the real corpus use `python -m src.llm.vector sweep-hnsw`.
+
+    python -m tests.benchmark_hnsw [chunks]
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from src.llm.vector_backends import FlatIndexBackend, sweep_hnsw
+from tests.benchmark_vector_backends import corpus, QUERIES, BATCH
+
+
+def main(chunks=20000):
+    rng = np.random.default_rng(0)
+    vectors = corpus(chunks, rng)
+    queries = corpus(QUERIES, rng).tolist()
+    ids = [f"c{i}" for i in range(chunks)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = FlatIndexBackend(Path(directory) / "source")
+        for i in range(0, chunks, BATCH):
+            source.add(ids[i:i + BATCH], vectors[i:i + BATCH], ids[i:i + BATCH], [{} for _ in ids[i:i + BATCH]])
+
+        rows = sweep_hnsw(source, queries, ks=(15, 40, 300), spaces=('cosine',), ms=(16, 32),
+                          ef_constructions=(100, 200), ef_searches=(50, 100, 200, 400, 800), directory=directory)
+
+    print(f"\n{'M':>3} {'ef_c':>5} {'ef_s':>5} {'k':>4} {'recall':>7} {'ms':>7} {'exact ms':>9} {'build s':>8}   ({chunks} chunks, {QUERIES} queries per call)")
+    for row in rows:
+        print(f"{row['m']:3} {row['ef_construction']:5} {row['ef_search']:5} {row['k']:4} {row['recall']:7.3f} "
+              f"{row['hnsw_ms']:7.1f} {row['exact_ms']:9.1f} {row['build_s']:8.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
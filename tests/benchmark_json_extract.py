@@ -0,0 +1,100 @@
+"""
+Benchmark of the single pass JSON extractor against the previous repair cascade.
+Runs both over the data/example_output files and synthetic fenced, trailing-prose and truncated responses.
+
+    python -m tests.benchmark_json_extract
+"""
+import re
+import json
+import time
+from pathlib import Path
+
+from src.llm.json_extract import extract_json_from_response, entries_to_dict
+
+RESPONSES_DIR = Path(__file__).parent.parent / "data" / "example_output"
+
+
+# ========== Previous Cascade (for comparison) ==========
+
+def legacy_repair_json(text: str) -> str:
+    text = text.strip()
+    open_braces, close_braces = text.count('{'), text.count('}')
+    open_brackets, close_brackets = text.count('['), text.count(']')
+    if text.endswith(','):
+        text = text[:-1]
+    if not text.endswith(('}', ']', '"')):
+        last_complete = max(text.rfind('",'), text.rfind('"}'))
+        if last_complete != -1:
+            text = text[:last_complete + 1]
+    text += '}' * (open_braces - close_braces)
+    text += ']' * (open_brackets - close_brackets)
+    return text
+
+
+def legacy_extract(text: str, query_type: str) -> dict:
+    last_brace = max(text.rfind('}'), text.rfind(']'))
+    if last_brace != -1:
+        text = text[:last_brace + 1]
+    try:
+        return entries_to_dict(json.loads(text), query_type)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return entries_to_dict(json.loads(legacy_repair_json(text)), query_type)
+    except json.JSONDecodeError:
+        pass
+    repaired_text = legacy_repair_json(text)
+    code_block = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', repaired_text)
+    if code_block:
+        try:
+            return entries_to_dict(json.loads(legacy_repair_json(code_block.group(1))), query_type)
+        except json.JSONDecodeError:
+            pass
+    json_obj = re.search(r'\{[\s\S]*\}', repaired_text)
+    if json_obj:
+        try:
+            return json.loads(json_obj.group())
+        except json.JSONDecodeError:
+            pass
+    json_arr = re.search(r'\[[\s\S]*\]', repaired_text)
+    if json_arr:
+        try:
+            return entries_to_dict(json.loads(json_arr.group()), query_type)
+        except json.JSONDecodeError:
+            pass
+    return {"raw_response": text}
+
+
+# ========== Responses ==========
+
+def responses():
+    for path in sorted(RESPONSES_DIR.glob("*.json")):
+        text = path.read_text(encoding="utf-8")
+        yield f"{path.stem}/valid", path.stem, text
+        yield f"{path.stem}/fenced+prose", path.stem, f"Here you go:\n```json\n{text}\n```\nLet me know if you need anything else."
+        for fraction in (0.3, 0.6, 0.9):
+            yield f"{path.stem}/truncated@{fraction}", path.stem, text[:int(len(text) * fraction)]
+
+
+def time_per_call(extract, text, query_type, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        extract(text, query_type)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main(repeat=200):
+    print(f"{'response':34} {'chars':>6} {'legacy us':>10} {'new us':>8} {'legacy keys':>11} {'new keys':>8}")
+    totals = [0.0, 0.0]
+    for name, query_type, text in responses():
+        legacy_us = time_per_call(legacy_extract, text, query_type, repeat)
+        new_us = time_per_call(extract_json_from_response, text, query_type, repeat)
+        totals[0] += legacy_us
+        totals[1] += new_us
+        print(f"{name:34} {len(text):6} {legacy_us:10.1f} {new_us:8.1f} "
+              f"{len(legacy_extract(text, query_type)):11} {len(extract_json_from_response(text, query_type)):8}")
+    print(f"{'total':34} {'':6} {totals[0]:10.1f} {totals[1]:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
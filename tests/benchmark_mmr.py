@@ -0,0 +1,50 @@
+"""
+Benchmark of the vectorized mmr selection against langchain's maximal_marginal_relevance (the path Chroma's retriever used).
+Runs both over a synthetic pool of 300 mxbai-embed-large sized (1024 dim) candidates, and a batch of 4 queries.
+
+    python -m tests.benchmark_mmr
+"""
+import time
+
+import numpy as np
+from langchain_chroma.vectorstores import maximal_marginal_relevance
+
+from src.llm.mmr import mmr_select, mmr_select_batch
+
+FETCH_K = 300
+DIM = 1024
+LAMBDA = 0.3
+
+
+def time_ms(select, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        select()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    rng = np.random.default_rng(0)
+    pools = rng.normal(size=(4, FETCH_K, DIM)).astype(np.float32)
+    queries = rng.normal(size=(4, DIM)).astype(np.float32)
+
+    # chroma hands the candidate embeddings to langchain as a list of vectors
+    candidates = pools[0].tolist()
+
+    print(f"{'k':>4} {'langchain ms':>13} {'numpy ms':>9} {'speedup':>8} {'same':>5}")
+    for k in (5, 15, 40, 100, 200, 300):
+        repeat = 3 if k >= 100 else 10
+        legacy_ms = time_ms(lambda: maximal_marginal_relevance(queries[0], candidates, lambda_mult=LAMBDA, k=k), repeat)
+        numpy_ms = time_ms(lambda: mmr_select(queries[0], candidates, k, LAMBDA), repeat)
+        same = maximal_marginal_relevance(queries[0], candidates, lambda_mult=LAMBDA, k=k) == mmr_select(queries[0], candidates, k, LAMBDA)
+        print(f"{k:4} {legacy_ms:13.2f} {numpy_ms:9.2f} {legacy_ms / numpy_ms:7.1f}x {str(same):>5}")
+
+    # the scheduled queries' k values, one at a time and as one batch
+    k = 40
+    single_ms = time_ms(lambda: [mmr_select(query, pool, k, LAMBDA) for query, pool in zip(queries, pools)], 10)
+    batch_ms = time_ms(lambda: mmr_select_batch(queries, pools, k, LAMBDA), 10)
+    print(f"\n4 queries, k={k}: {single_ms:.2f} ms one at a time, {batch_ms:.2f} ms as one batch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark of the memory-mapped flat index (exact, and with an int8 or binary first pass) against Chroma's HNSW index.
+Builds both from the same synthetic corpus of unit-length 1024 dim vectors (mxbai-embed-large sized, clustered like
+chunks of the same videos), then reports the recall of each against the exact flat search, their latency and the
+bytes the first pass scans.
+On the real corpus use `python -m src.llm.vector migrate-flat` and `python -m src.llm.vector compare-backends`.
+
+    python -m tests.benchmark_vector_backends [chunks]
+"""
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import chromadb
+
+from src.llm.vector_backends import FlatIndexBackend, compare, DEFAULT_RESCORE_FACTOR
+
+DIM = 1024
+QUERIES = 20
+BATCH = 5000
+
+
+class ChromaCollection:
+    """Chroma collection queried directly by vector, the same calls ChromaBackend makes."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def query(self, query_vectors, n_results, where=None):
+        return self.collection.query(query_embeddings=query_vectors, n_results=n_results, where=where,
+                                     include=["metadatas", "documents", "embeddings"])
+
+
+def corpus(chunks, rng):
+    centers = rng.normal(size=(max(chunks // 40, 1), DIM))
+    vectors = centers[rng.integers(0, len(centers), size=chunks)] + 0.6 * rng.normal(size=(chunks, DIM))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def main(chunks=20000):
+    rng = np.random.default_rng(0)
+    vectors = corpus(chunks, rng)
+    queries = corpus(QUERIES, rng).tolist()
+    ids = [f"c{i}" for i in range(chunks)]
+    metadatas = [{'embedded_at': float(i)} for i in range(chunks)]
+    documents = [f"chunk {i}" for i in range(chunks)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        collection = chromadb.PersistentClient(path=str(Path(directory) / "chroma")).create_collection("transcripts")
+        for i in range(0, chunks, BATCH):
+            collection.add(ids=ids[i:i + BATCH], embeddings=vectors[i:i + BATCH], metadatas=metadatas[i:i + BATCH], documents=documents[i:i + BATCH])
+        print(f"chroma build: {time.perf_counter() - start:.1f}s for {chunks} chunks")
+
+        start = time.perf_counter()
+        flat = FlatIndexBackend(Path(directory) / "flat")
+        for i in range(0, chunks, BATCH):
+            flat.add(ids[i:i + BATCH], vectors[i:i + BATCH], documents[i:i + BATCH], metadatas[i:i + BATCH])
+        print(f"flat build:   {time.perf_counter() - start:.1f}s, {(Path(directory) / 'flat' / 'vectors.f32').stat().st_size / 2**20:.0f} MB mapped")
+
+        # the exact flat index is the reference every other search is measured against
+        searches = {
+            'chroma (hnsw)': ChromaCollection(collection),
+            'flat int8': FlatIndexBackend(Path(directory) / "flat", quantization='int8'),
+            f'flat binary x{DEFAULT_RESCORE_FACTOR}': FlatIndexBackend(Path(directory) / "flat", quantization='binary'),
+            'flat binary x10': FlatIndexBackend(Path(directory) / "flat", quantization='binary', rescore_factor=10),
+        }
+
+        # the quantized copies are written by the writer, not on the first search
+        start = time.perf_counter()
+        for kind in ('int8', 'binary'):
+            flat.build_quantized(kind)
+        print(f"quantize:     {time.perf_counter() - start:.1f}s")
+
+        footprint = flat.footprint()
+        print(f"first pass scans: float32 {footprint['float32_bytes'] / 2**20:.1f} MB, int8 {footprint['int8_bytes'] / 2**20:.1f} MB, "
+              f"binary {footprint['binary_bytes'] / 2**20:.1f} MB")
+
+        print(f"\n{'k':>4} {'search':18} {'recall':>7} {'ms':>7} {'exact ms':>9}   ({QUERIES} queries per call)")
+        for k in (15, 40, 300):
+            for name, search in searches.items():
+                report = compare(flat, search, queries, k)
+                print(f"{k:4} {name:18} {report[f'recall_at_{k}']:7.3f} {report['candidate_ms']:7.1f} {report['reference_ms']:9.1f}")
+
+        where = {"embedded_at": {"$gt": chunks * 0.9}}
+        start = time.perf_counter()
+        flat.query(queries, 300, where)
+        print(f"\nflat, 300 from the last 10% embedded: {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
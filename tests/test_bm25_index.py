@@ -0,0 +1,58 @@
+"""
+Tests for the persistent BM25 index over the chunk texts.
+Validates the tokenizer, the ranking, re-indexing of a chunk and the embedded_at and video filters.
+"""
+from langchain_core.documents import Document
+
+from src.llm.bm25_index import BM25Index, tokenize
+
+
+def doc(chunk_id, text, embedded_at=1.0, video_id='vid'):
+    return Document(page_content=text, metadata={'video_id': video_id, 'embedded_at': embedded_at}, id=chunk_id)
+
+
+def test_tokenize_keeps_model_names():
+    assert tokenize("What is new in GPT-4o and Llama-3.3, vs. o1?") == ['new', 'gpt-4o', 'llama-3.3', 'vs', 'o1']
+
+
+def test_chunks_matching_more_and_rarer_terms_rank_first(tmp_path):
+    index = BM25Index(tmp_path / "bm25.sqlite3")
+    index.add_many([
+        doc("c1", "ai models are getting better at coding"),
+        doc("c2", "the new claude release beats gpt-4o at coding"),
+        doc("c3", "ai ai ai everywhere in ai"),
+        doc("c4", "nothing relevant here"),
+    ])
+
+    results = index.search("claude coding ai", k=3)
+
+    assert [chunk_id for chunk_id, _ in results] == ["c2", "c1", "c3"]
+    assert results[0][1] > results[1][1] > results[2][1] > 0
+
+
+def test_reindexing_replaces_postings_and_persists(tmp_path):
+    index = BM25Index(tmp_path / "bm25.sqlite3")
+    index.add_many([doc("c1", "gemini"), doc("c2", "grok")])
+    index.add_many([doc("c1", "superintelligence")])
+
+    reopened = BM25Index(tmp_path / "bm25.sqlite3")
+    assert reopened.count() == 2
+    assert reopened.search("gemini") == []
+    assert [chunk_id for chunk_id, _ in reopened.search("superintelligence")] == ["c1"]
+
+
+def test_embedded_after_filter(tmp_path):
+    index = BM25Index(tmp_path / "bm25.sqlite3")
+    index.add_many([doc("old", "agents", embedded_at=1.0), doc("new", "agents", embedded_at=5.0), doc("legacy", "agents", embedded_at=None)])
+
+    assert [chunk_id for chunk_id, _ in index.search("agents", embedded_after=2.0)] == ["new"]
+    assert {chunk_id for chunk_id, _ in index.search("agents")} == {"old", "new", "legacy"}
+    assert index.search("the of and") == []
+
+
+def test_video_filter(tmp_path):
+    index = BM25Index(tmp_path / "bm25.sqlite3")
+    index.add_many([doc("a1", "openai", video_id="a"), doc("b1", "openai", video_id="b")])
+
+    assert [chunk_id for chunk_id, _ in index.search("openai", video_ids=["b"])] == ["b1"]
+    assert index.search("openai", video_ids=[]) == []
@@ -0,0 +1,81 @@
+"""
+Tests for packing transcript chunks into token budgeted requests.
+Validates the budget, the number of requests and the deterministic chunk order.
+"""
+import pytest
+
+from src.llm.context_packer import chunk_token_budget, pack_chunks, join_chunks, CHUNK_DELIMITER
+from src.llm.rate_limiter import estimate_tokens
+
+
+def group_tokens(chunks, group):
+    return sum(estimate_tokens(chunks[i] + CHUNK_DELIMITER) for i in group)
+
+
+def test_chunk_token_budget():
+    assert chunk_token_budget(1000, 2000, context_window=10000, context_fraction=0.5) == 2000
+    # the per request limit wins when it is smaller than the context budget
+    assert chunk_token_budget(1000, 2000, request_token_limit=4000, context_window=10000, context_fraction=0.5) == 1000
+
+
+def test_chunk_token_budget_without_room_for_chunks(capsys):
+    # the fixed prompt alone fills a low TPM limit
+    with pytest.raises(ValueError):
+        chunk_token_budget(3000, 1000, request_token_limit=4000)
+    with pytest.raises(ValueError):
+        pack_chunks(["chunk"], 0)
+
+    assert chunk_token_budget(2500, 1000, request_token_limit=4000) == 500
+    assert "500 of the 4000 request tokens" in capsys.readouterr().out
+
+
+def test_groups_fit_budget_and_keep_every_chunk():
+    chunks = [("word " * size) for size in [150, 50, 100, 20, 160, 120, 10, 180, 60]]
+    budget = 250
+
+    groups = pack_chunks(chunks, budget)
+
+    assert sorted(i for group in groups for i in group) == list(range(len(chunks)))
+    assert all(group_tokens(chunks, group) <= budget for group in groups)
+
+
+def test_small_chunks_share_one_request():
+    chunks = ["short chunk %d" % i for i in range(40)]
+    assert pack_chunks(chunks, 10000) == [list(range(40))]
+
+
+def test_first_fit_decreasing_uses_fewer_requests():
+    # in retrieval order a greedy fill would need 3 requests (60 | 60 | 40+40), sorted by size it needs 2
+    sizes = [160, 160, 100, 100]
+    chunks = ["x" * (size * 4) for size in sizes]
+    budget = group_tokens(chunks, [0, 2]) + 1
+
+    groups = pack_chunks(chunks, budget)
+
+    assert groups == [[0, 2], [1, 3]]
+
+
+def test_oversized_chunk_gets_its_own_request():
+    chunks = ["a" * 4000, "b", "c"]
+    groups = pack_chunks(chunks, 100)
+
+    assert [0] in groups
+    assert [1, 2] in groups
+
+
+def test_join_chunks_keeps_order():
+    chunks = ["first", "second", "third"]
+    assert join_chunks(chunks, [0, 2]) == "first" + CHUNK_DELIMITER + "third"
+
+
+def test_shared_key_cost_is_paid_once_per_request():
+    # four chunks of one video fit together once its header is only counted once
+    chunks = ["x" * 396] * 4
+    header = 300
+    budget = group_tokens(chunks, range(4)) + header
+
+    assert pack_chunks(chunks, budget, keys=["a"] * 4, key_costs={"a": header}) == [[0, 1, 2, 3]]
+
+    # with a different video per chunk each one pays its own header
+    groups = pack_chunks(chunks, budget, keys=["a", "b", "c", "d"], key_costs={k: header for k in "abcd"})
+    assert groups == [[0], [1], [2], [3]]
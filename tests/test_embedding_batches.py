@@ -0,0 +1,26 @@
+"""
+Tests for batching transcript chunks across files for embedding.
+Validates batch sizes, that every document is kept in order and that files can span batches.
+"""
+from langchain_core.documents import Document
+
+from src.llm.vector import document_batches
+
+
+def files(*sizes):
+    return [(f"video{f}", [Document(page_content=f"{f}-{i}", id=f"{f}-{i}") for i in range(size)]) for f, size in enumerate(sizes)]
+
+
+def test_batches_fill_across_files():
+    batches = list(document_batches(files(3, 5, 1, 4), batch_size=4))
+
+    assert [len(batch) for batch in batches] == [4, 4, 4, 1]
+    assert [doc.id for batch in batches for _, doc in batch] == [doc.id for _, docs in files(3, 5, 1, 4) for doc in docs]
+
+    # the second file is split over the first two batches
+    assert {video_id for video_id, _ in batches[0]} == {"video0", "video1"}
+    assert {video_id for video_id, _ in batches[1]} == {"video1"}
+
+
+def test_no_documents_no_batches():
+    assert list(document_batches(files(0, 0), batch_size=4)) == []
@@ -0,0 +1,85 @@
+"""
+Tests for the content addressed embedding cache.
+Validates that only uncached chunks reach the model, whitespace normalization, float32 storage and LRU eviction.
+"""
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.llm.embedding_cache import EmbeddingCache, CachedEmbeddings, hash_text
+
+
+class CountingEmbeddings(Embeddings):
+    """Stub model that embeds a text as [len, first char code, 0.1], recording what it was asked to embed."""
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), float(ord(text[0])), 0.1] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_only_misses_are_embedded(tmp_path):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, "m", EmbeddingCache(tmp_path / "cache.sqlite3"))
+
+    first = embeddings.embed_documents(["alpha", "beta", "alpha"])
+    assert model.embedded == ["alpha", "beta"]
+
+    # a rebuild with one new chunk and one re-chunked (whitespace only) chunk only embeds the new one
+    second = embeddings.embed_documents(["  alpha\n", "beta", "gamma"])
+    assert model.embedded == ["alpha", "beta", "gamma"]
+
+    assert second[:2] == first[:2]
+    assert embeddings.cache.stats() == {'hits': 2, 'misses': 3, 'hit_rate': 0.4}
+
+
+def test_vectors_are_float32_and_keyed_by_model(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3")
+    cache.put_many("m", {hash_text("text"): [0.1, 0.2, 0.3]})
+
+    vector = EmbeddingCache(tmp_path / "cache.sqlite3").get_many("m", [hash_text("text")])[hash_text("text")]
+    assert vector == np.asarray([0.1, 0.2, 0.3], dtype=np.float32).tolist()
+    assert cache.get_many("other-model", [hash_text("text")]) == {}
+
+
+def test_lru_eviction(tmp_path):
+    # room for two 3-float vectors
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3", max_bytes=24)
+    cache.put_many("m", {"a": [1, 1, 1]})
+    cache.put_many("m", {"b": [2, 2, 2]})
+    cache.get_many("m", ["a"])
+    cache.put_many("m", {"c": [3, 3, 3]})
+
+    assert set(cache.get_many("m", ["a", "b", "c"])) == {"a", "c"}
+
+    # replaced and evicted vectors are subtracted from the running total eviction reads
+    cache.put_many("m", {"a": [4, 4, 4, 4]})
+    with cache._lock:
+        assert cache._total_bytes() == cache._conn.execute("SELECT SUM(LENGTH(vector)) FROM vectors").fetchone()[0] == 16
+
+
+def test_disabled_cache_embeds_everything(tmp_path):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, "m", EmbeddingCache(tmp_path / "cache.sqlite3", enabled=False))
+
+    embeddings.embed_documents(["alpha"])
+    embeddings.embed_documents(["alpha"])
+    assert model.embedded == ["alpha", "alpha"]
+
+
+def test_queries_are_cached_apart_from_chunks(tmp_path):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, "m", EmbeddingCache(tmp_path / "cache.sqlite3"))
+
+    embeddings.embed_documents(["alpha"])
+    first = embeddings.embed_query("alpha")
+    assert model.embedded == ["alpha", "alpha"]
+
+    # a new process (same cache file) doesn't embed the query again
+    restarted = CachedEmbeddings(model, "m", EmbeddingCache(tmp_path / "cache.sqlite3"))
+    assert restarted.embed_query(" alpha ") == first
+    assert model.embedded == ["alpha", "alpha"]
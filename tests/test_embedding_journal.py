@@ -0,0 +1,56 @@
+"""
+Tests for the append-only journal of embedded videos.
+Validates appends, seeding from the legacy log, recovery from a partial last line and compaction.
+"""
+import json
+
+from src.llm.embedding_journal import EmbeddingJournal
+
+
+def test_record_and_reload(tmp_path):
+    journal = EmbeddingJournal(tmp_path / "journal.jsonl", legacy_log_path=None)
+    journal.load()
+    journal.record({"vid1": ["a_0", "a_1"], "vid2": ["b_0"]}, "model", embedded_at=1.0)
+    journal.record({"vid3": ["c_0"]}, "model", embedded_at=2.0)
+
+    reloaded = EmbeddingJournal(tmp_path / "journal.jsonl", legacy_log_path=None)
+    entries = reloaded.load()
+
+    assert reloaded.video_ids() == {"vid1", "vid2", "vid3"}
+    assert entries["vid1"] == {"video_id": "vid1", "chunk_ids": ["a_0", "a_1"], "model": "model", "embedded_at": 1.0}
+    assert reloaded.lines == 3
+
+
+def test_seeded_from_legacy_log(tmp_path):
+    legacy = tmp_path / "embedded_files.json"
+    legacy.write_text(json.dumps(["vid1", "vid2"]))
+
+    journal = EmbeddingJournal(tmp_path / "journal.jsonl", legacy_log_path=legacy)
+    journal.load()
+
+    assert journal.video_ids() == {"vid1", "vid2"}
+    assert EmbeddingJournal(tmp_path / "journal.jsonl", legacy_log_path=None).load().keys() == {"vid1", "vid2"}
+
+
+def test_partial_last_line_is_dropped(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text('{"video_id": "vid1"}\n{"video_id": "vi')
+
+    journal = EmbeddingJournal(path, legacy_log_path=None)
+    journal.load()
+    journal.record({"vid2": []}, "model")
+
+    assert EmbeddingJournal(path, legacy_log_path=None).load().keys() == {"vid1", "vid2"}
+
+
+def test_compaction_keeps_latest_entry_per_video(tmp_path):
+    journal = EmbeddingJournal(tmp_path / "journal.jsonl", legacy_log_path=None)
+    journal.load()
+    for embedded_at in range(3):
+        journal.record({"vid1": [f"a_{embedded_at}"]}, "model", embedded_at=embedded_at)
+
+    assert journal.needs_compaction()
+    journal.compact()
+
+    assert (tmp_path / "journal.jsonl").read_text().count("\n") == 1
+    assert EmbeddingJournal(tmp_path / "journal.jsonl", legacy_log_path=None).load()["vid1"]["chunk_ids"] == ["a_2"]
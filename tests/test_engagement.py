@@ -0,0 +1,44 @@
+"""
+Tests for adding the engagement metrics to the LLM results.
+Validates that counts and totals are computed from the chunk metadata rather than taken from the model.
+"""
+from langchain_core.documents import Document
+
+from src.llm.rag import add_engagement_metrics, strip_engagement
+
+
+def chunk(video_id, views, likes, comments):
+    return Document(page_content="text", metadata={
+        'video_id': video_id, 'view_count': views, 'like_count': likes, 'comment_count': comments
+    })
+
+
+CHUNKS = [chunk('a', 100, 10, 1), chunk('a', 100, 10, 1), chunk('b', 2000, 30, 5)]
+
+
+def test_claim_counts_come_from_the_video():
+    results = {"Claim": {"Quote": "q", "video_id": "b", "view_count": "999999"}}
+    add_engagement_metrics(results, CHUNKS)
+
+    assert results["Claim"] == {"Quote": "q", "video_id": "b", "view_count": 2000, "like_count": 30, "comment_count": 5}
+
+
+def test_totals_count_each_known_video_once():
+    results = {"Trend": {"Description": "d", "video_ids": ["a", "b", "a", "made-up"]}}
+    add_engagement_metrics(results, CHUNKS)
+
+    assert results["Trend"]["total_view_count"] == 2100
+    assert results["Trend"]["total_like_count"] == 40
+    assert results["Trend"]["total_comment_count"] == 6
+
+
+def test_unknown_and_plain_entries_are_left_alone():
+    results = {"Claim": {"Quote": "q", "video_id": "made-up"}, "Risk": "description"}
+    add_engagement_metrics(results, CHUNKS)
+
+    assert results == {"Claim": {"Quote": "q", "video_id": "made-up"}, "Risk": "description"}
+
+
+def test_strip_engagement_from_examples():
+    examples = {"Trend": {"Description": "d", "video_ids": ["a"], "total_view_count": "5"}, "Risk": "text"}
+    assert strip_engagement(examples) == {"Trend": {"Description": "d", "video_ids": ["a"]}, "Risk": "text"}
@@ -0,0 +1,82 @@
+"""
+Tests for extracting the JSON from the LLM responses.
+Validates code fences, trailing prose, truncation, list output and incremental (streamed) parsing.
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+from src.llm.json_extract import IncrementalJSONParser, extract_json_from_response
+
+RESPONSES_DIR = Path(__file__).parent.parent / "data" / "example_output"
+
+
+@pytest.mark.parametrize("path", sorted(RESPONSES_DIR.glob("*.json")), ids=lambda p: p.stem)
+def test_example_outputs_round_trip(path):
+    text = path.read_text(encoding="utf-8")
+    assert extract_json_from_response(text, path.stem) == json.loads(text)
+
+
+def test_code_fence_and_trailing_prose():
+    text = 'Sure! Here it is:\n```json\n{"A": {"Quote": "q {not json}", "video_id": "x"}}\n```\nHope this helps {really}.'
+    assert extract_json_from_response(text, "claims") == {"A": {"Quote": "q {not json}", "video_id": "x"}}
+
+
+def test_truncated_response_keeps_complete_entries():
+    text = '{"A": {"Quote": "one", "video_id": "a"}, "B": {"Quote": "two", "video_id": "b"}, "C": {"Quote": "thr'
+    assert extract_json_from_response(text, "claims") == {
+        "A": {"Quote": "one", "video_id": "a"},
+        "B": {"Quote": "two", "video_id": "b"},
+    }
+
+    # an unfinished list item is dropped too, rather than becoming an empty entry
+    text = '[{"claim Title": "c1", "Description": "d1"}, {"claim Title": "c2", "Descr'
+    assert extract_json_from_response(text, "claims") == {"c1": "d1"}
+
+
+def test_brackets_in_the_prose_before_the_json():
+    text = 'Here are the claims [JSON]: {"A": {"Quote": "one", "video_id": "a"}}'
+    assert extract_json_from_response(text, "claims") == {"A": {"Quote": "one", "video_id": "a"}}
+
+    text = 'Claims [1] and [2]:\n```json\n{"A": {"Quote": "one"}, "B": {"Quote": "tw'
+    assert extract_json_from_response(text, "claims") == {"A": {"Quote": "one"}}
+
+
+def test_trailing_and_missing_commas():
+    text = '{"A": 1, "B": [1, 2, 3,], "C": "x" "D": true,}'
+    assert extract_json_from_response(text, "claims") == {"A": 1, "B": [1, 2, 3], "C": "x", "D": True}
+
+
+def test_escapes_are_decoded():
+    text = '{"A": "say \\"hi\\" \\u00e9\\n", "B": 2,}'
+    assert extract_json_from_response(text, "claims") == {"A": 'say "hi" é\n', "B": 2}
+
+
+def test_list_output_becomes_dict():
+    text = '[{"trend Title": "T1", "Description": "d1"}, {"title": "T2", "text": "d2"}, {"other": 1}]'
+    assert extract_json_from_response(text, "trends") == {"T1": "d1", "T2": "d2", "trend 3": "{'other': 1}"}
+
+
+def test_no_json_returns_raw_text():
+    assert extract_json_from_response("no json here", "claims") == {"raw_response": "no json here"}
+
+
+def test_incremental_feed_yields_entries_as_they_close():
+    text = '```json\n{"A": {"Quote": "a \\"b\\""}, "B": [1, 2], "C": null}\n``` trailing'
+    parser = IncrementalJSONParser()
+
+    completed = []
+    for i in range(0, len(text), 3):
+        completed.extend(parser.feed(text[i:i + 3]))
+
+    assert completed == [("A", {"Quote": 'a "b"'}), ("B", [1, 2]), ("C", None)]
+    assert parser.done
+    assert parser.result() == {"A": {"Quote": 'a "b"'}, "B": [1, 2], "C": None}
+
+
+def test_truncated_flag():
+    parser = IncrementalJSONParser()
+    parser.feed('{"A": 1, "B": ')
+    assert parser.truncated
+    assert parser.result() == {"A": 1}
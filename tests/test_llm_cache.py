@@ -0,0 +1,80 @@
+"""
+Tests for the persistent LLM response cache.
+Validates keying, TTL expiry, size based eviction, the running size total and hit counting.
+"""
+import time
+import sqlite3
+
+from src.llm.llm_cache import LLMCache
+
+
+def test_hit_requires_same_key(tmp_path):
+    cache = LLMCache(tmp_path / "cache.sqlite3")
+    cache.put("claims", "prompt", "model-a", 0.7, '{"a": 1}')
+
+    assert cache.get("claims", "prompt", "model-a", 0.7) == '{"a": 1}'
+    assert cache.get("trends", "prompt", "model-a", 0.7) is None
+    assert cache.get("claims", "other prompt", "model-a", 0.7) is None
+    assert cache.get("claims", "prompt", "model-b", 0.7) is None
+    assert cache.get("claims", "prompt", "model-a", 0.0) is None
+
+    assert cache.stats() == {'hits': 1, 'misses': 4, 'hit_rate': 0.2}
+    cache.reset_stats()
+    assert cache.stats()['hits'] == 0
+
+
+def test_persists_across_instances(tmp_path):
+    LLMCache(tmp_path / "cache.sqlite3").put("claims", "prompt", "m", 0.7, "response")
+    assert LLMCache(tmp_path / "cache.sqlite3").get("claims", "prompt", "m", 0.7) == "response"
+
+
+def test_ttl_expiry(tmp_path):
+    cache = LLMCache(tmp_path / "cache.sqlite3", ttl_seconds=0.05)
+    cache.put("claims", "prompt", "m", 0.7, "response")
+    time.sleep(0.1)
+
+    assert cache.get("claims", "prompt", "m", 0.7) is None
+
+
+def test_size_eviction_drops_least_recently_used(tmp_path):
+    cache = LLMCache(tmp_path / "cache.sqlite3", max_bytes=25)
+    cache.put("claims", "first", "m", 0.7, "x" * 10)
+    cache.put("claims", "second", "m", 0.7, "y" * 10)
+
+    # touching the first entry makes the second one the least recently used
+    time.sleep(0.01)
+    assert cache.get("claims", "first", "m", 0.7) == "x" * 10
+    cache.put("claims", "third", "m", 0.7, "z" * 10)
+
+    assert cache.get("claims", "first", "m", 0.7) == "x" * 10
+    assert cache.get("claims", "second", "m", 0.7) is None
+    assert cache.get("claims", "third", "m", 0.7) == "z" * 10
+
+
+def test_running_total_follows_replacements_evictions_and_old_caches(tmp_path):
+    cache = LLMCache(tmp_path / "cache.sqlite3", max_bytes=25)
+    cache.put("claims", "first", "m", 0.7, "x" * 10)
+    cache.put("claims", "first", "m", 0.7, "x" * 5)
+    cache.put("claims", "second", "m", 0.7, "y" * 10)
+    # 30 bytes, so the least recently used first entry is evicted
+    cache.put("claims", "third", "m", 0.7, "z" * 15)
+
+    conn = sqlite3.connect(str(tmp_path / "cache.sqlite3"))
+    assert conn.execute("SELECT bytes FROM totals").fetchone()[0] == conn.execute("SELECT SUM(size) FROM responses").fetchone()[0] == 25
+
+    # a cache written before the total existed is summed once when opened
+    conn.execute("DROP TABLE totals")
+    conn.execute("DROP TRIGGER responses_insert")
+    conn.execute("DROP TRIGGER responses_delete")
+    conn.commit()
+    cache.close()
+    cache.put("claims", "fourth", "m", 0.7, "w" * 3)
+    assert conn.execute("SELECT bytes FROM totals").fetchone()[0] == conn.execute("SELECT SUM(size) FROM responses").fetchone()[0] == 18
+
+
+def test_disabled_cache(tmp_path):
+    cache = LLMCache(tmp_path / "cache.sqlite3", enabled=False)
+    cache.put("claims", "prompt", "m", 0.7, "response")
+
+    assert cache.get("claims", "prompt", "m", 0.7) is None
+    assert not (tmp_path / "cache.sqlite3").exists()
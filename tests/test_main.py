@@ -0,0 +1,51 @@
+"""
+Tests for the API startup.
+Validates that importing the app doesn't load the RAG, embedding or vector store stack, and that results are served without it.
+"""
+import sys
+import subprocess
+
+from fastapi.testclient import TestClient
+
+from src import main
+
+
+def test_import_does_not_load_the_rag_stack():
+    # a fresh interpreter, since other tests import these modules
+    modules = ['src.llm.rag', 'src.llm.vector', 'langchain_ollama', 'langchain_chroma', 'langchain_groq', 'googleapiclient.discovery']
+    code = f"import sys, src.main; print([m for m in {modules!r} if m in sys.modules])"
+    loaded = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.strip()
+
+    assert loaded == '[]'
+
+
+class FakeCursor(list):
+    def sort(self, key, direction):
+        return FakeCursor(sorted(self, key=lambda doc: doc[key], reverse=direction == -1))
+
+    def limit(self, limit):
+        return FakeCursor(self[:limit])
+
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query_filter, projection):
+        return FakeCursor(doc for doc in self.documents if all(doc.get(key) == value for key, value in query_filter.items()))
+
+
+def test_results_are_served_without_the_vector_store(monkeypatch):
+    documents = [
+        {'query_type': 'claims', 'run_date': 1},
+        {'query_type': 'trends', 'run_date': 2},
+        {'query_type': 'claims', 'run_date': 3},
+    ]
+    monkeypatch.setattr(main, 'get_results_collection', lambda: FakeCollection(documents))
+
+    # not entered as a context manager, so the lifespan (and its scheduler) doesn't run
+    client = TestClient(main.app)
+    response = client.get('/results', params={'query_type': 'claims'})
+
+    assert response.status_code == 200
+    assert [doc['run_date'] for doc in response.json()] == [3, 1]
@@ -0,0 +1,22 @@
+"""
+Tests for merging an incremental run's findings into the previous run's results.
+Validates that new entries replace previous ones and come first, and that the oldest entries age out past the cap.
+"""
+from src.llm.rag import merge_results
+
+
+def test_new_entries_replace_and_lead_the_previous_ones():
+    previous = {"B": "old b", "A": "old a"}
+    assert merge_results(previous, {"A": "new a", "C": "c"}) == {"A": "new a", "C": "c", "B": "old b"}
+    assert list(merge_results(previous, {"A": "new a", "C": "c"})) == ["A", "C", "B"]
+
+
+def test_oldest_entries_age_out_past_the_cap():
+    merged = {}
+    for run in range(10):
+        merged = merge_results(merged, {f"run {run} entry {i}": i for i in range(3)}, max_entries=7)
+
+    # the size stays bounded by the cap, with the entries of the most recent runs
+    assert len(merged) == 7
+    assert list(merged)[:3] == [f"run 9 entry {i}" for i in range(3)]
+    assert "run 7 entry 0" in merged and "run 6 entry 2" not in merged
@@ -0,0 +1,42 @@
+"""
+Tests for the vectorized maximal marginal relevance selection.
+Validates it against langchain's implementation, and the batched selection against single queries.
+"""
+import numpy as np
+import pytest
+from langchain_chroma.vectorstores import maximal_marginal_relevance
+
+from src.llm.mmr import mmr_select, mmr_select_batch
+
+
+@pytest.mark.parametrize("k", [1, 5, 40, 60, 100])
+@pytest.mark.parametrize("lambda_mult", [0.0, 0.3, 1.0])
+def test_matches_langchain(k, lambda_mult):
+    rng = np.random.default_rng(k)
+    candidates = rng.normal(size=(60, 32)).astype(np.float32)
+    query = rng.normal(size=32).astype(np.float32)
+
+    expected = maximal_marginal_relevance(query, candidates.tolist(), lambda_mult=lambda_mult, k=k)
+
+    assert mmr_select(query, candidates, k, lambda_mult) == expected
+
+
+def test_batch_with_padded_pools_matches_single_queries():
+    rng = np.random.default_rng(0)
+    counts = [20, 7, 0]
+    pools = [rng.normal(size=(count, 16)).astype(np.float32) for count in counts]
+    queries = rng.normal(size=(3, 16)).astype(np.float32)
+
+    padded = np.zeros((3, 20, 16), dtype=np.float32)
+    for query, pool in enumerate(pools):
+        padded[query, :len(pool)] = pool
+
+    selections = mmr_select_batch(queries, padded, 10, 0.3, counts)
+
+    assert selections == [mmr_select(query, pool, 10, 0.3) for query, pool in zip(queries, pools)]
+    assert [len(selected) for selected in selections] == [10, 7, 0]
+
+
+def test_zero_vectors_and_empty_pool():
+    assert mmr_select(np.ones(4), np.zeros((0, 4)), 5) == []
+    assert sorted(mmr_select(np.ones(4), np.zeros((3, 4)), 5)) == [0, 1, 2]
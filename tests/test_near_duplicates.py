@@ -0,0 +1,167 @@
+"""
+Tests for the near-duplicate check of new chunks.
+Validates the MinHash estimate of the jaccard similarity, the LSH lookup across calls and within one, re-embedded
+videos, a changed threshold, staged chunks, the flag and collapse modes of the embed stage, and what a failed
+batch leaves behind.
+"""
+import numpy as np
+from langchain_core.documents import Document
+
+from src.llm import vector
+from src.llm.bm25_index import TOKEN
+from src.llm.near_duplicates import NearDuplicateIndex, minhash_signatures, rows_per_band, SHINGLE_SIZE
+
+RNG = np.random.default_rng(0)
+WORDS = [f"word{i}" for i in range(5000)]
+
+
+def text(words=400):
+    return ' '.join(RNG.choice(WORDS, words))
+
+
+# the same text with a share of its words replaced
+def edited(original, share):
+    words = original.split()
+    for position in RNG.choice(len(words), int(share * len(words)), replace=False):
+        words[position] = "edited"
+    return ' '.join(words)
+
+
+def doc(chunk_id, content, video_id='vid'):
+    return Document(page_content=content, metadata={'video_id': video_id}, id=chunk_id)
+
+
+def jaccard(first, second):
+    def shingles(content):
+        words = TOKEN.findall(content.lower())
+        return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    first, second = shingles(first), shingles(second)
+    return len(first & second) / len(first | second)
+
+
+def test_signatures_estimate_the_jaccard_similarity():
+    original = text()
+    for share in (0.0, 0.01, 0.03, 0.1):
+        copy = edited(original, share)
+        signatures = minhash_signatures([original, copy])
+        assert abs((signatures[0] == signatures[1]).mean() - jaccard(original, copy)) < 0.1
+
+    assert (minhash_signatures([original])[0] == minhash_signatures([text()])[0]).mean() < 0.05
+    # the lsh threshold sits at or below the requested one
+    assert all((rows_per_band(threshold) / 128) ** (1 / rows_per_band(threshold)) <= threshold for threshold in (0.5, 0.8, 0.9))
+
+
+def test_near_duplicates_are_found_across_calls_and_within_one(tmp_path):
+    index = NearDuplicateIndex(tmp_path / "near_duplicates.sqlite3", threshold=0.8)
+    original, other = text(), text()
+    assert index.check_many([doc("a0", original, "a"), doc("a1", other, "a")]) == [None, None]
+
+    clip = edited(original, 0.005)
+    results = index.check_many([doc("b0", clip, "b"), doc("b1", text(), "b"), doc("b2", edited(clip, 0.005), "b")])
+
+    assert results[0][0] == "a0" and results[0][1] >= 0.8
+    assert results[1] is None
+    # a duplicate points at an indexed (embedded) chunk, never at another duplicate
+    assert results[2][0] == "a0"
+    assert index.count() == 3
+    assert index.stats()['near_duplicates'] == 2
+
+    # the same chunk checked again isn't its own duplicate, and a re-embedded video isn't compared with itself
+    assert index.check_many([doc("a1", other, "a")]) == [None]
+    index.forget_videos(["a"])
+    assert index.check_many([doc("a0-new", original, "a")]) == [None]
+
+
+def test_changed_threshold_rebuilds_the_buckets(tmp_path):
+    original = text()
+    NearDuplicateIndex(tmp_path / "near_duplicates.sqlite3", threshold=0.9).check_many([doc("a0", original, "a")])
+
+    lower = NearDuplicateIndex(tmp_path / "near_duplicates.sqlite3", threshold=0.5)
+    results = lower.check_many([doc("b0", edited(original, 0.06), "b")])
+
+    assert results[0][0] == "a0" and 0.5 <= results[0][1] < 0.9
+
+
+def test_staged_chunks_are_indexed_once_committed(tmp_path):
+    index = NearDuplicateIndex(tmp_path / "near_duplicates.sqlite3")
+    original = text()
+    assert index.check_many([doc("a0", original, "a"), doc("a1", text(), "a")], stage=True) == [None, None]
+
+    # staged chunks are candidates, but only committed ones are stored
+    assert index.check_many([doc("b0", original, "b")], stage=True)[0][0] == "a0"
+    assert index.staged_videos(["a0", "x"]) == {"a"}
+    assert index.count() == 0
+
+    index.commit(["a0", "x"])
+    index.discard_videos(["a"])
+    assert index.count() == 1 and index.staged_videos(["a0", "a1"]) == set()
+    assert NearDuplicateIndex(tmp_path / "near_duplicates.sqlite3").check_many([doc("c0", original, "c")])[0][0] == "a0"
+
+
+def test_flag_and_collapse_modes(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector, "near_duplicate_index", NearDuplicateIndex(tmp_path / "near_duplicates.sqlite3"))
+    original = text()
+    vector.deduplicate_documents("a", [doc("a0", original, "a")], mode="flag")
+
+    # a0 isn't embedded yet, so b waits for a
+    flagged, waits_for = vector.deduplicate_documents("b", [doc("b0", original, "b"), doc("b1", text(), "b")], mode="flag")
+    assert [d.metadata.get('near_duplicate_of') for d in flagged] == ["a0", None]
+    assert waits_for == {"a"}
+    assert vector.near_duplicate_report("flag")['embeddings_saved'] == 0
+
+    vector.near_duplicate_index.commit(["a0"])
+    collapsed, waits_for = vector.deduplicate_documents("c", [doc("c0", original, "c"), doc("c1", text(), "c")], mode="collapse")
+    assert [d.id for d in collapsed] == ["c1"] and waits_for == set()
+
+    report = vector.near_duplicate_report("collapse")
+    assert report['checked'] == 5 and report['embeddings_saved'] == 2
+    assert report['prompt_tokens_saved'] == report['near_duplicate_tokens'] > 0
+
+    assert vector.deduplicate_documents("d", [doc("d0", original, "d")], mode="off") == ([doc("d0", original, "d")], set())
+
+
+# a video whose chunks all repeat a video with a failed batch isn't logged, and nothing points at the failed chunks
+def test_failed_batch_leaves_no_signatures_behind(tmp_path, monkeypatch):
+    original = text()
+    files = {"a.json": ("a", [doc("a0", original, "a")]), "b.json": ("b", [doc("b0", original, "b")])}
+
+    class Journal:
+        def __init__(self):
+            self.recorded = {}
+        def load(self):
+            pass
+        def video_ids(self):
+            return set()
+        def record(self, videos, model):
+            self.recorded.update(videos)
+        def needs_compaction(self):
+            return False
+
+    class Manifest:
+        def sync(self, folder):
+            return {}
+        def files(self, exclude_video_ids = None):
+            return [(name, video_id) for name, (video_id, _) in files.items()]
+
+    class Backend:
+        def add_documents(self, documents):
+            if any(d.metadata['video_id'] == "a" for d in documents):
+                raise RuntimeError("embedding failed")
+
+    journal = Journal()
+    monkeypatch.setattr(vector, "EmbeddingJournal", lambda: journal)
+    monkeypatch.setattr(vector, "manifest", Manifest())
+    monkeypatch.setattr(vector, "get_backend", lambda: Backend())
+    monkeypatch.setattr(vector, "file_documents", lambda folder, name: (files[name][0], {}, files[name][1]))
+    monkeypatch.setattr(vector.video_store, "upsert_many", lambda videos: None)
+    monkeypatch.setattr(vector.bm25_index, "add_many", lambda documents: None)
+    monkeypatch.setattr(vector, "embedding_cache", vector.EmbeddingCache(tmp_path / "embedding_cache.sqlite3"))
+    monkeypatch.setattr(vector, "NEAR_DUPLICATE_MODE", "collapse")
+    monkeypatch.setattr(vector, "near_duplicate_index", NearDuplicateIndex(tmp_path / "near_duplicates.sqlite3"))
+    monkeypatch.setattr(vector.deduplicate_documents, "__defaults__", ("collapse",))
+
+    vector.embed_transcripts(batch_size=1, workers=1)
+
+    assert journal.recorded == {}
+    assert vector.near_duplicate_index.count() == 0
+    assert vector.near_duplicate_index.check_many([doc("c0", original, "c")]) == [None]
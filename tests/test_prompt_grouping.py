@@ -0,0 +1,41 @@
+"""
+Tests for grouping the retrieved chunks by video in the prompt.
+Validates that each video's metadata header is written once and its chunks follow in start order.
+"""
+from langchain_core.documents import Document
+
+from src.llm.rag import format_chunks_by_video, format_chunk_with_metadata, format_video_header
+from src.llm.context_packer import CHUNK_DELIMITER
+from src.llm.rate_limiter import estimate_tokens
+
+
+def chunk(video_id, start, text):
+    return Document(page_content=text, metadata={
+        'video_id': video_id, 'title': f"Video {video_id}", 'start': start,
+        'view_count': 10, 'like_count': 2, 'comment_count': 1, 'published_at': '2025-01-01', 'total_duration': 'PT10M'
+    })
+
+
+CHUNKS = [chunk('a', 300.0, "third"), chunk('b', 0.0, "other"), chunk('a', 0.0, "first"), chunk('a', 120.0, "second")]
+
+
+def test_each_header_written_once():
+    text = format_chunks_by_video(CHUNKS)
+
+    assert text.count("Video Id: a") == 1
+    assert text.count("Video Id: b") == 1
+    assert text.startswith(format_video_header(CHUNKS[0].metadata))
+
+
+def test_chunks_follow_their_video_in_start_order():
+    text = format_chunks_by_video(CHUNKS)
+    video_a, video_b = text.split(CHUNK_DELIMITER)
+
+    assert video_a.index("first") < video_a.index("second") < video_a.index("third")
+    assert "Chunk Start: 120.0" in video_a
+    assert "other" in video_b
+
+
+def test_grouping_uses_fewer_tokens_than_repeated_headers():
+    flat = CHUNK_DELIMITER.join(format_chunk_with_metadata(c) for c in CHUNKS)
+    assert estimate_tokens(format_chunks_by_video(CHUNKS)) < estimate_tokens(flat)
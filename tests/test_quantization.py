@@ -0,0 +1,48 @@
+"""
+Tests for the int8 and binary quantization of the embedding vectors.
+Validates the row layouts and that the approximate scores rank like the float dot products.
+"""
+import numpy as np
+import pytest
+
+from src.llm.quantization import quantize, quantized_dtype, approximate_scores
+
+
+def test_int8_rows_are_close_to_the_vectors():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(100, 64)).astype(np.float32)
+
+    rows = quantize('int8', vectors)
+
+    assert rows.dtype == quantized_dtype('int8', 64) and rows.dtype.itemsize == 68
+    assert np.abs(rows['q']).max() == 127
+    assert np.allclose(rows['q'] * rows['scale'][:, None], vectors, atol=np.abs(vectors).max() / 254 + 1e-6)
+
+    # a zero vector stays zero
+    assert not quantize('int8', np.zeros((1, 4)))['q'].any()
+
+
+def test_binary_rows_keep_the_signs():
+    rows = quantize('binary', [[0.5, -0.1, 0.0, 2.0, -1.0, 1.0, 1.0, -3.0, 0.2]])
+
+    assert rows.dtype == np.uint8 and rows.shape == (1, 2) and quantized_dtype('binary', 9).itemsize == 2
+    assert rows.tolist() == [[0b10010110, 0b10000000]]
+
+
+# binary codes of unclustered random vectors are the worst case, so their shortlist is 10x the results (as a rescored search uses)
+@pytest.mark.parametrize("kind, shortlist, min_recall", [('int8', 20, 0.95), ('binary', 200, 0.6)])
+def test_shortlists_hold_the_exact_top_results(kind, shortlist, min_recall):
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(2000, 256)).astype(np.float32)
+    queries = rng.normal(size=(5, 256)).astype(np.float32)
+
+    exact = np.argsort(-(vectors @ queries.T), axis=0)[:20].T
+    approximate = np.argsort(-approximate_scores(kind, quantize(kind, vectors), queries), axis=0)[:shortlist].T
+
+    recall = np.mean([len(set(a) & set(b)) / 20 for a, b in zip(exact, approximate)])
+    assert recall >= min_recall
+
+
+def test_unknown_quantization():
+    with pytest.raises(ValueError):
+        quantized_dtype('int4', 8)
@@ -0,0 +1,55 @@
+"""
+Tests for the scheduled query dependency graph.
+Validates that independent queries run together, dependents wait for their inputs and failures skip dependents.
+"""
+import threading
+import time
+
+import pytest
+
+from src.llm.query_graph import QUERY_GRAPH, check_graph, run_graph
+
+
+def test_independent_nodes_start_together_and_dependents_wait():
+    started = {}
+    barrier = threading.Barrier(2, timeout=2)
+
+    def run_node(node, inputs, timing):
+        started[node] = time.perf_counter()
+        # claims and risk_factors must be running at the same time to pass the barrier
+        if node in ('claims', 'risk_factors'):
+            barrier.wait()
+        timing['custom'] = node
+        return {'node': node, 'inputs': sorted(inputs)}
+
+    results, errors, timings = run_graph(QUERY_GRAPH, run_node)
+
+    assert errors == {}
+    assert results['trends']['inputs'] == ['claims']
+    assert results['narratives']['inputs'] == ['claims', 'trends']
+    assert started['trends'] >= started['claims']
+    assert started['narratives'] >= started['trends']
+    assert timings['narratives']['depends_on'] == ['claims', 'trends']
+    assert timings['claims']['custom'] == 'claims'
+    assert all('duration_s' in timing for timing in timings.values())
+
+
+def test_failure_skips_dependents_only():
+    def run_node(node, inputs, timing):
+        if node == 'claims':
+            raise RuntimeError("groq down")
+        return node
+
+    results, errors, _ = run_graph(QUERY_GRAPH, run_node)
+
+    assert results == {'risk_factors': 'risk_factors'}
+    assert 'groq down' in errors['claims']
+    assert errors['trends'].startswith('skipped')
+    assert errors['narratives'].startswith('skipped')
+
+
+def test_check_graph_rejects_cycles_and_unknown_nodes():
+    with pytest.raises(ValueError):
+        check_graph({'a': ['b'], 'b': ['a']})
+    with pytest.raises(ValueError):
+        check_graph({'a': ['missing']})
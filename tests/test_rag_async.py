@@ -0,0 +1,53 @@
+"""
+Tests for the async (concurrent) invocation of chunk groups in rag.py.
+Validates that responses keep the order of the groups and that the concurrency cap holds.
+"""
+import asyncio
+import random
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from src.llm import rag
+from src.llm.rate_limiter import RateLimiter
+from src.llm.llm_cache import LLMCache
+
+
+class ConcurrencyTracker:
+    """Stub model that answers with its prompt after a random delay, recording how many calls overlap."""
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, prompt_value):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(random.uniform(0.0, 0.05))
+            return AIMessage(content=prompt_value.to_string())
+        finally:
+            self.running -= 1
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    tracker = ConcurrencyTracker()
+    monkeypatch.setattr(rag, "build_model", lambda *args, **kwargs: RunnableLambda(tracker))
+    monkeypatch.setattr(rag, "rate_limiter", RateLimiter(requests_per_minute=10**6, tokens_per_minute=10**9))
+    monkeypatch.setattr(rag, "llm_cache", LLMCache(enabled=False))
+    return tracker
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 3, 8])
+def test_ainvoke_chains_keeps_order_and_cap(stub_model, max_concurrency):
+    prompt = ChatPromptTemplate.from_template("{transcripts}")
+    inputs = [{"transcripts": f"group {i}"} for i in range(20)]
+
+    responses = asyncio.run(rag.ainvoke_chains(prompt, "{transcripts}", inputs, max_concurrency))
+
+    assert [response.text.split(": ", 1)[-1] for response in responses] == [f"group {i}" for i in range(20)]
+    assert 1 <= stub_model.max_running <= max_concurrency
+    assert rag.rate_limiter.state()['outstanding_requests'] == 0
@@ -0,0 +1,89 @@
+"""
+Tests for streaming the LLM responses in rag.py.
+Validates that entries are reported as they close, that the stream stops once the JSON closes and that truncation is
+flagged (and not cached).
+"""
+import asyncio
+
+from langchain_core.messages import AIMessageChunk
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableGenerator
+
+from src.llm import rag
+from src.llm.llm_cache import LLMCache
+from src.llm.rate_limiter import RateLimiter
+
+PROMPT = ChatPromptTemplate.from_template("{transcripts}")
+
+
+def stub_stream(response, piece_size=4):
+    """Stub model that streams the response in small pieces, recording how many pieces were pulled."""
+    pulled = []
+
+    def generate(prompt_values):
+        for _ in prompt_values:
+            pass
+        for i in range(0, len(response), piece_size):
+            pulled.append(i)
+            yield AIMessageChunk(content=response[i:i + piece_size])
+
+    async def agenerate(prompt_values):
+        async for _ in prompt_values:
+            pass
+        for i in range(0, len(response), piece_size):
+            pulled.append(i)
+            yield AIMessageChunk(content=response[i:i + piece_size])
+
+    return PROMPT | RunnableGenerator(generate, agenerate), pulled
+
+
+RESPONSE = '{"A": {"Quote": "one"}, "B": {"Quote": "two"}}' + " Note: I hope this helps, these claims are from the transcripts." * 5
+
+
+def test_stream_reports_entries_and_stops_when_json_closes():
+    chain, pulled = stub_stream(RESPONSE)
+    entries = []
+
+    message = rag.stream_chain(chain, {"transcripts": "x"}, lambda key, value: entries.append((key, value)))
+
+    assert entries == [("A", {"Quote": "one"}), ("B", {"Quote": "two"})]
+    assert message.response_metadata == {'streamed': True, 'stopped_early': True, 'truncated': False}
+    assert len(pulled) < len(RESPONSE) / 4 / 2
+    assert rag.extract_json_from_response(message.text, "claims") == {"A": {"Quote": "one"}, "B": {"Quote": "two"}}
+
+
+def test_truncated_stream_is_flagged():
+    chain, _ = stub_stream('{"A": {"Quote": "one"}, "B": {"Quo')
+
+    message = rag.stream_chain(chain, {"transcripts": "x"})
+
+    assert message.response_metadata['truncated'] is True
+    assert message.response_metadata['stopped_early'] is False
+
+
+def test_truncated_responses_are_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag, "rate_limiter", RateLimiter(requests_per_minute=10**6, tokens_per_minute=10**9))
+    monkeypatch.setattr(rag, "llm_cache", LLMCache(tmp_path / "cache.sqlite3"))
+    rendered_prompt = PROMPT.format(transcripts="x")
+
+    chain, _ = stub_stream('{"A": {"Quote": "one"}, "B": {"Quo')
+    monkeypatch.setattr(rag, "get_model", lambda: chain.last)
+    rag.invoke_chain(PROMPT, "{transcripts}", {"transcripts": "x"}, stream=True)
+    assert rag.cached_response("claims", rendered_prompt) is None
+
+    chain, _ = stub_stream(RESPONSE)
+    monkeypatch.setattr(rag, "get_model", lambda: chain.last)
+    rag.invoke_chain(PROMPT, "{transcripts}", {"transcripts": "x"}, stream=True)
+    cached = rag.cached_response("claims", rendered_prompt)
+    assert rag.extract_json_from_response(cached.text, "claims") == {"A": {"Quote": "one"}, "B": {"Quote": "two"}}
+
+
+def test_async_stream_stops_when_json_closes():
+    chain, pulled = stub_stream(RESPONSE)
+    entries = []
+
+    message = asyncio.run(rag.astream_chain(chain, {"transcripts": "x"}, lambda key, value: entries.append(key)))
+
+    assert entries == ["A", "B"]
+    assert message.response_metadata['stopped_early'] is True
+    assert len(pulled) < len(RESPONSE) / 4 / 2
@@ -0,0 +1,164 @@
+"""
+Tests for the Groq rate limiter.
+Validates parsing of Groq's rate limit headers and the request/token budget bookkeeping.
+"""
+import time
+
+import pytest
+
+from src.llm.rate_limiter import RateLimiter, parse_reset_duration, BUDGET_WINDOW_SECONDS
+
+
+# ========== Header Parsing ==========
+
+@pytest.mark.parametrize("value, expected", [
+    ("2m59.56s", 179.56),
+    ("7.66s", 7.66),
+    ("120ms", 0.12),
+    ("1h2m3s", 3723.0),
+    ("3", 3.0),
+    (5, 5.0),
+])
+def test_parse_reset_duration(value, expected):
+    assert parse_reset_duration(value) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("value", [None, "", "soon", "abc"])
+def test_parse_reset_duration_garbage(value):
+    assert parse_reset_duration(value) is None
+
+
+# ========== Local Budget ==========
+
+def test_local_window_without_headers():
+    limiter = RateLimiter(requests_per_minute=30, tokens_per_minute=12000)
+
+    assert limiter.reserve_or_wait_time(11000) == 0.0
+
+    wait = limiter.reserve_or_wait_time(5000)
+    assert wait == pytest.approx(BUDGET_WINDOW_SECONDS, abs=1.0)
+
+    state = limiter.state()
+    assert state['remaining_tokens'] == 1000
+    assert state['remaining_requests'] == 29
+    assert state['from_headers'] is False
+
+
+def test_request_budget_exhausted():
+    limiter = RateLimiter(requests_per_minute=1, tokens_per_minute=12000)
+
+    assert limiter.reserve_or_wait_time(10) == 0.0
+    assert limiter.reserve_or_wait_time(10) > 0
+
+
+def test_request_larger_than_limit_is_clamped():
+    limiter = RateLimiter(requests_per_minute=30, tokens_per_minute=1000)
+
+    # a full budget lets an oversized request through instead of waiting forever
+    assert limiter.reserve_or_wait_time(5000) == 0.0
+
+    # after that it only waits for the budget to reset, not for 5000 tokens that never become available
+    now = time.monotonic()
+    assert limiter._wait_time(5000, now) == pytest.approx(BUDGET_WINDOW_SECONDS, abs=1.0)
+
+    limiter.tokens_reset_at = now - 1
+    limiter.requests_reset_at = now - 1
+    limiter._refill(now)
+    assert limiter._wait_time(5000, now) <= 0
+
+
+# ========== Syncing with Headers ==========
+
+def test_update_from_headers_replaces_budget():
+    limiter = RateLimiter(requests_per_minute=30, tokens_per_minute=12000)
+    limiter.update_from_headers({
+        'X-RateLimit-Limit-Tokens': '6000',
+        'x-ratelimit-remaining-tokens': '500',
+        'x-ratelimit-reset-tokens': '7.5s',
+        'x-ratelimit-limit-requests': '1000',
+        'x-ratelimit-remaining-requests': '999',
+        'x-ratelimit-reset-requests': '1m26.4s',
+    })
+
+    state = limiter.state()
+    assert state['token_limit'] == 6000
+    assert state['remaining_tokens'] == 500
+    assert state['tokens_reset_in'] == pytest.approx(7.5, abs=0.5)
+    assert state['request_limit'] == 1000
+    assert state['remaining_requests'] == 999
+    assert state['requests_reset_in'] == pytest.approx(86.4, abs=0.5)
+    assert state['from_headers'] is True
+
+    # 500 tokens left, so a 1000 token request waits for the reset in the header
+    assert limiter.reserve_or_wait_time(1000) == pytest.approx(7.5, abs=0.5)
+    assert limiter.reserve_or_wait_time(400) == 0.0
+
+
+def test_429_with_retry_after_blocks():
+    limiter = RateLimiter()
+    limiter.update_from_headers({'retry-after': '12'}, 429)
+
+    assert limiter.blocked_until - time.monotonic() == pytest.approx(12.0, abs=0.5)
+    assert limiter.reserve_or_wait_time(1) == pytest.approx(12.0, abs=0.5)
+
+
+def test_429_without_retry_after_uses_reset():
+    limiter = RateLimiter()
+    limiter.update_from_headers({'x-ratelimit-reset-tokens': '3s'}, 429)
+    assert limiter.blocked_until - time.monotonic() == pytest.approx(3.0, abs=0.5)
+
+    limiter = RateLimiter()
+    limiter.update_from_headers({}, 429)
+    assert limiter.blocked_until - time.monotonic() == pytest.approx(BUDGET_WINDOW_SECONDS, abs=0.5)
+
+
+def test_non_429_does_not_block():
+    limiter = RateLimiter()
+    limiter.update_from_headers({'retry-after': '12'}, 200)
+
+    assert limiter.reserve_or_wait_time(1) == 0.0
+
+
+# ========== Requests in Flight ==========
+
+def test_headers_keep_outstanding_reservations():
+    limiter = RateLimiter(requests_per_minute=30, tokens_per_minute=12000)
+
+    # two requests in flight, the first one is answered
+    assert limiter.reserve_or_wait_time(3000) == 0.0
+    first = max(limiter._reservations)
+    assert limiter.reserve_or_wait_time(4000) == 0.0
+
+    limiter.release(first)
+    limiter.update_from_headers({'x-ratelimit-remaining-tokens': '9000', 'x-ratelimit-remaining-requests': '29'})
+
+    # Groq's 9000 doesn't count the 4000 token request still in flight
+    state = limiter.state()
+    assert state['outstanding_tokens'] == 4000
+    assert state['outstanding_requests'] == 1
+    assert state['remaining_tokens'] == 5000
+    assert state['remaining_requests'] == 28
+
+
+def test_release_is_idempotent_and_uses_current_reservation():
+    limiter = RateLimiter()
+
+    assert limiter.reserve_or_wait_time(100) == 0.0
+    limiter.release()
+    limiter.release()
+
+    assert limiter.state()['outstanding_tokens'] == 0
+    assert limiter.state()['outstanding_requests'] == 0
+
+
+def test_response_hook_releases_reservation():
+    class Response:
+        status_code = 200
+        headers = {'x-ratelimit-remaining-tokens': '11000'}
+
+    limiter = RateLimiter(tokens_per_minute=12000)
+    limiter.acquire(1000)
+    limiter.httpx_response_hook(Response())
+
+    assert limiter.state()['outstanding_tokens'] == 0
+    assert limiter.state()['remaining_tokens'] == 11000
@@ -0,0 +1,44 @@
+"""
+Tests for the refresh of the video metrics.
+Validates batching of videos.list calls and that only the counts of known videos are updated.
+"""
+from src.llm.video_store import VideoStore
+from src.services.refresh_video_metrics import refresh_video_metrics
+
+
+class FakeVideos:
+    """Stub of youtube.videos() returning fixed statistics, recording the ids of each list call."""
+
+    def __init__(self, statistics):
+        self.statistics = statistics
+        self.calls = []
+
+    def list(self, part, id):
+        self.calls.append(list(id))
+        items = [{'id': video_id, 'statistics': self.statistics[video_id]} for video_id in id if video_id in self.statistics]
+
+        class Request:
+            def execute(self_):
+                return {'items': items}
+        return Request()
+
+
+def test_refresh_updates_counts_in_batches_of_50(tmp_path):
+    store = VideoStore(tmp_path / "videos.sqlite3")
+    store.upsert_many({f"vid{i}": {'title': f"Video {i}", 'view_count': 100, 'like_count': 1, 'comment_count': 0} for i in range(3)})
+
+    video_ids = [f"vid{i}" for i in range(3)] + [f"gone{i}" for i in range(60)]
+    videos = FakeVideos({
+        "vid0": {'viewCount': '500', 'likeCount': '7', 'commentCount': '2'},
+        "vid1": {'viewCount': '100', 'likeCount': '1'},
+    })
+
+    summary = refresh_video_metrics(videos, store, video_ids)
+
+    assert [len(call) for call in videos.calls] == [50, 13]
+    assert summary == {'videos': 63, 'refreshed': 2}
+
+    stored = store.get_many(["vid0", "vid1", "vid2"])
+    assert stored["vid0"] == {'title': "Video 0", 'view_count': 500, 'like_count': 7, 'comment_count': 2}
+    assert stored["vid1"]['comment_count'] == 0
+    assert stored["vid2"]['view_count'] == 100
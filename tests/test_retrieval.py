@@ -0,0 +1,114 @@
+"""
+Tests for the retrieval of chunks from the vector store.
+Validates that query vectors are cached, that the in-process mmr selects the same chunks as the langchain retriever,
+that hybrid retrieval fuses in the BM25 matches, and the structured filters.
+"""
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.llm import vector
+from src.llm.bm25_index import BM25Index
+from src.llm.video_store import VideoStore
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Deterministic fake embeddings counting the queries embedded."""
+
+    queries: list = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return super().embed_query(text)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    embeddings = CountingEmbeddings(size=16, queries=[])
+    chroma = Chroma(collection_name="test", persist_directory=str(tmp_path / "chroma"), embedding_function=embeddings)
+    documents = [
+        Document(page_content=f"chunk about topic {i}", metadata={'video_id': f"vid{i % 3}", 'embedded_at': float(i)}, id=f"c{i}")
+        for i in range(30)
+    ]
+    chroma.add_documents(documents, ids=[doc.id for doc in documents])
+
+    index = BM25Index(tmp_path / "bm25.sqlite3")
+    index.add_many(documents)
+
+    videos = VideoStore(tmp_path / "videos.sqlite3")
+    videos.upsert_many({
+        f"vid{i}": {'title': f"Video {i}", 'channel_id': f"UC{i % 2}", 'published_at': f"2025-0{i + 1}-01T00:00:00Z", 'view_count': 10 ** i}
+        for i in range(3)
+    })
+
+    monkeypatch.setattr(vector, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(vector, "get_vector_store", lambda: chroma)
+    monkeypatch.setattr(vector, "video_store", videos)
+    monkeypatch.setattr(vector, "bm25_index", index)
+    vector.cached_query_embedding.cache_clear()
+    yield chroma
+    vector.cached_query_embedding.cache_clear()
+
+
+def test_repeated_queries_are_embedded_once(store):
+    first = vector.retrieval("what is new in AI", k_chunks=5, mode="vector")
+    second = vector.retrieval("what is new in AI", k_chunks=5, mode="vector")
+
+    assert store.embeddings.queries == ["what is new in AI"]
+    assert [doc.id for doc in first] == [doc.id for doc in second]
+    assert all(doc.metadata['title'].startswith("Video") for doc in first)
+
+
+def test_retrieval_matches_the_retriever(store):
+    search_kwargs = {"k": 8, "fetch_k": 30, "lambda_mult": 0.3, "filter": {"embedded_at": {"$gt": 10.0}}}
+    expected = store.as_retriever(search_type="mmr", search_kwargs=search_kwargs).invoke("model releases")
+
+    retrieved = vector.retrieval("model releases", k_chunks=8, embedded_after=10.0, mode="vector")
+
+    # retrieval uses a candidate pool of 300, which covers the whole test collection
+    assert [doc.id for doc in retrieved] == [doc.id for doc in expected]
+    assert all(doc.metadata['embedded_at'] > 10.0 for doc in retrieved)
+
+
+def test_retrieval_many_matches_single_queries(store):
+    queries = ["model releases", "what is new in AI", "topic 7"]
+
+    batched = vector.retrieval_many(queries, k_chunks=6, embedded_after=5.0, mode="vector")
+
+    assert [[doc.id for doc in docs] for docs in batched] == [[doc.id for doc in vector.retrieval(query, 6, 5.0, "vector")] for query in queries]
+
+
+def test_reciprocal_rank_fusion():
+    assert vector.reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]]) == ["b", "a", "d", "c"]
+
+
+def test_hybrid_adds_lexical_matches(store):
+    hybrid = vector.retrieval("topic 17", k_chunks=5, mode="hybrid")
+
+    # the only chunk with the term 17 is found by BM25 even if the (random) fake vectors miss it, and read back with its text
+    assert len(hybrid) == 5
+    assert "c17" in [doc.id for doc in hybrid]
+    assert next(doc for doc in hybrid if doc.id == "c17").page_content == "chunk about topic 17"
+    assert all(doc.metadata['title'].startswith("Video") for doc in hybrid)
+
+    # the embedded_after filter applies to the lexical side too
+    assert "c17" not in [doc.id for doc in vector.retrieval("topic 17", k_chunks=5, embedded_after=20.0, mode="hybrid")]
+
+
+@pytest.mark.parametrize("mode", ["vector", "hybrid"])
+def test_filters_restrict_the_videos(store, mode):
+    # vid1 and vid2 are published in 2025-02 and 2025-03, vid0 and vid2 are on channel UC0
+    filters = {'published_after': '2025-02-01T00:00:00Z', 'channel_ids': ['UC0']}
+    retrieved = vector.retrieval("topic", k_chunks=20, mode=mode, filters=filters)
+
+    assert len(retrieved) == 10
+    assert {doc.metadata['video_id'] for doc in retrieved} == {"vid2"}
+
+    assert {doc.metadata['video_id'] for doc in vector.retrieval("topic", k_chunks=30, mode=mode, filters={'min_view_count': 10})} == {"vid1", "vid2"}
+    assert vector.retrieval("topic", mode=mode, filters={'min_view_count': 10 ** 6}) == []
+
+
+def test_unknown_filter(store):
+    with pytest.raises(ValueError):
+        vector.retrieval("topic", filters={'published': '2025'})
@@ -0,0 +1,72 @@
+"""
+Tests for the manifest of chunked transcript files.
+Validates recording from the chunker, syncing changed/removed files, recording unusable files once and finding
+unembedded videos.
+"""
+import json
+import os
+import sqlite3
+
+from src.services.transcript_manifest import TranscriptManifest
+
+
+def write_transcript(folder, name, video_id, chunk_count):
+    chunks = [{"text": f"chunk {i}", "start": i, "duration": 1.0} for i in range(chunk_count)] + [{"video_id": video_id}]
+    content = json.dumps(chunks).encode('utf-8')
+    (folder / name).write_bytes(content)
+    return chunks, content
+
+
+def test_record_and_query(tmp_path):
+    manifest = TranscriptManifest(tmp_path / "manifest.sqlite3")
+    chunks, content = write_transcript(tmp_path, "UC1_transcript_1.json", "vid1", 3)
+    manifest.record(tmp_path / "UC1_transcript_1.json", chunks, content)
+
+    assert manifest.files() == [("UC1_transcript_1.json", "vid1")]
+    assert manifest.files(exclude_video_ids={"vid1"}) == []
+
+    row = manifest._connect().execute("SELECT channel_id, video_index, chunk_count FROM files").fetchone()
+    assert row == ("UC1", "1", 3)
+
+
+def test_sync_only_parses_new_or_changed_files(tmp_path):
+    folder = tmp_path / "transcripts"
+    folder.mkdir()
+    manifest = TranscriptManifest(tmp_path / "manifest.sqlite3")
+
+    chunks, content = write_transcript(folder, "UC1_transcript_1.json", "vid1", 2)
+    manifest.record(folder / "UC1_transcript_1.json", chunks, content)
+    write_transcript(folder, "UC1_transcript_2.json", "vid2", 2)
+    (folder / "raw.json").write_text(json.dumps([{"text": "not chunked yet"}]))
+
+    assert manifest.sync(folder) == {'added': 1, 'updated': 0, 'removed': 0, 'skipped': 1}
+
+    # a changed file is parsed again, a deleted one is dropped
+    write_transcript(folder, "UC1_transcript_2.json", "vid2", 5)
+    os.utime(folder / "UC1_transcript_2.json", (1, 1))
+    os.remove(folder / "UC1_transcript_1.json")
+
+    # the raw file is recorded as unreadable, so it isn't parsed (or counted) again until it changes
+    assert manifest.sync(folder) == {'added': 0, 'updated': 1, 'removed': 1, 'skipped': 0}
+    assert manifest.files() == [("UC1_transcript_2.json", "vid2")]
+
+    # a chunked file without chunks is recorded as empty and never returned
+    write_transcript(folder, "UC1_transcript_3.json", "vid3", 0)
+    assert manifest.sync(folder) == {'added': 0, 'updated': 0, 'removed': 0, 'skipped': 1}
+    assert manifest.sync(folder)['skipped'] == 0
+    assert manifest.files(exclude_video_ids=[]) == [("UC1_transcript_2.json", "vid2")]
+    assert dict(manifest._connect().execute("SELECT file, status FROM files")) == {
+        "raw.json": "unreadable", "UC1_transcript_2.json": "chunked", "UC1_transcript_3.json": "empty"
+    }
+
+
+def test_old_manifest_gets_a_status(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "manifest.sqlite3"))
+    conn.execute("""
+        CREATE TABLE files (file TEXT PRIMARY KEY, video_id TEXT NOT NULL, channel_id TEXT NOT NULL, video_index TEXT NOT NULL,
+                            chunk_count INTEGER NOT NULL, content_hash TEXT NOT NULL, mtime REAL NOT NULL, size INTEGER NOT NULL)
+    """)
+    conn.execute("INSERT INTO files VALUES ('UC1_transcript_1.json', 'vid1', 'UC1', '1', 2, 'hash', 1.0, 10)")
+    conn.commit()
+
+    assert TranscriptManifest(tmp_path / "manifest.sqlite3").files(exclude_video_ids={"vid2"}) == [("UC1_transcript_1.json", "vid1")]
@@ -0,0 +1,169 @@
+"""
+Tests for the vector store backends.
+Validates the memory-mapped flat index (search, replacement, filters, sharing between instances, quantized search),
+the migration from Chroma and the HNSW settings of the Chroma collection.
+"""
+import numpy as np
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.llm import vector, vector_backends
+from src.llm.video_store import VideoStore
+from src.llm.vector_backends import (
+    ChromaBackend, FlatIndexBackend, where_to_sql, migrate, compare, sweep_hnsw, hnsw_metadata, hnsw_settings, QUANTIZED_FILES
+)
+
+
+def unit(rows):
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def test_where_to_sql():
+    sql, parameters = where_to_sql({"$and": [{"embedded_at": {"$gt": 5.0}}, {"video_id": {"$in": ["a", "b"]}}]})
+
+    assert sql == """(json_extract(metadata, '$."embedded_at"') > ?) AND (json_extract(metadata, '$."video_id"') IN (SELECT value FROM json_each(?)))"""
+    assert parameters == [5.0, '["a", "b"]']
+    assert where_to_sql({"video_id": "a"}) == ("""json_extract(metadata, '$."video_id"') = ?""", ["a"])
+
+
+def test_flat_index_is_exact_and_filters(tmp_path, monkeypatch):
+    # filtered rows are scored in more than one block
+    monkeypatch.setattr(vector_backends, "SCORE_BLOCK", 2)
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 8))
+    queries = rng.normal(size=(3, 8))
+
+    index = FlatIndexBackend(tmp_path / "flat")
+    index.add([f"c{i}" for i in range(50)], vectors, [f"text {i}" for i in range(50)], [{'embedded_at': float(i)} for i in range(50)])
+
+    results = index.query(queries, 5)
+    expected = np.argsort(-(unit(vectors) @ unit(queries).T), axis=0)[:5].T
+    assert results['ids'] == [[f"c{i}" for i in row] for row in expected]
+    assert results['documents'][0][0] == f"text {expected[0][0]}"
+    assert np.allclose(results['embeddings'][0], unit(vectors)[expected[0]])
+
+    filtered = index.query(queries, 100, where={"embedded_at": {"$gte": 45.0}})
+    assert all(sorted(ids) == sorted(f"c{i}" for i in range(45, 50)) for ids in filtered['ids'])
+
+
+def test_flat_index_replaces_rows_and_is_shared(tmp_path):
+    writer = FlatIndexBackend(tmp_path / "flat")
+    writer.add(["a", "b"], [[1, 0], [0, 1]], ["a", "b"], [{}, {}])
+
+    reader = FlatIndexBackend(tmp_path / "flat")
+    assert reader.query([[1, 0]], 1)['ids'] == [["a"]]
+
+    # a replaced chunk keeps its row, a new one is appended, and an open reader picks up both
+    writer.add(["a", "c"], [[-1, 0], [1, 0.1]], ["a2", "c"], [{}, {}])
+    assert reader.count() == 3
+    assert reader.query([[1, 0]], 3)['ids'] == [["c", "b", "a"]]
+    assert reader.get(ids=["a"])['documents'] == ["a2"]
+
+    with pytest.raises(ValueError):
+        writer.add(["d"], [[1, 0, 0]], ["d"], [{}])
+
+
+@pytest.mark.parametrize("quantization, rescore_factor", [("int8", 4), ("binary", 10)])
+def test_quantized_search_rescores_to_the_exact_results(tmp_path, quantization, rescore_factor):
+    rng = np.random.default_rng(2)
+    centers = rng.normal(size=(20, 64))
+    vectors = centers[rng.integers(0, 20, size=2000)] + 0.5 * rng.normal(size=(2000, 64))
+    queries = centers[:5] + 0.5 * rng.normal(size=(5, 64))
+    ids = [f"c{i}" for i in range(2000)]
+    metadatas = [{'embedded_at': float(i)} for i in range(2000)]
+
+    exact = FlatIndexBackend(tmp_path / "flat")
+    exact.add(ids, vectors, ids, metadatas)
+    quantized = FlatIndexBackend(tmp_path / "flat", quantization=quantization, rescore_factor=rescore_factor)
+
+    # a search never writes the quantized copy, the rows without one are scored exactly
+    assert compare(exact, quantized, queries, k=10)['recall_at_10'] == 1.0
+    assert not (tmp_path / "flat" / QUANTIZED_FILES[quantization]).exists()
+
+    quantized.build_quantized()
+    report = compare(exact, quantized, queries, k=10)
+    assert report['recall_at_10'] >= 0.9
+    assert (tmp_path / "flat" / QUANTIZED_FILES[quantization]).stat().st_size == quantized.footprint()[f'{quantization}_bytes']
+
+    # the results are rescored with the float vectors, so the scores of the returned chunks are exact
+    results = quantized.query(queries[:1], 10, where={"embedded_at": {"$lt": 1000.0}})
+    assert all(int(chunk_id[1:]) < 1000 for chunk_id in results['ids'][0])
+    assert np.allclose(results['embeddings'][0], unit(vectors[[int(chunk_id[1:]) for chunk_id in results['ids'][0]]]))
+
+    # add quantizes new rows and rewrites a replaced row's quantized copy, an exact writer keeps a built copy up to date too
+    quantized.add(["new", "c0"], [queries[1], queries[2]], ["new", "c0"], [{}, {}])
+    exact.add(["newer"], [queries[3]], ["newer"], [{}])
+    assert (tmp_path / "flat" / QUANTIZED_FILES[quantization]).stat().st_size == quantized.footprint()[f'{quantization}_bytes']
+    assert quantized.query(queries[1:4], 1)['ids'] == [["new"], ["c0"], ["newer"]]
+
+
+@pytest.fixture
+def chroma(tmp_path):
+    store = Chroma(collection_name="test", persist_directory=str(tmp_path / "chroma"), embedding_function=DeterministicFakeEmbedding(size=16))
+    documents = [
+        Document(page_content=f"chunk {i}", metadata={'video_id': f"vid{i % 3}", 'embedded_at': float(i)}, id=f"c{i}")
+        for i in range(30)
+    ]
+    store.add_documents(documents, ids=[doc.id for doc in documents])
+    return store
+
+
+def test_migrate_and_retrieve_from_the_flat_index(chroma, tmp_path, monkeypatch):
+    flat = FlatIndexBackend(tmp_path / "flat", chroma.embeddings)
+    assert migrate(ChromaBackend(chroma), flat, page_size=7) == 30
+    assert flat.get(ids=["c4"])['metadatas'] == [{'video_id': 'vid1', 'embedded_at': 4.0}]
+
+    # the whole collection is the mmr candidate pool in both backends, so they select the same chunks
+    monkeypatch.setattr(vector, "get_embeddings", lambda: chroma.embeddings)
+    monkeypatch.setattr(vector, "get_vector_store", lambda: chroma)
+    monkeypatch.setattr(vector, "get_flat_index", lambda: flat)
+    monkeypatch.setattr(vector, "video_store", VideoStore(tmp_path / "videos.sqlite3"))
+    vector.cached_query_embedding.cache_clear()
+
+    monkeypatch.setattr(vector, "VECTOR_BACKEND", "chroma")
+    from_chroma = vector.retrieval("a query", k_chunks=8, embedded_after=3.0, mode="vector")
+    monkeypatch.setattr(vector, "VECTOR_BACKEND", "flat")
+    from_flat = vector.retrieval("a query", k_chunks=8, embedded_after=3.0, mode="vector")
+    vector.cached_query_embedding.cache_clear()
+
+    assert {doc.id for doc in from_flat} == {doc.id for doc in from_chroma}
+
+    report = compare(ChromaBackend(chroma), flat, [chroma.embeddings.embed_query("a query")], k=30)
+    assert report['recall_at_30'] == 1.0
+
+
+def test_vector_store_uses_the_configured_hnsw_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector, "db_location", tmp_path / "chroma")
+    monkeypatch.setattr(vector, "get_embeddings", lambda: DeterministicFakeEmbedding(size=16))
+    monkeypatch.setattr(vector, "HNSW_SPACE", "cosine")
+    monkeypatch.setattr(vector, "HNSW_M", 24)
+    monkeypatch.setattr(vector, "HNSW_EF_SEARCH", 64)
+    vector.get_vector_store.cache_clear()
+
+    assert hnsw_settings(vector.get_vector_store()._collection) == {'space': 'cosine', 'm': 24, 'ef_construction': 100, 'ef_search': 64}
+
+    # an existing collection keeps the graph it was built with, but takes the new ef_search
+    monkeypatch.setattr(vector, "HNSW_M", 32)
+    monkeypatch.setattr(vector, "HNSW_EF_SEARCH", 200)
+    vector.get_vector_store.cache_clear()
+    assert hnsw_settings(vector.get_vector_store()._collection) == {'space': 'cosine', 'm': 24, 'ef_construction': 100, 'ef_search': 200}
+    vector.get_vector_store.cache_clear()
+
+    with pytest.raises(ValueError):
+        hnsw_metadata(space="dot")
+
+
+def test_sweep_hnsw_reports_recall_against_exact_search(tmp_path, chroma):
+    queries = [chroma.embeddings.embed_query(f"query {i}") for i in range(3)]
+
+    rows = sweep_hnsw(ChromaBackend(chroma), queries, ks=(5, 50), ms=(8, 16), ef_searches=(10, 100), directory=tmp_path)
+
+    assert [(row['m'], row['ef_search'], row['k']) for row in rows] == [
+        (m, ef_search, k) for m in (8, 16) for ef_search in (10, 100) for k in (5, 50)
+    ]
+    # a search as wide as the collection finds every exact result
+    assert all(row['recall'] == 1.0 for row in rows if row['ef_search'] == 100)
+    assert all(0.0 <= row['recall'] <= 1.0 and row['hnsw_ms'] > 0 for row in rows)
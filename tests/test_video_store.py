@@ -0,0 +1,88 @@
+"""
+Tests for the video store the chunk metadata is normalized into.
+Validates the join at read time, the migration of chunks embedded with the full metadata and the retrieval filters.
+"""
+import sqlite3
+from datetime import datetime
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.llm.video_store import VideoStore, split_metadata, to_timestamp, VIDEO_FIELDS
+from src.llm.vector import normalize_chunk_metadata
+
+FULL = {
+    'video_id': 'vid1', 'start': 12.5, 'duration': 30.0, 'embedded_at': 1.0,
+    'channel_id': 'UC1', 'video_index': '3', 'title': 'A title', 'published_at': '2025-01-01T00:00:00Z',
+    'view_count': 100, 'like_count': 5, 'comment_count': 1, 'total_duration': 'PT10M', 'source_file': 'UC1_transcript_3.json'
+}
+
+
+def test_split_metadata():
+    chunk, video = split_metadata(FULL)
+    assert chunk == {'video_id': 'vid1', 'start': 12.5, 'duration': 30.0, 'embedded_at': 1.0}
+    assert set(video) == {'channel_id', 'video_index', 'title', 'published_at', 'view_count', 'like_count', 'comment_count', 'total_duration', 'source_file'}
+
+
+def test_join_adds_video_fields(tmp_path):
+    store = VideoStore(tmp_path / "videos.sqlite3")
+    chunk, video = split_metadata(FULL)
+    store.upsert_many({'vid1': {**video, 'view_count': 999}})
+
+    docs = store.join([Document(page_content="text", metadata=chunk), Document(page_content="other", metadata={'video_id': 'unknown'})])
+
+    assert docs[0].metadata == {**FULL, 'view_count': 999}
+    assert docs[1].metadata == {'video_id': 'unknown'}
+
+
+def test_normalize_moves_video_fields_off_the_chunks(tmp_path):
+    vectors = Chroma(collection_name="test", persist_directory=str(tmp_path / "chroma"), embedding_function=DeterministicFakeEmbedding(size=8))
+    vectors.add_documents([Document(page_content=f"chunk {i}", metadata={**FULL, 'start': float(i)}) for i in range(4)], ids=[f"c{i}" for i in range(4)])
+    videos = VideoStore(tmp_path / "videos.sqlite3")
+
+    report = normalize_chunk_metadata(vectors, videos, page_size=3)
+
+    assert report['chunks'] == 4 and report['videos'] == 1 and report['moved_chunks'] == 4
+    assert report['chunk_bytes'] + report['video_bytes'] < report['full_bytes']
+
+    stored = vectors.get(include=['metadatas'])
+    assert all(set(metadata) == {'video_id', 'start', 'duration', 'embedded_at'} for metadata in stored['metadatas'])
+    assert videos.get_many(['vid1'])['vid1']['title'] == 'A title'
+
+    # running it again moves nothing
+    assert normalize_chunk_metadata(vectors, videos)['moved_chunks'] == 0
+
+
+def test_to_timestamp():
+    assert to_timestamp('2025-01-01T00:00:00Z') == 1735689600.0
+    assert to_timestamp(datetime(2025, 1, 1)) == 1735689600.0
+    assert to_timestamp(1735689600) == 1735689600.0
+    assert to_timestamp('not a date') is None and to_timestamp(None) is None
+
+
+def test_video_ids_matching(tmp_path):
+    store = VideoStore(tmp_path / "videos.sqlite3")
+    store.upsert_many({
+        'old': {'channel_id': 'UC1', 'published_at': '2024-06-01T00:00:00Z', 'view_count': 5000},
+        'new': {'channel_id': 'UC1', 'published_at': '2025-03-01T00:00:00Z', 'view_count': 50},
+        'other': {'channel_id': 'UC2', 'published_at': '2025-03-02T12:00:00Z', 'view_count': 900},
+        'undated': {'channel_id': 'UC2', 'view_count': 10**6},
+    })
+
+    assert store.video_ids_matching(published_after='2025-01-01T00:00:00Z') == ['new', 'other']
+    assert store.video_ids_matching(published_before=datetime(2025, 3, 2)) == ['new', 'old']
+    assert store.video_ids_matching(channel_ids=['UC2'], min_view_count=1000) == ['undated']
+    assert store.video_ids_matching(channel_ids=[]) == []
+    assert len(store.video_ids_matching()) == 4
+
+
+def test_publish_times_are_added_to_an_older_store(tmp_path):
+    path = tmp_path / "videos.sqlite3"
+    conn = sqlite3.connect(str(path))
+    conn.execute(f"CREATE TABLE videos (video_id TEXT PRIMARY KEY, {', '.join(VIDEO_FIELDS)})")
+    conn.execute("INSERT INTO videos (video_id, published_at) VALUES ('vid1', '2025-01-01T00:00:00Z')")
+    conn.commit()
+    conn.close()
+
+    assert VideoStore(path).video_ids_matching(published_after=1735689600) == ['vid1']